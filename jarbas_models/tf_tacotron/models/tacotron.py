@@ -56,7 +56,10 @@ class Tacotron():
             # Attention
             attention_cell = AttentionWrapper(
                 DecoderPrenetWrapper(GRUCell(256), is_training),
-                BahdanauAttention(256, encoder_outputs),
+                # padding of batched inputs is not attended to
+                BahdanauAttention(256, encoder_outputs,
+                                  memory_sequence_length=None if is_training
+                                  else input_lengths),
                 alignment_history=True,
                 output_attention=False)  # [N, T_in, 256]
 
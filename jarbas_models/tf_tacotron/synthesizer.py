@@ -7,10 +7,12 @@ from jarbas_models.tf_tacotron.util import audio, textinput
 
 
 class Synthesizer:
+    sample_rate = hparams.sample_rate
+
     def load(self, checkpoint_path, model_name='tacotron'):
         print('Constructing model: %s' % model_name)
-        inputs = tf.placeholder(tf.int32, [1, None], 'inputs')
-        input_lengths = tf.placeholder(tf.int32, [1], 'input_lengths')
+        inputs = tf.placeholder(tf.int32, [None, None], 'inputs')
+        input_lengths = tf.placeholder(tf.int32, [None], 'input_lengths')
         with tf.variable_scope('model') as scope:
             self.model = create_model(model_name, hparams)
             self.model.initialize(inputs, input_lengths)
@@ -22,22 +24,46 @@ class Synthesizer:
         saver.restore(self.session, checkpoint_path)
 
     def synthesize(self, text, save_path=None):
-        seq = textinput.to_sequence(text,
-                                    force_lowercase=hparams.force_lowercase,
-                                    expand_abbreviations=hparams.expand_abbreviations)
-        feed_dict = {
-            self.model.inputs: [np.asarray(seq, dtype=np.int32)],
-            self.model.input_lengths: np.asarray([len(seq)], dtype=np.int32)
-        }
-
-        spec = self.session.run(self.model.linear_outputs[0],
-                                feed_dict=feed_dict)
-
+        wav = next(self.synthesize_batch([text]))
         if save_path is not None:
             out = save_path
-            audio.save_wav(audio.inv_spectrogram(spec.T), out)
+            audio.save_wav(wav, out)
             return out
         else:
             out = io.BytesIO()
-            audio.save_wav(audio.inv_spectrogram(spec.T), out)
+            audio.save_wav(wav, out)
             return out.getvalue()
+
+    def synthesize_batch(self, texts, iters=None):
+        '''Yields the waveforms of the texts, run through the model as one
+        batch padded to the longest text, then inverted one by one'''
+        for spec in self._spectrograms(texts):
+            yield audio.inv_spectrogram(spec, iters)
+
+    def synthesize_stream(self, texts, iters=None, block_frames=64):
+        '''Like synthesize_batch, yields for each text a generator of 16 bit
+        chunks of its waveform of block_frames frames'''
+        for spec in self._spectrograms(texts):
+            yield audio.inv_spectrogram_stream(spec, iters, block_frames)
+
+    def _spectrograms(self, texts):
+        seqs = [textinput.to_sequence(
+            text, force_lowercase=hparams.force_lowercase,
+            expand_abbreviations=hparams.expand_abbreviations)
+            for text in texts]
+        inputs = np.zeros((len(seqs), max(len(seq) for seq in seqs)),
+                          dtype=np.int32)  # padding symbol
+        for i, seq in enumerate(seqs):
+            inputs[i, :len(seq)] = seq
+        feed_dict = {
+            self.model.inputs: inputs,
+            self.model.input_lengths: np.asarray([len(seq) for seq in seqs],
+                                                 dtype=np.int32)
+        }
+
+        specs = self.session.run(self.model.linear_outputs,
+                                 feed_dict=feed_dict)
+        # the batch is decoded until its longest text ends, shorter ones
+        # end in silence
+        specs = [spec.T for spec in specs]
+        return [spec[:, :audio.find_endpoint(spec)] for spec in specs]
@@ -21,10 +21,25 @@ def spectrogram(y):
     return _normalize(S)
 
 
-def inv_spectrogram(spectrogram):
+def inv_spectrogram(spectrogram, iters=None):
     S = _db_to_amp(_denormalize(
         spectrogram) + hparams.ref_level_db)  # Convert back to linear
-    return _inv_preemphasis(_griffin_lim(S ** 1.5))  # Reconstruct phase
+    return _inv_preemphasis(_griffin_lim(S ** 1.5, iters))  # Reconstruct phase
+
+
+def inv_spectrogram_stream(spectrogram, iters=None, block_frames=64):
+    '''Yields the waveform of a spectrogram in 16 bit chunks of block_frames
+    frames, as soon as Griffin-Lim is done with each one.
+
+    Unlike save_wav the peak of the waveform is not known before it ends,
+    the gain is taken from the energy of the spectrogram instead.'''
+    S = _db_to_amp(_denormalize(
+        spectrogram) + hparams.ref_level_db) ** 1.5  # Convert back to linear
+    gain = _stream_gain(S)
+    zi = np.zeros(1)
+    for y in _griffin_lim_stream(S, iters, block_frames):
+        y, zi = signal.lfilter([1], [1, -hparams.preemphasis], y, zi=zi)
+        yield np.clip(y * gain, -32767, 32767).astype(np.int16)
 
 
 def melspectrogram(y):
@@ -39,29 +54,178 @@ def inv_melspectrogram(melspectrogram):
     return _inv_preemphasis(_griffin_lim(S ** 1.5))  # Reconstruct phase
 
 
+def find_endpoint(spectrogram, threshold_db=-40, min_silence_sec=0.8):
+    '''Number of frames of a [F, T] spectrogram before its first silence of
+    min_silence_sec, frames threshold_db below the loudest one are silent'''
+    hop_length = _stft_parameters()[1]
+    window = max(1, int(min_silence_sec * hparams.sample_rate / hop_length))
+    loudest = np.max(spectrogram, axis=0)
+    threshold = np.max(loudest) + threshold_db / -float(hparams.min_level_db)
+    silent = loudest < threshold
+    runs = np.concatenate([[0], np.cumsum(silent)])
+    starts = np.flatnonzero(runs[window:] - runs[:-window] == window)
+    if len(starts):
+        return min(len(silent), max(1, starts[0] + window // 4))
+    return len(silent)
+
+
 # Based on https://github.com/librosa/librosa/issues/434
-def _griffin_lim(S):
-    angles = np.exp(2j * np.pi * np.random.rand(*S.shape))
-    S_complex = np.abs(S).astype(np.complex)
-    for i in range(hparams.griffin_lim_iters):
+def _griffin_lim(S, iters=None):
+    S = np.abs(S).T
+    # window normalization of the overlap-add, the same every iteration
+    norm = _overlap_norm(len(S))
+    D = S * np.exp(2j * np.pi * np.random.rand(*S.shape))
+    for i in range(iters or hparams.griffin_lim_iters):
         if i > 0:
-            angles = np.exp(1j * np.angle(_stft(y)))
-        y = _istft(S_complex * angles)
+            D = _stft_frames(y)
+            D *= S / np.maximum(np.abs(D), 1e-8)
+        y = _istft_frames(D, norm)
     return y
 
 
-def _stft(y):
+def _griffin_lim_stream(S, iters=None, block_frames=64):
+    '''Griffin-Lim a block of frames at a time, yielding the waveform of
+    each block when done.
+
+    Every block is run with the frames around it, the samples already
+    yielded are put back after each iteration so the next block carries on
+    from them, and the last phases of the frames ahead are kept as a
+    starting point.'''
+    _, hop_length, win_length = _stft_parameters()
+    S = np.abs(S).T
+    frames = len(S)
+    # frames overlapping the samples at a block boundary
+    overlap = -(-win_length // hop_length)
+    look_ahead = 2 * overlap
+    phases = np.exp(2j * np.pi * np.random.rand(*S.shape))
+    y_done = np.zeros(hop_length * (frames - 1))
+    done = 0
+    for start in range(0, frames, max(1, block_frames)):
+        end = min(frames, start + block_frames)
+        first, last = max(0, start - overlap), min(frames, end + look_ahead)
+        offset, fixed = first * hop_length, done - first * hop_length
+        norm = _overlap_norm(last - first)
+        D = S[first:last] * phases[first:last]
+        for i in range(iters or hparams.griffin_lim_iters):
+            if i > 0:
+                D = _stft_frames(y)
+                D *= S[first:last] / np.maximum(np.abs(D), 1e-8)
+            y = _istft_frames(D, norm)
+            y[:fixed] = y_done[offset:done]
+        phases[first:last] = D / np.maximum(np.abs(D), 1e-8)
+        end = min(end * hop_length, len(y_done))
+        y_done[done:end] = y[fixed:end - offset]
+        yield y_done[done:end]
+        done = end
+
+
+def _stream_gain(S):
+    '''Gain bringing the waveform of a [F, T] magnitude spectrogram near
+    full scale, estimated from the energy of its loudest frame'''
+    n_fft = _stft_parameters()[0]
+    # energy of each frame after _inv_preemphasis, from the full spectrum
+    # of the rfft
+    w = np.linspace(0, np.pi, S.shape[0])
+    emphasis = 1 / np.abs(1 - hparams.preemphasis * np.exp(-1j * w)) ** 2
+    power = 2 * np.sum(S ** 2 * emphasis[:, None], axis=0) / \
+        (n_fft * np.sum(_stft_window() ** 2))
+    return 32767 / max(0.01, _STREAM_CREST * np.sqrt(np.max(power)))
+
+
+# peak of speech over the rms of its loudest frame, 1.9 to 3 in the
+# output_samples
+_STREAM_CREST = 3.0
+
+
+def _stft_parameters():
     n_fft = (hparams.num_freq - 1) * 2
     hop_length = int(hparams.frame_shift_ms / 1000.0 * hparams.sample_rate)
     win_length = int(hparams.frame_length_ms / 1000.0 * hparams.sample_rate)
-    return librosa.stft(y=y, n_fft=n_fft, hop_length=hop_length,
-                        win_length=win_length)
+    return n_fft, hop_length, win_length
+
+
+_window = None
+_support = None
+
+
+def _stft_window():
+    '''Hann window of win_length centered in n_fft samples, as librosa'''
+    global _window
+    if _window is None:
+        n_fft, _, win_length = _stft_parameters()
+        _window = np.zeros(n_fft)
+        offset = (n_fft - win_length) // 2
+        _window[offset:offset + win_length] = signal.get_window(
+            'hann', win_length, fftbins=True)
+    return _window
+
+
+def _overlap_norm(frames):
+    '''Inverse of the squared window overlap of frames in a row'''
+    n_fft, hop_length, _ = _stft_parameters()
+    window, offset = _window_support()
+    norm = _overlap_add(np.tile(window ** 2, (frames, 1)), hop_length, n_fft,
+                        offset)
+    return 1 / np.where(norm > np.finfo(norm.dtype).tiny, norm, 1)
+
+
+def _window_support():
+    '''The non zero part of the window and its offset in n_fft samples'''
+    global _support
+    if _support is None:
+        window = _stft_window()
+        nonzero = np.flatnonzero(window)
+        _support = window[nonzero[0]:nonzero[-1] + 1], nonzero[0]
+    return _support
+
+
+def _stft_frames(y):
+    '''Centered STFT [T, F] of y, frames in rows'''
+    n_fft, hop_length, _ = _stft_parameters()
+    padded = np.pad(y, n_fft // 2, mode='reflect')
+    step = padded.strides[0]
+    frames = np.lib.stride_tricks.as_strided(
+        padded, (1 + len(y) // hop_length, n_fft), (hop_length * step, step))
+    window, offset = _window_support()
+    windowed = np.zeros(frames.shape)
+    windowed[:, offset:offset + len(window)] = \
+        frames[:, offset:offset + len(window)] * window
+    return np.fft.rfft(windowed, axis=-1)
+
+
+def _istft_frames(D, norm):
+    '''Waveform of a [T, F] STFT, norm is the inverse of the squared
+    window overlap'''
+    n_fft = (D.shape[1] - 1) * 2
+    window, offset = _window_support()
+    # samples outside the window are dropped before the overlap-add
+    frames = np.fft.irfft(D, n_fft, axis=-1)[:, offset:offset + len(window)]
+    return _overlap_add(frames * window, _stft_parameters()[1], n_fft,
+                        offset) * norm
+
+
+def _overlap_add(frames, hop_length, n_fft, offset=0):
+    '''Sums [T, width] frames starting offset samples into n_fft samples
+    frames hop_length apart, without the n_fft / 2 samples of centering on
+    each side'''
+    count, width = frames.shape
+    lead = offset % hop_length
+    steps = -(-(lead + width) // hop_length)
+    frames = np.pad(frames, ((0, 0),
+                             (lead, steps * hop_length - lead - width)),
+                    mode='constant').reshape(count, steps, hop_length)
+    first = offset // hop_length
+    y = np.zeros((count + first + steps - 1, hop_length))
+    for step in range(steps):
+        y[first + step:first + step + count] += frames[:, step]
+    y = y.reshape(-1)
+    return y[n_fft // 2:n_fft // 2 + hop_length * (count - 1)]
 
 
-def _istft(y):
-    hop_length = int(hparams.frame_shift_ms / 1000.0 * hparams.sample_rate)
-    win_length = int(hparams.frame_length_ms / 1000.0 * hparams.sample_rate)
-    return librosa.istft(y, hop_length=hop_length, win_length=win_length)
+def _stft(y):
+    n_fft, hop_length, win_length = _stft_parameters()
+    return librosa.stft(y=y, n_fft=n_fft, hop_length=hop_length,
+                        win_length=win_length)
 
 
 # Conversions:
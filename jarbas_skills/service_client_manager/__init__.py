@@ -28,6 +28,7 @@ from mycroft.messagebus.message import Message
 from mycroft.skills.settings import SkillSettings
 from mycroft.configuration import ConfigurationManager
 from os.path import dirname, exists
+import copy
 import time, os
 from os import mkdir
 from jarbas_utils.skill_dev_tools import ResponderBackend
@@ -48,17 +49,19 @@ class ClientUser():
         self.default_forbidden_skills = default_forbidden_skills
         # TODO get parser skills names, not ids
         self.default_forbidden_intents = default_forbidden_intents
-        self.init_user_settings()
-        if reset:
-            self.reset()
-        self.load_user()
-        self.save_user()
         # session data
         self.session_key = None  # encrypt everything with this shared key
         self.current_sock = None
         self.current_ip = None
         self.status = "offline"
         self.user_type = "client"
+        # last permissions announced to the server, see save_user
+        self.last_user_data = None
+        self.init_user_settings()
+        if reset:
+            self.reset()
+        self.load_user()
+        self.save_user()
 
     def init_user_settings(self, path=None):
         if path is None:
@@ -112,6 +115,25 @@ class ClientUser():
         self.settings[self.client_id][
             "forbidden_messages"] = self.forbidden_messages
         self.settings.store()
+        # server caches permissions per connection, tell it they changed
+        user_data = self.get_user_data()
+        if self.current_sock is not None and \
+                user_data != self.last_user_data:
+            self.emitter.emit(Message("user.updated",
+                                      {"sock": self.current_sock,
+                                       "ip": self.current_ip,
+                                       "user_data": user_data}))
+        # a copy, the lists of this user are changed in place
+        self.last_user_data = copy.deepcopy(user_data)
+
+    def get_user_data(self):
+        return {"id": self.client_id,
+                "forbidden_skills": self.forbidden_skills,
+                "forbidden_messages": self.forbidden_messages,
+                "forbidden_intents": self.forbidden_intents,
+                "security_level": self.security_level,
+                "pub_key": self.public_key,
+                "nicknames": self.nicknames}
 
     def add_new_ip(self, ip, emit=True):
         if ip not in self.known_ips:
@@ -311,13 +333,7 @@ class ClientManagerSkill(MycroftSkill):
                 message.context)
             return
 
-        data = {"id": user_id,
-                "forbidden_skills": self.users[user_id].forbidden_skills,
-                "forbidden_messages": self.users[user_id].forbidden_messages,
-                "forbidden_intents": self.users[user_id].forbidden_intents,
-                "security_level": self.users[user_id].security_level,
-                "pub_key": self.users[user_id].public_key,
-                "nicknames": self.users[user_id].nicknames}
+        data = self.users[user_id].get_user_data()
         self.sock_responder.update_response_data(data, message.context)
 
     # facebook messages
@@ -398,7 +414,7 @@ class ClientManagerSkill(MycroftSkill):
             user = self.users[user]
             if user.public_key == pub_key:
                 self.log.info("User found")
-                current_user = user.user_id
+                current_user = user.client_id
 
         if current_user is None:
             self.log.info("Registering new user")
@@ -441,10 +457,11 @@ class ClientManagerSkill(MycroftSkill):
             "User updated: " + current_user.name + " " + current_user.current_ip + " " + str(
                 current_user.last_timestamp))
         self.emitter.emit(Message("user.connected",
-                                  {"internal_id": current_user.id,
+                                  {"internal_id": current_user.client_id,
                                    "name": current_user.name,
                                    "ip": current_user.current_ip,
-                                   "sock": current_user.current_sock},
+                                   "sock": current_user.current_sock,
+                                   "user_data": current_user.get_user_data()},
                                   message.context))
 
     def user_from_ip_sock(self, sock, ip):
@@ -63,12 +63,12 @@ from __future__ import division
 import docopt
 import os
 import re
-import struct
 import sys
 import time
 import wave
 
 import datavision
+import numpy
 import propyte
 import pyaudio
 import pyprel
@@ -4482,6 +4482,14 @@ rules_English_to_phonemes_regex = [
     make_rule_regex(rule_text=rule) for rule in rules_English_to_phonemes
 ]
 
+# The rules compiled once, with the character string each one replaces. The
+# character strings are upper case and the phonemes replacing them lower case,
+# so a rule can only match while its character string is left in the text.
+rules_English_to_phonemes_compiled = [
+    (re.compile(rule), phoneme, rule_text, rule_text.split("/")[0])
+    for rule, phoneme, rule_text in rules_English_to_phonemes_regex
+]
+
 
 def text_to_phonemes(
         text=None,
@@ -4502,14 +4510,13 @@ def text_to_phonemes(
     step = 0
 
     # Iterate over all the interesting tuples.
-    for rule, phoneme, rule_text in rules_English_to_phonemes_regex:
+    for rule, phoneme, rule_text, character_string in \
+            rules_English_to_phonemes_compiled:
+        if character_string not in result:
+            continue
         # For each rule, 'tmp' is the string in which all matches for 'rule'
         # have been replaced by 'phoneme'.
-        tmp = match_and_replace(
-            text=result,
-            rule=rule,
-            phoneme=phoneme
-        )
+        tmp = rule.sub(phoneme, result)
         if explain and tmp != result:
             step += 1
             message = \
@@ -4519,7 +4526,7 @@ def text_to_phonemes(
                 result=result,
                 tmp=tmp,
                 rule_text=rule_text,
-                rule=rule
+                rule=rule.pattern
             ))
 
         result = tmp
@@ -4545,9 +4552,7 @@ def text_to_phonemes(
     # make uppercase
     result_uppercase = result_artifacts_removed.upper()
     # remove junk
-    acceptable_phonemes = [
-        key for key, value in phonemes_dictionary.iteritems()
-    ]
+    acceptable_phonemes = set(phonemes_dictionary)
     result_cleaning = []
     for word in result_uppercase.split(" "):
         tmp_word = []
@@ -4570,20 +4575,33 @@ def text_to_phonemes(
 #                                                                              #
 ################################################################################
 
+def normalize_values_to_range(
+        values=None,
+        minimum=0.0,
+        maximum=1.0
+):
+    """
+    Array of the values scaled to the range, as datavision.normalize_to_range
+    returns them.
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    minimum_value = values.min()
+    maximum_value = values.max()
+    return (maximum - minimum) * (values - minimum_value) / \
+        (maximum_value - minimum_value) + minimum
+
+
 def amplitude_data_to_binary_data(
         values,
         minimum=-1,
         maximum=1
 ):
-    values = datavision.normalize_to_range(
+    values = normalize_values_to_range(
         values,
         minimum=-1,
         maximum=1
     )
-    values_binary = ""
-    for value in values:
-        values_binary = values_binary + chr(int(value * 127 + 128))
-    return values_binary
+    return (values * 127 + 128).astype(numpy.uint8).tostring()
 
 
 def play_values(
@@ -4613,7 +4631,7 @@ def save_values_to_wave_file(
         number_of_channels=1,
         sample_width=2  # bytes per frame
 ):
-    values = datavision.normalize_to_range(
+    values = normalize_values_to_range(
         values,
         minimum=-(maximum_amplitude / 2),
         maximum=maximum_amplitude / 2
@@ -4622,10 +4640,8 @@ def save_values_to_wave_file(
     file_output.setnchannels(number_of_channels)
     file_output.setsampwidth(sample_width)
     file_output.setframerate(sample_rate)
-    for value in values:
-        write_data = struct.pack("<h", value)
-        file_output.writeframesraw(write_data)
-    file_output.writeframes("")
+    # truncated towards zero, like struct.pack of each value
+    file_output.writeframes(values.astype("<i2").tostring())
     file_output.close()
 
 
@@ -4656,17 +4672,59 @@ def phoneme_values(
             return (data_x, data_y)
 
 
+def phoneme_waveform(
+        data=None,
+        length=2000
+):
+    """
+    This function resamples phoneme data to length values, as
+    shijian.change_list_resolution does.
+    """
+    return numpy.interp(
+        numpy.linspace(0, len(data) - 1, length),
+        numpy.arange(len(data)),
+        data
+    )
+
+
+# The phoneme data resampled to the length spoken, once at load time, as
+# phoneme_values(phoneme=phoneme, length=2000) would.
+phonemes_waveforms = {
+    phoneme: phoneme_waveform(data=data)
+    for phoneme, data in phonemes_dictionary.iteritems()
+}
+
+
+def phonemes_waveforms_list(
+        phonemes_string=None,
+        phonemes_dictionary=None
+):
+    """
+    This function returns the waveforms of the phonemes of a word, the ones
+    of phonemes_waveforms or, given a dictionary of phoneme data, resampled
+    from it.
+    """
+    if phonemes_dictionary is None:
+        return [
+            phonemes_waveforms[phoneme]
+            for phoneme in phonemes_string.split("-")
+            if phoneme in phonemes_waveforms
+        ]
+    return [
+        phoneme_waveform(data=phonemes_dictionary[phoneme])
+        for phoneme in phonemes_string.split("-")
+        if phoneme in phonemes_dictionary
+    ]
+
+
 def phonemes_values(
         phonemes_string=None,
-        phonemes_dictionary=phonemes_dictionary
+        phonemes_dictionary=None
 ):
-    acceptable_phonemes = \
-        [key for key, value in phonemes_dictionary.iteritems()]
-    values = []
-    for phoneme in phonemes_string.split("-"):
-        if phoneme in acceptable_phonemes:
-            values.extend(phoneme_values(phoneme=phoneme, length=2000))
-    return values
+    return numpy.concatenate([numpy.zeros(0)] + phonemes_waveforms_list(
+        phonemes_string=phonemes_string,
+        phonemes_dictionary=phonemes_dictionary
+    ))
 
 
 def phonemes_words_values(
@@ -4676,29 +4734,24 @@ def phonemes_words_values(
     """
     This function converts sentences in phoneme form to amplitude values.
     """
-    values = []
+    waveforms = []
     for phonemes_string in phonemes_words.split(" "):
-        values.extend(
-            phonemes_values(
+        waveforms.extend(
+            phonemes_waveforms_list(
                 phonemes_string=phonemes_string
             )
         )
-        values.extend(
-            phoneme_values(
-                phoneme="space",
-                length=2000
-            )
-        )
-    values.extend(
-        phoneme_values(
-            phoneme="space",
-            length=2000
-        )
-    )
+        waveforms.append(phonemes_waveforms["space"])
+    waveforms.append(phonemes_waveforms["space"])
+    values = numpy.concatenate(waveforms)
     if change_waveform_to_rectangle_waveform is True:
-        values = shijian.change_waveform_to_rectangle_waveform(
-            values=values
-        )
+        # What shijian.change_waveform_to_rectangle_waveform did to the list
+        # of values: a list compares greater than a number in Python 2, so it
+        # set the second value to the maximum and the first to the minimum
+        # and scaled the rest.
+        values[1] = 0.01 * values.max()
+        values[0] = 0.01 * values.min()
+        values *= 100
     return values
 
 
@@ -3,7 +3,8 @@ import time
 import psutil
 import mycroft
 
-from mycroft.util.signal import check_for_signal
+from mycroft.util.signal import check_for_signal, create_signal, \
+    wait_for_signal
 
 __author__ = "forslund"
 
@@ -25,8 +26,7 @@ def wait_while_speaking():
     begin.
     """
     time.sleep(0.1)  # Wait briefly in for any queued speech to begin
-    while is_speaking():
-        time.sleep(0.1)
+    wait_for_signal("isSpeaking", present=False)
 
 
 def _kill(names):
@@ -27,7 +27,7 @@ import subprocess
 from mycroft.configuration import ConfigurationManager
 from mycroft.messagebus.client.ws import WebsocketClient
 from mycroft.messagebus.message import Message
-from mycroft.util.log import getLogger
+from mycroft.util.log import getLogger, LOG
 import mycroft.audio.speech as speech
 
 try:
@@ -452,6 +452,7 @@ def connect():
 def main():
     global ws
     global config
+    LOG.init('audio')
     ws = WebsocketClient()
     ConfigurationManager.init(ws)
     config = ConfigurationManager.get()
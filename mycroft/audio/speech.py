@@ -1,11 +1,14 @@
-from mycroft.tts import TTSFactory
+from mycroft import MYCROFT_ROOT_PATH
+from mycroft.tts import TTSFactory, TTSPipeline
+from mycroft.tts.cache import dialog_lines, get_cache
 from mycroft.util import create_signal, stop_speaking, check_for_signal
 from mycroft.lock import Lock as PIDLock  # Create/Support PID locking file
 from mycroft.configuration import ConfigurationManager
 from mycroft.messagebus.message import Message
 from mycroft.util.log import getLogger
 
-from threading import Lock
+from os.path import join
+from threading import Lock, Thread
 import time
 import re
 
@@ -15,6 +18,8 @@ ws = None
 config = None
 tts = None
 tts_hash = None
+pipeline = None
+prewarming = None
 lock = Lock()
 
 _last_stop_signal = 0
@@ -69,11 +74,12 @@ def handle_speak(event):
         create_signal("isSpeaking")
         if not config.get('enclosure', {}).get('platform') == "picroft":
             start = time.time()
-            chunks = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s',
-                              utterance)
-            for chunk in chunks:
+            chunks = split_sentences(utterance)
+            if pipeline_speak(chunks, start):
+                return
+            for i, chunk in enumerate(chunks):
                 try:
-                    mute_and_speak(chunk)
+                    mute_and_speak(chunk, None if i else start)
                 except KeyboardInterrupt:
                     raise
                 except:
@@ -81,34 +87,140 @@ def handle_speak(event):
                 if _last_stop_signal > start or check_for_signal('buttonPress'):
                     break
         else:
-            mute_and_speak(utterance)
+            mute_and_speak(utterance, time.time())
 
 
-def mute_and_speak(utterance):
-    """
-        Mute mic and start speaking the utterance using selected tts backend.
+def split_sentences(utterance):
+    """ split an utterance after every sentence """
+    return re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', utterance)
 
-        Args:
-            utterance: The sentence to be spoken
-    """
-    global tts_hash
-    global speak_flag
 
-    lock.acquire()
-    # update TTS object if configuration has changed
+def _update_tts():
+    """ recreate the TTS object if the configuration has changed """
+    global tts_hash
     if tts_hash != hash(str(config.get('tts', ''))):
         global tts
         # Stop tts playback thread
+        if pipeline:
+            pipeline.shutdown()
         tts.playback.stop()
         tts.playback.join()
         # Create new tts instance
         tts = TTSFactory.create()
         tts.init(ws)
+        _create_pipeline()
         tts_hash = hash(str(config.get('tts', '')))
 
+
+def _create_pipeline():
+    """ pipeline for the current tts, None if the engine speaks itself """
+    global pipeline
+    pipeline = None
+    pipeline_config = config.get('tts', {}).get('pipeline', {})
+    if tts.can_pipeline() and pipeline_config.get('enabled', True):
+        pipeline = TTSPipeline(tts, pipeline_config.get('workers', 2),
+                               pipeline_config.get('look_ahead', 2))
+
+
+def pipeline_speak(sentences, start):
+    """
+        Speak the sentences, synthesizing ahead of playback.
+
+        Args:
+            sentences: The sentences to be spoken, in order
+            start: time the speak request arrived
+
+        Returns:
+            False if the tts engine can not synthesize ahead of playback
+    """
+    with lock:
+        _update_tts()
+        if not pipeline:
+            return False
+        logger.info("Speak: " + " ".join(sentences))
+        if speak_flag:
+            def stopped():
+                return _last_stop_signal > start or \
+                    check_for_signal('buttonPress')
+
+            pipeline.speak([tts.validate_ssml(s) for s in sentences],
+                           start, stopped)
+    return True
+
+
+def prewarm(lines):
+    """
+        Synthesize the sentences of lines missing from the tts cache,
+        stopping once the cache has to evict to make room.
+
+        Args:
+            lines: The lines to be synthesized
+    """
+    cache = get_cache()
+    evictions = cache.evictions
+    synthesized = 0
+    for sentence in (sentence for line in lines
+                     for sentence in split_sentences(line)):
+        with lock:
+            _update_tts()
+            engine = tts
+        if not engine.can_pipeline():
+            break
+        sentence = engine.validate_ssml(sentence)
+        if not sentence or engine.is_cached(sentence):
+            continue
+        try:
+            snd_type, data, _ = engine.synthesize(sentence)
+            if snd_type == 'stream':
+                # cached once read through
+                for _ in data:
+                    pass
+        except Exception:
+            logger.error('Error prewarming: ' + sentence, exc_info=True)
+            continue
+        synthesized += 1
+        if cache.evictions != evictions:
+            logger.info("TTS cache is full")
+            break
+    logger.info("TTS cache prewarmed with %d sentences" % synthesized)
+
+
+def handle_prewarm(event):
+    """
+        handle mycroft.tts.cache.prewarm message, synthesizes the dialog
+        of the skills in the background
+    """
+    global prewarming
+    if prewarming and prewarming.is_alive():
+        return
+    skills_dir = config.get("skills", {}).get("directory", "default")
+    if skills_dir == "default":
+        skills_dir = join(MYCROFT_ROOT_PATH, "jarbas_skills")
+    prewarming = Thread(target=prewarm,
+                        args=(dialog_lines(skills_dir, tts.lang),))
+    prewarming.daemon = True
+    prewarming.start()
+
+
+def mute_and_speak(utterance, start=None):
+    """
+        Mute mic and start speaking the utterance using selected tts backend.
+
+        Args:
+            utterance: The sentence to be spoken
+            start: time the speak request arrived, for the first sentence
+                   of an utterance
+    """
+    global speak_flag
+
+    lock.acquire()
+    _update_tts()
+
     logger.info("Speak: " + utterance)
     try:
         if speak_flag:
+            if start:
+                tts.playback.begin_utterance(start)
             tts.validate_and_execute(utterance)
     finally:
         lock.release()
@@ -120,6 +232,8 @@ def handle_stop(event):
     """
     global _last_stop_signal
     _last_stop_signal = time.time()
+    if pipeline:
+        pipeline.cancel()
     tts.playback.clear_queue()
     tts.playback.clear_visimes()
     stop_speaking()
@@ -142,14 +256,18 @@ def init(websocket):
     ws.on('speak', handle_speak)
     ws.on('speak.enable', set_speak_flag)
     ws.on('speak.disable', unset_speak_flag)
+    ws.on('mycroft.tts.cache.prewarm', handle_prewarm)
 
     tts = TTSFactory.create()
     tts.init(ws)
-    tts_hash = config.get('tts')
+    _create_pipeline()
+    tts_hash = hash(str(config.get('tts', '')))
 
 
 def shutdown():
     global tts
+    if pipeline:
+        pipeline.shutdown()
     if tts:
         tts.playback.stop()
         tts.playback.join()
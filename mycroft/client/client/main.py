@@ -8,10 +8,8 @@ from twisted.internet.protocol import ReconnectingClientFactory
 
 # sys and crypto
 import sys, json, time
-from threading import Thread
+from threading import Thread, Event
 from os.path import dirname
-from Crypto.Cipher import AES
-from Crypto import Random
 import logging
 import base64
 
@@ -21,6 +19,9 @@ from mycroft.messagebus.message import Message
 from mycroft.util.log import getLogger
 from mycroft.client.client.pgp import get_own_keys, encrypt_string, decrypt_string, generate_client_key, export_key, import_key_from_ascii
 from mycroft.configuration import ConfigurationManager
+from mycroft.client.server.aes import AESSession, FRAMING_VERSION
+from mycroft.client.server.file_transfer import FileSender, \
+    DEFAULT_CHUNK_SIZE
 
 config = ConfigurationManager.get()
 config = config.get("jarbas_client", {})
@@ -57,15 +58,11 @@ class MyClientProtocol(WebSocketClientProtocol):
                 sys.exit()
             else:
                 # decrypt aes message
-                iv = self.factory.aes_iv
-                key = self.factory.aes_key
-                cipher = AES.new(key, AES.MODE_CFB, iv)
-                message = cipher.decrypt(payload)[len(iv):]
+                message = self.factory.aes.decrypt(payload)
                 deserialized_message = Message.deserialize(message)
                 logger.debug(message)
-                # update iv for next message
-                self.factory.aes_iv = deserialized_message.context.get("aes_iv", self.factory.aes_iv)
-                self.factory.aes_iv = base64.b64decode(self.factory.aes_iv)
+                if deserialized_message.context is None:
+                    deserialized_message.context = {}
                 # restore destinatary context
                 try:
                     target, sock = deserialized_message.context.get(
@@ -74,6 +71,8 @@ class MyClientProtocol(WebSocketClientProtocol):
                 except:
                     target = "all"
                 deserialized_message.context["destinatary"] = target
+                if deserialized_message.type.startswith("file.transfer."):
+                    self.factory.handle_file_transfer(deserialized_message)
                 # validate server message and emit to internal bus
                 if (self.factory.message_policy and deserialized_message.type not in self.factory.message_list) or (not self.factory.message_policy and deserialized_message.type in self.factory.message_list):
 
@@ -108,15 +107,15 @@ class MyClientProtocol(WebSocketClientProtocol):
                     sys.exit()
                 message = Message.deserialize(message)
                 data = message.data
-                self.factory.aes_iv = data["iv"]
-                self.factory.aes_key = data["aes_key"]
-                self.factory.aes_iv = base64.b64decode(self.factory.aes_iv)
-                self.factory.aes_key = base64.b64decode(self.factory.aes_key)
-                msg = self.Message_to_raw_data(Message("client.aes.exchange.complete", {"status": "success"}))
+                self.factory.aes = AESSession.from_b64(data["aes_key"])
+                # old servers do not announce framing and stay on version 0
+                framing = min(FRAMING_VERSION, data.get("framing", 0))
+                msg = self.Message_to_raw_data(Message("client.aes.exchange.complete", {"status": "success", "framing": framing}))
                 logger.debug("Sending AES encrypted acknowledgement")
-                cipher = AES.new(self.factory.aes_key, AES.MODE_CFB, self.factory.aes_iv)
-                msg = self.factory.aes_iv + cipher.encrypt(msg)
+                # acknowledgement always goes in version 0
+                msg = self.factory.aes.encrypt(msg, 0)
                 self.sendMessage(msg, isBinary=True)
+                self.factory.aes.set_version(framing)
                 self.factory.status = "connected"
                 logger.debug("Key exchange complete, you are communicating securely")
                 self.factory.client = self
@@ -155,8 +154,7 @@ class MyClientFactory(WebSocketClientFactory, ReconnectingClientFactory):
         # current session keys
         self.server_key = None
         self.server_fp = None
-        self.aes_key = None
-        self.aes_iv = None
+        self.aes = None
         self.my_id = None
         self.names = config.get("client_names", ["jarbas_client"])
 
@@ -175,6 +173,11 @@ class MyClientFactory(WebSocketClientFactory, ReconnectingClientFactory):
         self.waiting = False
         self.detected = False
 
+        # streaming file transfers, transfer_id: {"event", "data"}
+        self.transfers = {}
+        self.chunk_size = config.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        self.transfer_timeout = config.get("transfer_timeout", 10)
+
         self.status = "waiting server pgp"
         self.message_policy = config.get("message_policy", "blacklist") ==  "blacklist"
         self.message_list = config.get("message_list", [])
@@ -239,24 +242,74 @@ class MyClientFactory(WebSocketClientFactory, ReconnectingClientFactory):
         # TODO more types, type handling
         if stype == "file":
             logger.info("File requested, sending first")
-            bin_file = open(message_data["file"], "rb")
-            # message_data["file"] = bin_file.read()
-            self.sendMessage("incoming_file", {"target": "server"})
-            i = 0
-            while True:
-                i += 1
-                chunk = bin_file.read(4096)
-                logger.info("sending chunk " + str(i))
-                if not chunk:
-                    logger.info("Sending end_of_file")
-                    self.sendRaw("end_of_file")
-                    bin_file.close()
-                    break  # EOF
-                self.sendRaw(chunk)
+            transfer_id = self.send_file(message_data["file"])
+            if transfer_id is None:
+                # server does not stream files, use old transfer
+                self.send_file_chunks(message_data["file"])
+            else:
+                message_data["transfer_id"] = transfer_id
         message_data["source"] = requester
         logger.info("sending message with type: " + message_type)
         self.sendMessage(message_type, message_data, message_context)
 
+    def send_file(self, path):
+        """
+        Stream a file to the server, see mycroft.client.server.file_transfer
+
+        Returns the transfer id, or None if the server did not accept it
+        """
+        sender = FileSender(self.aes.key, path)
+        transfer = {"event": Event(), "data": {}}
+        self.transfers[sender.transfer_id] = transfer
+        extension = path.split(".")[-1] if "." in path else "bin"
+        self.sendMessage("file.transfer.start",
+                         {"transfer_id": sender.transfer_id,
+                          "size": sender.size,
+                          "chunk_size": self.chunk_size,
+                          "extension": extension,
+                          "iv": base64.b64encode(sender.iv)})
+        transfer["event"].wait(self.transfer_timeout)
+        self.transfers.pop(sender.transfer_id)
+        data = transfer["data"]
+        if "chunk_size" not in data:
+            logger.warning("file transfer not accepted by server")
+            return None
+        for frame in sender.frames(data["chunk_size"]):
+            self.client.sendMessage(frame, isBinary=True)
+        self.sendMessage("file.transfer.end",
+                         {"transfer_id": sender.transfer_id,
+                          "sha256": sender.hexdigest()})
+        logger.info("file sent: " + str(sender.size) + " bytes")
+        return sender.transfer_id
+
+    def send_file_chunks(self, path):
+        bin_file = open(path, "rb")
+        self.sendMessage("incoming_file", {"target": "server"})
+        i = 0
+        while True:
+            i += 1
+            chunk = bin_file.read(4096)
+            logger.info("sending chunk " + str(i))
+            if not chunk:
+                logger.info("Sending end_of_file")
+                self.sendRaw("end_of_file")
+                bin_file.close()
+                break  # EOF
+            self.sendRaw(chunk)
+
+    def handle_file_transfer(self, message):
+        transfer_id = message.data.get("transfer_id")
+        if message.type == "file.transfer.complete":
+            if not message.data.get("ok"):
+                logger.error("server rejected file " + str(transfer_id))
+            return
+        transfer = self.transfers.get(transfer_id)
+        if transfer is None:
+            return
+        if message.type == "file.transfer.accept":
+            transfer["data"] = message.data
+        transfer["event"].set()
+
     def handle_speak(self, event):
         utterance = event.data.get('utterance')
         mute = event.data.get('mute', False)
@@ -300,8 +353,7 @@ class MyClientFactory(WebSocketClientFactory, ReconnectingClientFactory):
             logger.error("Client is none")
             sys.exit()
         logger.debug("AES encrypting")
-        cipher = AES.new(self.aes_key, AES.MODE_CFB, self.aes_iv)
-        msg = self.aes_iv + cipher.encrypt(data)
+        msg = self.aes.encrypt(data)
         self.client.sendMessage(msg, isBinary=True)
 
     def sendMessage(self, type, data, context=None):
@@ -314,8 +366,7 @@ class MyClientFactory(WebSocketClientFactory, ReconnectingClientFactory):
 
         msg = self.client.Message_to_raw_data(Message(type, data, context))
         logger.debug("AES encrypting")
-        cipher = AES.new(self.aes_key, AES.MODE_CFB, self.aes_iv)
-        msg = self.aes_iv + cipher.encrypt(msg)
+        msg = self.aes.encrypt(msg)
         self.client.sendMessage(msg, isBinary=True)
         self.emitter.emit(Message("server.message.sent"))
 
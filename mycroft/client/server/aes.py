@@ -1,14 +1,74 @@
+"""
+AES session shared by a jarbas client and the server
+
+The session key is exchanged over pgp (client.aes.key), after that every
+binary frame is encrypted with it. Two framings exist:
+
+    version 0: iv + AES CFB-8 ciphertext, the original framing
+    version 1: "\\x01" + nonce + AES CTR ciphertext, much faster
+
+The server offers the highest version it knows in client.aes.key
+("framing"), the client answers with the version it picked in
+client.aes.exchange.complete, which is itself always sent as version 0.
+Old clients and servers never mention framing and stay on version 0.
+"""
+import base64
+import os
+from binascii import hexlify
+
 from Crypto.Cipher import AES
-from Crypto import Random
-secret_message = b'Attack at dawn'
-key = Random.get_random_bytes(32)
+from Crypto.Util import Counter
+
+__author__ = "jarbas"
+
+FRAMING_VERSION = 1
+FRAMING_VERSIONS = (0, 1)
+
+
+class AESSession(object):
+    def __init__(self, key, version=0):
+        # raw key bytes, decoded once per session
+        self.key = key
+        self.version = version
+
+    @staticmethod
+    def new_key():
+        return os.urandom(32)
+
+    @staticmethod
+    def new_iv():
+        return os.urandom(AES.block_size)
+
+    @classmethod
+    def from_b64(cls, key, version=0):
+        return cls(base64.b64decode(key), version)
 
-iv = Random.new().read(AES.block_size)
-iv_size = len(iv)
+    def set_version(self, version):
+        if version not in FRAMING_VERSIONS:
+            raise ValueError("unknown framing version " + str(version))
+        self.version = version
 
-cipher = AES.new(key, AES.MODE_CFB, iv)
+    def _ctr(self, nonce):
+        counter = Counter.new(128, initial_value=long(hexlify(nonce), 16))
+        return AES.new(self.key, AES.MODE_CTR, counter=counter)
 
-ciphertext = iv + cipher.encrypt(secret_message)
+    def encrypt(self, data, version=None):
+        if version is None:
+            version = self.version
+        iv = self.new_iv()
+        if version == 1:
+            return chr(1) + iv + self._ctr(iv).encrypt(data)
+        return iv + AES.new(self.key, AES.MODE_CFB, iv).encrypt(data)
 
-print "Encrypted: " + ciphertext
-print "Decrypted: " + cipher.decrypt(ciphertext)[iv_size:]
\ No newline at end of file
+    def decrypt(self, payload, version=None):
+        if version is None:
+            version = self.version
+        if version == 1:
+            if payload[:1] != chr(1):
+                raise ValueError("expected framing version 1")
+            iv = payload[1:1 + AES.block_size]
+            return self._ctr(iv).decrypt(
+                buffer(payload, 1 + AES.block_size))
+        iv = payload[:AES.block_size]
+        return AES.new(self.key, AES.MODE_CFB, iv).decrypt(
+            buffer(payload, AES.block_size))
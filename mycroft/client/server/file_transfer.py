@@ -0,0 +1,134 @@
+"""
+Streaming file transfers between jarbas clients and the server
+
+A transfer is negotiated with regular AES encrypted messages
+
+    client  file.transfer.start     {transfer_id, size, chunk_size,
+                                     extension, iv}
+    server  file.transfer.accept    {transfer_id, chunk_size}
+    client  binary chunk frames, see chunk_frame
+    client  file.transfer.end       {transfer_id, sha256}
+    server  file.transfer.complete  {transfer_id, ok, path}
+
+The whole file is a single AES CFB stream (session key, iv of the
+transfer), so each side uses one cipher object per transfer. Chunk frames
+carry the transfer id so several transfers per client can be in flight.
+"""
+import hashlib
+import os
+from uuid import uuid4
+
+from Crypto import Random
+from Crypto.Cipher import AES
+
+__author__ = "jarbas"
+
+FRAME_MAGIC = "JFT1"
+ID_SIZE = 32  # uuid4().hex
+HEADER_SIZE = len(FRAME_MAGIC) + ID_SIZE
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MIN_CHUNK_SIZE = 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+
+def new_transfer_id():
+    return uuid4().hex
+
+
+def chunk_frame(transfer_id, ciphertext):
+    return FRAME_MAGIC + transfer_id + ciphertext
+
+
+def parse_chunk_frame(payload):
+    """
+    Returns (transfer_id, ciphertext) of a chunk frame, ciphertext is a
+    buffer over the payload so nothing is copied, or (None, None) if the
+    payload is not a chunk frame
+    """
+    if len(payload) < HEADER_SIZE or \
+            payload[:len(FRAME_MAGIC)] != FRAME_MAGIC:
+        return None, None
+    return payload[len(FRAME_MAGIC):HEADER_SIZE], buffer(payload,
+                                                         HEADER_SIZE)
+
+
+def negotiate_chunk_size(requested, maximum=MAX_CHUNK_SIZE):
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        requested = DEFAULT_CHUNK_SIZE
+    return max(MIN_CHUNK_SIZE, min(requested, maximum))
+
+
+def safe_extension(extension):
+    extension = "".join(c for c in str(extension) if c.isalnum())[:10]
+    return "." + (extension or "bin")
+
+
+class FileTransfer(object):
+    """
+    Receiving end, decrypts chunks into a temporary file in the spool
+    directory that is moved into place once the hash checks out
+    """
+    def __init__(self, transfer_id, key, iv, path, size=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.transfer_id = transfer_id
+        self.path = path
+        self.temp_path = path + ".part"
+        self.size = size
+        self.chunk_size = chunk_size
+        self.received = 0
+        self.cipher = AES.new(key, AES.MODE_CFB, iv)
+        self.hash = hashlib.sha256()
+        self.file = open(self.temp_path, "wb")
+
+    def write(self, ciphertext):
+        data = self.cipher.decrypt(ciphertext)
+        self.hash.update(data)
+        self.file.write(data)
+        self.received += len(data)
+
+    def finish(self, sha256):
+        self.file.close()
+        ok = self.hash.hexdigest() == sha256 and \
+            (self.size is None or self.received == self.size)
+        if ok:
+            os.rename(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+        return ok
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class FileSender(object):
+    """
+    Sending end, reads the file into one reusable buffer and yields
+    encrypted chunk frames
+    """
+    def __init__(self, key, path):
+        self.transfer_id = new_transfer_id()
+        self.key = key
+        self.path = path
+        self.iv = Random.new().read(AES.block_size)
+        self.size = os.path.getsize(path)
+        self.hash = hashlib.sha256()
+
+    def frames(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        cipher = AES.new(self.key, AES.MODE_CFB, self.iv)
+        chunk = bytearray(chunk_size)
+        view = memoryview(chunk)
+        with open(self.path, "rb") as f:
+            while True:
+                size = f.readinto(chunk)
+                if not size:
+                    break
+                self.hash.update(view[:size])
+                yield chunk_frame(self.transfer_id,
+                                  cipher.encrypt(buffer(chunk, 0, size)))
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
@@ -1,20 +1,21 @@
 # system and crypto libs
 
 import sys
-from Crypto.Cipher import AES
-from Crypto import Random
 import logging
 import base64
 import json
+import tempfile
 import time
-from os.path import dirname, exists
+from collections import deque
+from os.path import dirname, exists, join, expanduser
 from threading import Thread
 
 # websocket libs
 
-from twisted.internet import reactor, ssl
+from twisted.internet import reactor, ssl, threads, defer
+from twisted.internet.interfaces import IPushProducer
 from twisted.python import log
-from twisted.internet import reactor
+from zope.interface import implementer
 
 from autobahn.twisted.websocket import WebSocketServerProtocol, \
     WebSocketServerFactory
@@ -23,7 +24,7 @@ from autobahn.twisted.websocket import WebSocketServerProtocol, \
 
 from mycroft.messagebus.client.ws import WebsocketClient
 from mycroft.messagebus.message import Message
-from mycroft.util.log import getLogger
+from mycroft.util.log import getLogger, LOG
 from jarbas_utils.skill_tools import UserManagerQuery
 
 from mycroft.skills.intent_service import IntentParser
@@ -31,6 +32,11 @@ from mycroft.client.server.pgp import get_own_keys, encrypt_string, decrypt_stri
     import_key_from_ascii
 from mycroft.configuration import ConfigurationManager
 from mycroft.client.server.self_signed import create_self_signed_cert
+from mycroft.client.server.aes import AESSession, FRAMING_VERSION, \
+    FRAMING_VERSIONS
+from mycroft.client.server.file_transfer import FileTransfer, \
+    parse_chunk_frame, negotiate_chunk_size, safe_extension
+from mycroft.util import ensure_directory_exists
 config = ConfigurationManager.get()
 config = config.get("jarbas_server", {})
 
@@ -42,7 +48,86 @@ gpglog = logging.getLogger("gnupg")
 gpglog.setLevel("WARNING")
 
 
+class ClientQueue(object):
+    """
+    Outbound messages of one client, drained in the reactor thread.
+
+    Messages are sent in order as soon as they are queued. When the
+    client transport can not keep up it pauses us (see MyServerProtocol)
+    and messages wait here, up to max_size.
+    """
+    def __init__(self, max_size=100):
+        self.messages = deque()
+        self.max_size = max_size
+        self.paused = False
+        # counters
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.total_latency = 0
+        self.max_latency = 0
+
+    def full(self):
+        return len(self.messages) >= self.max_size
+
+    def put(self, message):
+        self.messages.append((message, time.time()))
+        self.max_depth = max(self.max_depth, len(self.messages))
+
+    def drop_oldest(self):
+        self.messages.popleft()
+        self.dropped += 1
+
+    def get(self):
+        message, queued_at = self.messages.popleft()
+        latency = time.time() - queued_at
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        return message
+
+    def stats(self):
+        average = self.total_latency / self.sent if self.sent else 0
+        return {"depth": len(self.messages), "max_depth": self.max_depth,
+                "sent": self.sent, "dropped": self.dropped,
+                "paused": self.paused, "average_latency": average,
+                "max_latency": self.max_latency}
+
+
+class ClientIndex(object):
+    """
+    Peer lookups by socket number and by ip, kept in sync by
+    register_client / unregister_client so routing is O(1)
+    """
+    def __init__(self):
+        self.by_sock = {}
+        self.by_ip = {}
+
+    def add(self, peer):
+        t, ip, sock = peer.split(":")
+        self.by_sock[sock] = peer
+        if ip not in self.by_ip:
+            self.by_ip[ip] = set()
+        self.by_ip[ip].add(peer)
+
+    def remove(self, peer):
+        t, ip, sock = peer.split(":")
+        if self.by_sock.get(sock) == peer:
+            self.by_sock.pop(sock)
+        peers = self.by_ip.get(ip, set())
+        peers.discard(peer)
+        if not peers:
+            self.by_ip.pop(ip, None)
+
+    def peer_from_sock(self, sock_num):
+        return self.by_sock.get(str(sock_num))
+
+    def peers_from_ip(self, ip):
+        return list(self.by_ip.get(ip, []))
+
+
 # how to react to messages
+@implementer(IPushProducer)
 class MyServerProtocol(WebSocketServerProtocol):
     def onConnect(self, request):
         logger.info("Client connecting: {0}".format(request.peer))
@@ -57,13 +142,24 @@ class MyServerProtocol(WebSocketServerProtocol):
        """
         self.factory.register_client(self)
         self.factory.request_client_pgp(self)
+        # get paused when the client can not keep up with our writes
+        self.registerProducer(self, True)
         logger.info("WebSocket connection open.")
 
+    def pauseProducing(self):
+        self.factory.pause_client(self)
+
+    def resumeProducing(self):
+        self.factory.resume_client(self)
+
+    def stopProducing(self):
+        pass
+
     def onMessage(self, payload, isBinary):
         if isBinary:
-            logger.info("Binary message received: {0} bytes".format(len(payload)))
+            logger.info("Binary message received: %d bytes", len(payload))
         else:
-            logger.info("Text message received: {0}".format(payload.decode('utf8')))
+            logger.info("Text message received: %s", payload.decode('utf8'))
 
         self.factory.process_message(self, payload, isBinary)
 
@@ -85,6 +181,7 @@ class MyServerFactory(WebSocketServerFactory):
         super(MyServerFactory, self).__init__(*args, **kwargs)
         # list of clients
         self.clients = {}
+        self.index = ClientIndex()
         # server keys
         self.public = []
         self.private = []
@@ -99,14 +196,11 @@ class MyServerFactory(WebSocketServerFactory):
         self.create_internal_emitter()
         # mycroft utils
         self.parser = IntentParser(self.emitter)
-        self.user_manager = UserManagerQuery(name="server_ClientManager",
-                                             emitter=self.emitter)
 
-        # messages to send queue
-        self.message_queue = []
-        self.queue_thread = Thread(target=self._queue)
-        self.queue_thread.setDaemon(True)
-        self.queue_thread.start()
+        # outbound queues, see ClientQueue
+        self.send_queue_size = config.get("send_queue_size", 100)
+        # drop oldest queued message or disconnect slow clients
+        self.slow_client_policy = config.get("slow_client_policy", "drop")
 
         # allowed data
         self.ip_list = config.get("ip_list", [])
@@ -117,6 +211,8 @@ class MyServerFactory(WebSocketServerFactory):
                                  "names_response",
                                  "id_update",
                                  "incoming_file",
+                                 "file.transfer.start",
+                                 "file.transfer.end",
                                  "vision_result",
                                  "vision.faces.result",
                                  "vision.feed.result",
@@ -133,6 +229,12 @@ class MyServerFactory(WebSocketServerFactory):
         self.bus_message_list = config.get("message_list", self.bus_message_list)
 
         self.file_socks = {}
+        # received files
+        self.spool_dir = ensure_directory_exists(expanduser(config.get(
+            "spool_dir") or join(tempfile.gettempdir(), "jarbas_server")),
+            "spool")
+        self.max_chunk_size = config.get("max_chunk_size", 1024 * 1024)
+        self.max_transfers = config.get("max_transfers", 4)
 
     # initialize methods
     def load_server_keys(self):
@@ -170,6 +272,10 @@ class MyServerFactory(WebSocketServerFactory):
         self.emitter.on('complete_intent_failure', self.handle_failure)
         self.emitter.on('client.message.request',
                         self.handle_message_to_sock_request)
+        self.emitter.on('user.connected', self.handle_user_update)
+        self.emitter.on('user.updated', self.handle_user_update)
+        self.emitter.on('server.queue.stats.request',
+                        self.handle_queue_stats_request)
 
     def request_client_pgp(self, client, cipher="none"):
         type, ip, sock_num = client.peer.split(":")
@@ -184,9 +290,9 @@ class MyServerFactory(WebSocketServerFactory):
     # utils
     def aes_generate_pair(self, iv=None, key=None):
         if iv is None:
-            iv = Random.new().read(AES.block_size)
+            iv = AESSession.new_iv()
         if key is None:
-            key = Random.get_random_bytes(32)
+            key = AESSession.new_key()
         return iv, key
 
     # webasocket handlers
@@ -206,8 +312,12 @@ class MyServerFactory(WebSocketServerFactory):
             #  if not whitelisted kick
             self.unregister_client(client, reason=u"Unknown ip")
             return
-        self.clients[client.peer] = {"object": client, "status": "waiting pgp", "aes_key": None, "aes_iv": None,
-                                     "user_object": None, "pgp": None, "fingerprint": None}
+        self.clients[client.peer] = {"object": client, "status": "waiting pgp", "aes": None, "aes_iv": None,
+                                     "user_object": None, "pgp": None, "fingerprint": None,
+                                     "lock": defer.DeferredLock(), "user_data": None,
+                                     "queue": ClientQueue(self.send_queue_size),
+                                     "transfers": {}, "files": {}}
+        self.index.add(client.peer)
 
     def unregister_client(self, client, code=3078, reason=u"unregister client request"):
         """
@@ -226,26 +336,78 @@ class MyServerFactory(WebSocketServerFactory):
                              client_data.get("names",[])},
                         context))
             client.sendClose(code, reason)
+            for transfer in client_data["transfers"].values():
+                transfer.abort()
             self.clients.pop(client.peer)
+            self.index.remove(client.peer)
+
+    def client_from_sock(self, sock_num):
+        peer = self.index.peer_from_sock(sock_num)
+        if peer is None:
+            return None
+        return self.clients.get(peer)
+
+    def clients_from_ip(self, ip):
+        return [self.clients[peer] for peer in self.index.peers_from_ip(ip)
+                if peer in self.clients]
 
     # internals
-    def _queue(self):
-        while True:
-            for msg in self.message_queue:
-                logger.debug("Processing queue")
-                if msg[4] == "none" and "cipher" in msg[2].keys():
-                    msg[4] = msg[2]["cipher"]
-                logger.debug("Encryption: " + msg[4])
-                self.send_message(msg[0], msg[1], msg[2], msg[3], msg[4])
-                self.message_queue.remove(msg)
-                logger.debug("Sucessfully sent encrypted data")
-            time.sleep(0.1)
+    def queue_message(self, client, type, data, context, cipher="aes"):
+        """
+        Send a message to a client from any thread, in order
+        """
+        reactor.callFromThread(self._queue_message, client,
+                               [type, data, context, cipher])
+
+    def _queue_message(self, client, message):
+        if client.peer not in self.clients:
+            logger.warning("message for disconnected client dropped: " +
+                           str(client.peer))
+            return
+        queue = self.clients[client.peer]["queue"]
+        if queue.full():
+            if self.slow_client_policy == "disconnect":
+                logger.warning("send queue full, disconnecting " +
+                               str(client.peer))
+                self.unregister_client(client, reason=u"client too slow")
+                return
+            logger.warning("send queue full, dropping oldest message for " +
+                           str(client.peer))
+            queue.drop_oldest()
+        queue.put(message)
+        self.flush_queue(client)
+
+    def flush_queue(self, client):
+        if client.peer not in self.clients:
+            return
+        queue = self.clients[client.peer]["queue"]
+        while queue.messages and not queue.paused:
+            type, data, context, cipher = queue.get()
+            if cipher == "none" and "cipher" in data.keys():
+                cipher = data["cipher"]
+            logger.debug("Encryption: " + cipher)
+            self.send_message(client, type, data, context, cipher)
+
+    def pause_client(self, client):
+        if client.peer in self.clients:
+            logger.debug("pausing sends to " + str(client.peer))
+            self.clients[client.peer]["queue"].paused = True
+
+    def resume_client(self, client):
+        if client.peer in self.clients:
+            logger.debug("resuming sends to " + str(client.peer))
+            self.clients[client.peer]["queue"].paused = False
+            self.flush_queue(client)
+
+    def queue_stats(self):
+        return dict((peer, self.clients[peer]["queue"].stats())
+                    for peer in self.clients)
 
     def process_message(self, client, payload, isBinary):
         """
        Process message from client
        """
-        logger.info("processing message from client: " + str(client.peer))
+        logger.info("processing message from client: %s", client.peer)
         client_data = self.clients[client.peer]
         client_type, ip, sock_num = client.peer.split(":")
         if client_data["status"] == "waiting pgp":
@@ -281,12 +443,14 @@ class MyServerFactory(WebSocketServerFactory):
             self.clients[client.peer]["user"] = client_data.get("user")
             # generate and send aes key to client
             iv, key = self.aes_generate_pair()
+            # keep raw key bytes, frames are encrypted with it from now on
+            self.clients[client.peer]["aes"] = AESSession(key)
             iv = base64.b64encode(iv)
             key = base64.b64encode(key)
-            self.clients[client.peer]["aes_key"] = key
             self.clients[client.peer]["aes_iv"] = iv
             message_type = "client.aes.key"
-            message_data = {"aes_key": key, "iv": iv, "cipher": "pgp"}
+            message_data = {"aes_key": key, "iv": iv, "cipher": "pgp",
+                            "framing": FRAMING_VERSION}
             message_context = {"sock_num": sock_num}
             logger.info("Sending AES session key to client")
             self.clients[client.peer]["status"] = "waiting AES"
@@ -297,15 +461,16 @@ class MyServerFactory(WebSocketServerFactory):
             self.unregister_client(client, reason=u"Plaintext received, binary data always expected after pgp exchange")
             return
         if client_data["status"] == "waiting AES":
-            key = self.clients[client.peer]["aes_key"]
-            iv = self.clients[client.peer]["aes_iv"]
-            iv = base64.b64decode(iv)
-            key = base64.b64decode(key)
-            cipher = AES.new(key, AES.MODE_CFB, iv)
-            message = cipher.decrypt(payload)[len(iv):]
+            # always in framing version 0, it announces the one to use
+            message = client_data["aes"].decrypt(payload, 0)
             deserialized_message = Message.deserialize(message)
             if deserialized_message.data.get("status", "failed") == "success":
                 logger.debug("Secure connection ready")
+                framing = deserialized_message.data.get("framing", 0)
+                if framing in FRAMING_VERSIONS:
+                    client_data["aes"].set_version(framing)
+                logger.debug("AES framing version " +
+                             str(client_data["aes"].version))
                 client_data["status"] = "connected"
                 context = {"user": client_data["names"][0], "source": ip + ":" + str(sock_num)}
                 self.emitter.emit(
@@ -315,47 +480,45 @@ class MyServerFactory(WebSocketServerFactory):
                 logger.error("Secure connection failed")
                 self.unregister_client(client, reason=u"Secure connection failed")
         elif client_data["status"] == "connected":
+            transfer_id, chunk = parse_chunk_frame(payload)
+            if transfer_id in client_data["transfers"]:
+                # file chunk of a streaming transfer
+                client_data["transfers"][transfer_id].write(chunk)
+                return
             # decypt AES
-            key = self.clients[client.peer]["aes_key"]
-            iv = self.clients[client.peer]["aes_iv"]
-            iv = base64.b64decode(iv)
-            key = base64.b64decode(key)
-            cipher = AES.new(key, AES.MODE_CFB, iv)
-            message = cipher.decrypt(payload)[len(iv):]
+            message = client_data["aes"].decrypt(payload)
             deserialized_message = Message.deserialize(message)
             logger.debug(message)
             # parse message type
             self.process_message_type(client, deserialized_message)
         elif client_data["status"] == "receiving file":
             # decypt AES
-            key = self.clients[client.peer]["aes_key"]
-            iv = self.clients[client.peer]["aes_iv"]
-            iv = base64.b64decode(iv)
-            key = base64.b64decode(key)
-            cipher = AES.new(key, AES.MODE_CFB, iv)
-            message = cipher.decrypt(payload)[len(iv):]
+            message = client_data["aes"].decrypt(payload)
             # close open file
             if message == "end_of_file":
-                self.clients[client.peer]["status"] = "connected"
-                logger.info("file received for " + client.peer)
-                self.clients[client.peer]["file"].close()
-                self.clients[client.peer].pop("extension")
-                self.clients[client.peer].pop("file")
-            # write file chunk
-            else:
+                client_data["status"] = "connected"
+                if "file_chunks" in client_data:
+                    # not authorized yet, closed once it is
+                    client_data["file_ended"] = True
+                else:
+                    self.end_file(client)
+            # hold file chunk until authorized
+            elif "file_chunks" in client_data:
+                client_data["file_chunks"].append(message)
+            # write file chunk, dropped if the file was not authorized
+            elif client_data.get("file") is not None:
                 logger.info("file chunk received for " + client.peer)
-                self.clients[client.peer]["file"].write(message)
+                client_data["file"].write(message)
         else:
             # not supposed to happen
             logger.error("someone is doing something wrong, client status seems to be invalid: " + client_data["status"])
             self.unregister_client(client, reason=u"client status seems to be invalid: " + client_data["status"])
 
     def process_message_type(self, client, deserialized_message):
-        logger.debug("Message type: " + deserialized_message.type)
+        logger.debug("Message type: %s", deserialized_message.type)
         if (deserialized_message.type not in self.bus_message_list and self.message_blacklist) or \
                 (deserialized_message.type in self.bus_message_list and not self.message_blacklist):
-            data = deserialized_message.data
-            logger.debug("Message data: " + str(deserialized_message.data))
+            logger.debug("Message data: %s", deserialized_message.data)
             ctype, ip, sock_num = client.peer.split(":")
             # build context
             context = deserialized_message.context
@@ -370,72 +533,246 @@ class MyServerFactory(WebSocketServerFactory):
                 context["mute"] = False
             context["source"] = str(context["source"]) + ":" + sock_num
             context["ip"] = ip
-            logger.debug("Message context: " + str(context))
-            # authorize user message_type
-            # get user from sock
-            user_data = self.user_manager.user_from_sock(sock_num)
-            logger.debug("user data: " + str(user_data))
-            # see if this user can perform this action
-            if deserialized_message.type in user_data.get("forbidden_messages", []):
-                logger.warning("This user is not allowed to perform this action " + str(sock_num))
-                self.send_message(client, "speak", {"utterance": "Messages of type " + deserialized_message.type + " are not allowed for your account"}, context)
-                return
-            user = user_data.get("id", sock_num)
-            logger.debug("user data: " + str(user_data))
-            context["user"] = user
-            try:
-                context["user_name"] = user_data.get("nicknames", ["unknown "
-                                                                "name"])[0]
-            except:
-                context["user_name"] = "unknown name"
-            logger.debug(context)
-            # check if message also sent files
-            # TODO file formats
-            if self.clients[client.peer].get("file_path"):
-                fields = ["file", "file_path", "picture", "picture_path",
-                          "pic_path", "feed", "feed_path", "dream_source",
-                          "dream_seed", "path"]
-                for field in fields:
-                    if field in deserialized_message.data.keys():
-                        deserialized_message.data[field] = self.clients[
-                            client.peer]["file_path"]
-
-            # pre-process message type
-            if deserialized_message.type == "recognizer_loop:utterance":
-                utterance = data["utterances"][0]
-                # validate user utterance
-                self.validate_user_utterance(utterance, user_data, context,
-                                             client)
-            elif deserialized_message.type == "incoming_file":
-                logger.info("started receiving file for " + client.peer)
-                self.clients[client.peer]["status"] = "receiving file"
-                extension = deserialized_message.data.get("extension", ".jpg")
-                path = "../" + client.peer + extension
-                self.clients[client.peer]["extension"] = extension
-                self.clients[client.peer]["file_path"] = path
-                self.clients[client.peer]["file"] = open(path, 'wb')
-            else:
-                logger.info("no special handling provided for " + deserialized_message.type)
-                # message is whitelisted and no special handling was provided
-                self.emitter.emit(Message(deserialized_message.type, deserialized_message.data, context))
-            # notify user action
-            client_data = self.clients[client.peer]
-            context = {"user": client_data["names"][0], "source": ip + ":" + str(sock_num)}
-            try:
-                self.emitter.emit(
-                Message("user.request",
-                        {"ip": ip, "sock": sock_num, "pub_key": client_data["pgp"], "nicknames": client_data["names"]},
-                        context))
-            except Exception as e:
-                logger.error(e)
+            logger.debug("Message context: %s", context)
+            if deserialized_message.type == "incoming_file":
+                # file chunks follow right away, hold them until authorized
+                self.hold_file(client)
+            # authorize user message_type, one message at a time per client
+            # so ordering is kept, without blocking the reactor thread
+            d = self.clients[client.peer]["lock"].run(
+                self.authorize_message_async, client, deserialized_message,
+                context)
+            d.addErrback(self.handle_deferred_error, client)
         else:
             logger.warning("message type not allowed: " +
                            deserialized_message.type)
 
+    def authorize_message_async(self, client, deserialized_message, context):
+        user_data = self.clients[client.peer]["user_data"]
+        if user_data is not None:
+            d = defer.succeed(user_data)
+        else:
+            # cache miss, get user from sock in the reactor thread pool
+            ctype, ip, sock_num = client.peer.split(":")
+            d = threads.deferToThread(self.user_from_sock, sock_num)
+            d.addCallback(self.cache_user, client)
+        d.addCallback(self.authorize_message, client, deserialized_message,
+                      context)
+        return d
+
+    def user_from_sock(self, sock_num):
+        """
+        Ask the client manager for the user of a connection, a query per
+        lookup since lookups of several clients run at the same time
+        """
+        query = UserManagerQuery(name="server_ClientManager",
+                                 emitter=self.emitter)
+        return query.user_from_sock(sock_num)
+
+    def cache_user(self, user_data, client):
+        """
+        Keep the user record of a connection until the client manager
+        tells us it changed, see handle_user_update
+        """
+        if client.peer in self.clients and user_data and \
+                user_data.get("id") is not None:
+            self.clients[client.peer]["user_data"] = user_data
+        return user_data
+
+    def authorize_message(self, user_data, client, deserialized_message,
+                          context):
+        """
+        Called back in the reactor thread once the user manager answered
+        """
+        if client.peer not in self.clients:
+            logger.warning("client disconnected before authorization " +
+                           str(client.peer))
+            return
+        if user_data is None:
+            # without the user record nothing can be checked, reject
+            logger.error("user manager did not answer for " +
+                         str(client.peer))
+            if deserialized_message.type == "incoming_file":
+                self.discard_file(client)
+            self.send_message(client, "speak", {
+                "utterance": "Your account could not be verified, please "
+                             "try again"}, context)
+            return
+        data = deserialized_message.data
+        ctype, ip, sock_num = client.peer.split(":")
+        logger.debug("user data: " + str(user_data))
+        # see if this user can perform this action
+        if deserialized_message.type in user_data.get("forbidden_messages", []):
+            logger.warning("This user is not allowed to perform this action " + str(sock_num))
+            if deserialized_message.type == "incoming_file":
+                self.discard_file(client)
+            self.send_message(client, "speak", {"utterance": "Messages of type " + deserialized_message.type + " are not allowed for your account"}, context)
+            return
+        user = user_data.get("id", sock_num)
+        context["user"] = user
+        try:
+            context["user_name"] = user_data.get("nicknames", ["unknown "
+                                                            "name"])[0]
+        except:
+            context["user_name"] = "unknown name"
+        logger.debug(context)
+        # check if message also sent files
+        # TODO file formats
+        file_path = self.clients[client.peer]["files"].get(
+            data.get("transfer_id"), self.clients[client.peer].get(
+                "file_path"))
+        if file_path:
+            fields = ["file", "file_path", "picture", "picture_path",
+                      "pic_path", "feed", "feed_path", "dream_source",
+                      "dream_seed", "path"]
+            for field in fields:
+                if field in deserialized_message.data.keys():
+                    deserialized_message.data[field] = file_path
+
+        # pre-process message type
+        d = None
+        if deserialized_message.type == "recognizer_loop:utterance":
+            utterance = data["utterances"][0]
+            # validate user utterance
+            d = self.validate_user_utterance(utterance, user_data, context,
+                                             client)
+        elif deserialized_message.type == "file.transfer.start":
+            self.start_transfer(client, deserialized_message, context)
+        elif deserialized_message.type == "file.transfer.end":
+            self.end_transfer(client, deserialized_message, context)
+        elif deserialized_message.type == "incoming_file":
+            self.receive_file(client, deserialized_message)
+        else:
+            logger.info("no special handling provided for " + deserialized_message.type)
+            # message is whitelisted and no special handling was provided
+            self.emitter.emit(Message(deserialized_message.type, deserialized_message.data, context))
+        # notify user action
+        client_data = self.clients[client.peer]
+        context = {"user": client_data["names"][0], "source": ip + ":" + str(sock_num)}
+        try:
+            self.emitter.emit(
+            Message("user.request",
+                    {"ip": ip, "sock": sock_num, "pub_key": client_data["pgp"], "nicknames": client_data["names"]},
+                    context))
+        except Exception as e:
+            logger.error(e)
+        return d
+
+    def hold_file(self, client):
+        """
+        Chunks follow incoming_file right away, keep them in memory until
+        the user is authorized to send files
+        """
+        client_data = self.clients[client.peer]
+        client_data["status"] = "receiving file"
+        client_data["file"] = None
+        client_data["file_chunks"] = []
+        client_data["file_ended"] = False
+
+    def receive_file(self, client, deserialized_message):
+        logger.info("started receiving file for " + client.peer)
+        client_data = self.clients[client.peer]
+        extension = safe_extension(
+            deserialized_message.data.get("extension", ".jpg"))
+        ctype, ip, sock_num = client.peer.split(":")
+        path = join(self.spool_dir, sock_num + extension)
+        client_data["extension"] = extension
+        client_data["file_path"] = path
+        client_data["file"] = open(path, 'wb')
+        for chunk in client_data.pop("file_chunks", []):
+            client_data["file"].write(chunk)
+        if client_data.get("file_ended"):
+            self.end_file(client)
+
+    def discard_file(self, client):
+        """ drop the chunks of a file the user may not send """
+        logger.warning("file discarded for " + client.peer)
+        client_data = self.clients[client.peer]
+        client_data.pop("file_chunks", None)
+        client_data.pop("file_ended", None)
+        # not attached to later messages either
+        client_data.pop("file_path", None)
+
+    def end_file(self, client):
+        client_data = self.clients[client.peer]
+        if client_data.get("file") is not None:
+            logger.info("file received for " + client.peer)
+            client_data["file"].close()
+        client_data.pop("extension", None)
+        client_data.pop("file", None)
+        client_data.pop("file_ended", None)
+
+    def start_transfer(self, client, deserialized_message, context):
+        client_data = self.clients[client.peer]
+        data = deserialized_message.data
+        transfer_id = str(data.get("transfer_id", ""))
+        if len(client_data["transfers"]) >= self.max_transfers:
+            logger.warning("too many file transfers for " + client.peer)
+            self.queue_message(client, "file.transfer.reject",
+                               {"transfer_id": transfer_id,
+                                "reason": "too many transfers"}, context)
+            return
+        if not transfer_id.isalnum() or \
+                transfer_id in client_data["transfers"]:
+            logger.error("invalid transfer id from " + client.peer)
+            return
+        chunk_size = negotiate_chunk_size(data.get("chunk_size"),
+                                          self.max_chunk_size)
+        ctype, ip, sock_num = client.peer.split(":")
+        path = join(self.spool_dir, sock_num + "_" + transfer_id +
+                    safe_extension(data.get("extension", ".jpg")))
+        client_data["transfers"][transfer_id] = FileTransfer(
+            transfer_id, client_data["aes"].key,
+            base64.b64decode(data["iv"]), path, data.get("size"),
+            chunk_size)
+        logger.info("started file transfer " + transfer_id + " for " +
+                    client.peer)
+        self.queue_message(client, "file.transfer.accept",
+                           {"transfer_id": transfer_id,
+                            "chunk_size": chunk_size}, context)
+
+    def end_transfer(self, client, deserialized_message, context):
+        client_data = self.clients[client.peer]
+        transfer_id = deserialized_message.data.get("transfer_id")
+        transfer = client_data["transfers"].pop(transfer_id, None)
+        if transfer is None:
+            logger.error("unknown file transfer " + str(transfer_id))
+            return
+        ok = transfer.finish(deserialized_message.data.get("sha256"))
+        if ok:
+            logger.info("file transfer " + transfer_id + " complete: " +
+                        str(transfer.received) + " bytes")
+            client_data["files"][transfer_id] = transfer.path
+            client_data["file_path"] = transfer.path
+        else:
+            logger.error("file transfer " + transfer_id +
+                         " failed integrity check")
+        self.queue_message(client, "file.transfer.complete",
+                           {"transfer_id": transfer_id, "ok": ok},
+                           context)
+
+    def handle_deferred_error(self, failure, client):
+        logger.error("authorization failed for " + str(client.peer) + ": " +
+                     failure.getErrorMessage())
+
     def validate_user_utterance(self, utterance, user_data, context, client):
         # check if skill/intent that will trigger is authorized for this user
         logger.info("Authorizing utterance for user")
-        intent, skill = self.parser.determine_intent(utterance)
+        d = threads.deferToThread(self.parser.determine_intent, utterance)
+        d.addCallback(self.authorize_utterance, utterance, user_data,
+                      context, client)
+        return d
+
+    def authorize_utterance(self, intent_data, utterance, user_data, context,
+                            client):
+        """
+        Called back in the reactor thread once the intent was determined
+        """
+        if client.peer not in self.clients:
+            logger.warning("client disconnected before authorization " +
+                           str(client.peer))
+            return
+        intent, skill = intent_data
         if int(skill) == 0:
             # TODO intent failure, authorize fallback
             pass
@@ -451,13 +788,13 @@ class MyServerFactory(WebSocketServerFactory):
 
         if skill in user_data.get("forbidden_skills", config.get(
                 "forbidden_skills", [])):
-            logger.warning("Skill " + skill + " is not allowed for " + user_data.get("nicknames", [client.peer])[0])
+            logger.warning("Skill " + str(skill) + " is not allowed for " + user_data.get("nicknames", [client.peer])[0])
             self.send_message(client, "speak", {
-                "utterance": skill + " is not allowed for your account"},
+                "utterance": str(skill) + " is not allowed for your account"},
                               context, cipher="aes")
 
             return
-        logger.debug("emitting utterance to bus: " + str(utterance))
+        logger.debug("emitting utterance to bus: %s", utterance)
         self.emitter.emit(
             Message("recognizer_loop:utterance",
                     {'utterances': [utterance.strip()]}, context))
@@ -474,8 +811,8 @@ class MyServerFactory(WebSocketServerFactory):
     def send_message(self, client, type="speak", data=None, context=None, cipher="none"):
         if data is None:
             data = {}
-        logger.info("Sending message to " + str(client.peer))
-        logger.info("cipher: " + cipher + " context: " + str(context) + " data: " + str(data))
+        logger.info("Sending message to %s", client.peer)
+        logger.debug("cipher: %s context: %s data: %s", cipher, context, data)
         message = self.Message_to_raw_data(Message(type, data, context))
         if cipher == "pgp":
             logger.debug("target pgp fingerprint: " + self.clients[client.peer].get("fingerprint"))
@@ -487,20 +824,16 @@ class MyServerFactory(WebSocketServerFactory):
                 message = str(message)
                 logger.debug(message)
         if cipher == "aes":
-            # start encryptor
-            iv = self.clients[client.peer]["aes_iv"]
-            iv = base64.b64decode(iv)
-            key = self.clients[client.peer]["aes_key"]
-            key = base64.b64decode(key)
-            cipher = AES.new(key, AES.MODE_CFB, iv)
-            # generate new iv
-            new_iv, key = self.aes_generate_pair()
-            new_iv = base64.b64encode(new_iv)
-            self.clients[client.peer]["aes_iv"] = new_iv
-            context["aes_iv"] = new_iv
+            session = self.clients[client.peer]["aes"]
+            if session.version == 0:
+                # old clients expect the next iv in the context, every
+                # frame carries its own iv so any fresh one will do
+                context = dict(context or {})
+                context["aes_iv"] = base64.b64encode(AESSession.new_iv())
+                message = self.Message_to_raw_data(
+                    Message(type, data, context))
             # encrypt message
-            message = self.Message_to_raw_data(Message(type, data, context))
-            message = iv + cipher.encrypt(message)
+            message = session.encrypt(message)
             client.sendMessage(message, isBinary=True)
             return message
         client.sendMessage(message.encode("utf-8"))
@@ -538,11 +871,32 @@ class MyServerFactory(WebSocketServerFactory):
             cipher = data["cipher"]
         sock_num = user_id.split(":")[1]
         logger.info("Message_Request: sock:" + sock_num + " with type: " + type)
-        for client in self.clients:
-            c, ip, sock = client.split(":")
-            if sock == sock_num:
-                self.message_queue.append([self.clients[client]["object"], type, data, context, cipher])
-                return
+        client_data = self.client_from_sock(sock_num)
+        if client_data is not None:
+            self.queue_message(client_data["object"], type, data, context,
+                               cipher)
+
+    def handle_user_update(self, event):
+        # client manager (re)resolved a user, refresh cached permissions
+        sock_num = event.data.get("sock")
+        if sock_num is None:
+            return
+        reactor.callFromThread(self.update_cached_user, str(sock_num),
+                               event.data.get("user_data"))
+
+    def update_cached_user(self, sock_num, user_data):
+        client_data = self.client_from_sock(sock_num)
+        if client_data is not None:
+            # no record means invalidate, next message looks it up
+            client_data["user_data"] = user_data
+
+    def handle_queue_stats_request(self, event):
+        # clients only change in the reactor thread, read them there
+        reactor.callFromThread(self.emit_queue_stats, event)
+
+    def emit_queue_stats(self, event):
+        self.emitter.emit(event.reply("server.queue.stats.reply",
+                                      {"clients": self.queue_stats()}))
 
     def handle_failure(self, event):
         # TODO warn user of possible lack of answer (wait for wolfram alpha x seconds first)
@@ -558,13 +912,12 @@ class MyServerFactory(WebSocketServerFactory):
         logger.debug("Answer: " + utterance + " Target: " + target)
         target, sock_num = target.split(":")
         answer_type = "speak"
-        for client in self.clients:
-            c, ip, sock = client.split(":")
-            if sock == sock_num:
-                logger.debug("Adding answer to answering queue")
-                self.message_queue.append(
-                    [self.clients[client]["object"], answer_type, event.data, event.context, "aes"])
-                return
+        client_data = self.client_from_sock(sock_num)
+        if client_data is not None:
+            logger.debug("Adding answer to answering queue")
+            self.queue_message(client_data["object"], answer_type,
+                               event.data, event.context, "aes")
+            return
         logger.error("Speak targeted to non existing client")
 
     def config_update(self, config=None, save=False, isSystem=False):
@@ -576,6 +929,7 @@ class MyServerFactory(WebSocketServerFactory):
             Message("configuration.patch", {"config": config}))
 
 if __name__ == '__main__':
+    LOG.init('server')
     # more logs
     log.startLogging(sys.stdout)
 
@@ -588,6 +942,9 @@ if __name__ == '__main__':
                       dirname(__file__) + '/certs/jarbas_server.crt')
     key = config.get("key_file", dirname(__file__) + '/certs/jarbas_server.key')
 
+    # user lookups and intent authorization run on the reactor thread pool
+    reactor.suggestThreadPoolSize(config.get("worker_threads", 10))
+
     factory = MyServerFactory(adress)
     factory.protocol = MyServerProtocol
     if max_connections >= 0:
@@ -26,7 +26,7 @@ from mycroft.configuration import ConfigurationManager
 from mycroft.identity import IdentityManager
 from mycroft.messagebus.client.ws import WebsocketClient
 from mycroft.messagebus.message import Message
-from mycroft.util.log import getLogger
+from mycroft.util.log import getLogger, LOG
 from mycroft.lock import Lock as PIDLock  # Create/Support PID locking file
 
 logger = getLogger("SpeechClient")
@@ -62,6 +62,10 @@ def handle_hotword(event):
     ws.emit(Message('recognizer_loop:hotword', event))
 
 
+def handle_mic_level(event):
+    ws.emit(Message('recognizer_loop:mic_level', event))
+
+
 def handle_external_audio(event):
     logger.info("External audio STT request: " + event.data["wave_file"])
     loop.emit(Message('recognizer_loop:external_audio', event.data))
@@ -158,6 +162,7 @@ def main():
     global loop
     global config
     lock = PIDLock("voice")
+    LOG.init('speech')
     ws = WebsocketClient()
     config = ConfigurationManager.get()
     ConfigurationManager.init(ws)
@@ -167,6 +172,7 @@ def main():
     loop.on('recognizer_loop:record_begin', handle_record_begin)
     loop.on('recognizer_loop:wakeword', handle_wakeword)
     loop.on('recognizer_loop:hotword', handle_hotword)
+    loop.on('recognizer_loop:mic_level', handle_mic_level)
     loop.on('recognizer_loop:speak', handle_speak)
     loop.on('recognizer_loop:record_end', handle_record_end)
     loop.on('recognizer_loop:no_internet', handle_no_internet)
@@ -40,11 +40,11 @@ from mycroft.configuration import ConfigurationManager
 from mycroft.session import SessionManager
 from mycroft.util import (
     check_for_signal,
-    get_ipc_directory,
     resolve_resource_file,
     play_wav
 )
 from mycroft.util.log import getLogger
+from mycroft.util.mic_level import MicLevelWriter
 
 logger = getLogger(__name__)
 __author__ = 'seanfitz'
@@ -139,6 +139,68 @@ class MutableMicrophone(Microphone):
         return self.muted
 
 
+class CyclicAudioBuffer(object):
+    """
+        Fixed size buffer keeping the latest audio.
+
+        Audio is copied in place into a preallocated bytearray, nothing is
+        reallocated or shifted as chunks are added. Once full, every chunk
+        overwrites the oldest audio.
+    """
+    def __init__(self, size, initial_data=b''):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        # where the next byte goes
+        self.pos = 0
+        self.length = 0
+        self.append(initial_data)
+
+    def __len__(self):
+        return self.length
+
+    def append(self, data):
+        n = len(data)
+        if n >= self.size:
+            self.view[:] = memoryview(data)[n - self.size:]
+            self.pos = 0
+            self.length = self.size
+            return
+        end = self.pos + n
+        if end <= self.size:
+            self.view[self.pos:end] = data
+        else:
+            data = memoryview(data)
+            split = self.size - self.pos
+            self.view[self.pos:] = data[:split]
+            self.view[:n - split] = data[split:]
+        self.pos = end % self.size
+        self.length = min(self.size, self.length + n)
+
+    def copy_last(self, n, target):
+        """
+            Copy the latest n bytes (all if fewer are buffered) to the start
+            of target, a writable buffer. Returns the bytes copied.
+        """
+        n = min(n, self.length)
+        start = self.pos - n
+        if start >= 0:
+            target[:n] = self.view[start:self.pos]
+        else:
+            target[:-start] = self.view[self.size + start:]
+            target[-start:n] = self.view[:self.pos]
+        return n
+
+    def get_last(self, n):
+        """ the latest n bytes (all if fewer are buffered) """
+        data = bytearray(min(n, self.length))
+        self.copy_last(n, data)
+        return bytes(data)
+
+    def get(self):
+        return self.get_last(self.length)
+
+
 class ResponsiveRecognizer(speech_recognition.Recognizer):
     # Padding of silence when feeding to pocketsphinx
     SILENCE_SEC = 0.01
@@ -194,7 +256,10 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                                or self.upload_config.get('enable', False)
         self.upload_lock = Lock()
         self.filenames_to_upload = []
-        self.mic_level_file = os.path.join(get_ipc_directory(), "mic_level")
+        # energy levels shared with other processes, at most rate per second
+        level_config = listener_config.get('mic_level', {})
+        self.mic_level = MicLevelWriter(rate=level_config.get('rate', 10))
+        self.mic_level_on_bus = level_config.get('bus', False)
         self._stop_signaled = False
         self.hot_word_engines = hot_word_engines
 
@@ -251,13 +316,13 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         max_chunks_of_silence = int(self.RECORDING_TIMEOUT_WITH_SILENCE /
                                     sec_per_buffer)
 
-        # bytearray to store audio in
-        byte_data = '\0' * source.SAMPLE_WIDTH
+        # chunks of audio, joined once the phrase is complete
+        chunks = ['\0' * source.SAMPLE_WIDTH]
 
         phrase_complete = False
         while num_chunks < max_chunks and not phrase_complete:
             chunk = self.record_sound_chunk(source)
-            byte_data += chunk
+            chunks.append(chunk)
             num_chunks += 1
 
             energy = self.calc_energy(chunk, source.SAMPLE_WIDTH)
@@ -270,11 +335,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                 noise = decrease_noise(noise)
                 self._adjust_threshold(energy, sec_per_buffer)
 
-            if num_chunks % 10 == 0:
-                with open(self.mic_level_file, 'w') as f:
-                    f.write("Energy:  cur=" + str(energy) + " thresh=" +
-                            str(self.energy_threshold))
-                f.close()
+            self.mic_level.report(energy, self.energy_threshold)
 
             was_loud_enough = num_loud_chunks > min_loud_chunks
 
@@ -293,7 +354,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
             if check_for_signal('buttonPress'):
                 phrase_complete = True
 
-        return byte_data
+        return b''.join(chunks)
 
     @staticmethod
     def sec_to_bytes(sec, source):
@@ -367,15 +428,19 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
 
         silence = '\0' * num_silent_bytes
 
-        # bytearray to store audio in
-        byte_data = silence
-
         buffers_per_check = self.SEC_BETWEEN_WW_CHECKS / sec_per_buffer
         buffers_since_check = 0.0
 
-        # Max bytes for byte_data before audio is removed from the front
+        # Audio kept, the oldest audio is overwritten by new chunks.
+        # A chunk more than the audio saved, as the buffer used to grow.
         max_size = self.sec_to_bytes(self.SAVED_WW_SEC, source)
-        test_size = self.sec_to_bytes(self.TEST_WW_SEC, source)
+        chunk_size = source.CHUNK * source.SAMPLE_WIDTH
+        audio_buffer = CyclicAudioBuffer(int(max_size) + chunk_size, silence)
+        # Audio tested for the wake word, all the audio kept if 0
+        test_size = int(self.sec_to_bytes(self.TEST_WW_SEC, source)) or \
+            audio_buffer.size
+        # The tested audio is copied here, followed by the silence
+        test_data = bytearray(test_size + num_silent_bytes)
 
         said_wake_word = False
 
@@ -387,7 +452,6 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         avg_energy = 0.0
         energy_avg_samples = int(5 / sec_per_buffer)  # avg over last 5 secs
 
-        counter = 0
         while not said_wake_word and not self._stop_signaled:
             if self._skip_wake_word():
                 break
@@ -416,27 +480,19 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
 
             # Periodically output energy level stats.  This can be used to
             # visualize the microphone input, e.g. a needle on a meter.
-            if counter % 3:
-                with open(self.mic_level_file, 'w') as f:
-                    f.write("Energy:  cur=" + str(energy) + " thresh=" +
-                            str(self.energy_threshold))
-                f.close()
-            counter += 1
-
-            # At first, the buffer is empty and must fill up.  After that
-            # just drop the first chunk bytes to keep it the same size.
-            needs_to_grow = len(byte_data) < max_size
-            if needs_to_grow:
-                byte_data += chunk
-            else:  # Remove beginning of audio and add new chunk to end
-                byte_data = byte_data[len(chunk):] + chunk
+            self.mic_level.report(energy, self.energy_threshold)
+
+            audio_buffer.append(chunk)
 
             buffers_since_check += 1.0
             if buffers_since_check > buffers_per_check:
                 buffers_since_check -= buffers_per_check
-                chopped = byte_data[-test_size:] \
-                    if test_size < len(byte_data) else byte_data
-                audio_data = chopped + silence
+                tested = audio_buffer.copy_last(test_size, test_data)
+                if tested == test_size:
+                    audio_data = bytes(test_data)
+                else:
+                    # the buffer is still filling up
+                    audio_data = bytes(test_data[:tested]) + silence
                 said_wake_word = \
                     self.wake_word_recognizer.found_wake_word(audio_data)
                 # if a wake word is success full then record audio in temp
@@ -556,6 +612,8 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         logger.debug("Adjusting for ambient noise")
         self.adjust_for_ambient_noise(source, 1.0)
 
+        if self.mic_level_on_bus:
+            self.mic_level.emitter = emitter
         logger.debug("Waiting for wake word...")
         self._wait_until_wake_word(source, sec_per_buffer, emitter)
         if self._stop_signaled:
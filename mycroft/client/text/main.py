@@ -36,8 +36,9 @@ import json                                                 # nopep8
 from threading import Thread, Lock                          # nopep8
 from mycroft.messagebus.client.ws import WebsocketClient    # nopep8
 from mycroft.messagebus.message import Message              # nopep8
-from mycroft.util import get_ipc_directory                  # nopep8
 from mycroft.util.log import LOG  # nopep8
+from mycroft.util.mic_level import MicLevelReader, \
+    get_mic_level_file  # nopep8
 
 ws = None
 mutex = Lock()
@@ -198,47 +199,31 @@ def start_log_monitor(filename):
 
 
 class MicMonitorThread(Thread):
-    def __init__(self, filename):
+    def __init__(self, reader):
         Thread.__init__(self)
-        self.filename = filename
-        self.st_results = os.stat(filename)
+        self.reader = reader
+        self.seq = None
 
     def run(self):
+        global meter_cur
+        global meter_thresh
+
         while True:
             try:
-                st_results = os.stat(self.filename)
-
-                if (not st_results.st_ctime == self.st_results.st_ctime or
-                        not st_results.st_mtime == self.st_results.st_mtime):
-                    self.read_file_from(0)
-                    self.st_results = st_results
+                level = self.reader.read()
+                if level and level[0] != self.seq:
+                    # Just adjust meter settings
+                    self.seq, meter_cur, meter_thresh = level
                     draw_screen()
             finally:
                 time.sleep(0.1)
 
-    def read_file_from(self, bytefrom):
-        global meter_cur
-        global meter_thresh
-
-        with open(self.filename, 'rb') as fh:
-            fh.seek(bytefrom)
-            while True:
-                line = fh.readline()
-                if line == "":
-                    break
-
-                # Just adjust meter settings
-                # Ex:Energy:  cur=4 thresh=1.5
-                parts = line.split("=")
-                meter_thresh = float(parts[len(parts) - 1])
-                meter_cur = float(parts[len(parts) - 2].split(" ")[0])
-
 
 def start_mic_monitor(filename):
-    if os.path.isfile(filename):
-        thread = MicMonitorThread(filename)
-        thread.setDaemon(True)  # this thread won't prevent prog from exiting
-        thread.start()
+    # the level shows up once the speech client has started
+    thread = MicMonitorThread(MicLevelReader(filename))
+    thread.setDaemon(True)  # this thread won't prevent prog from exiting
+    thread.start()
 
 
 def add_log_message(message):
@@ -900,8 +885,8 @@ start_log_monitor(localLogPath + "/mycroft-voice.log")
 start_log_monitor("/var/log/mycroft-skills.log")
 start_log_monitor("/var/log/mycroft-speech-client.log")
 
-# Monitor IPC file containing microphone level info
-start_mic_monitor(os.path.join(get_ipc_directory(), "mic_level"))
+# Monitor microphone level info shared by the speech client
+start_mic_monitor(get_mic_level_file())
 
 
 def main():
@@ -1,9 +1,93 @@
 from mycroft.messagebus.message import Message
-import time
+from threading import Event, Lock
+from uuid import uuid4
+from weakref import WeakKeyDictionary
 
 __author__ = "jarbas"
 
 
+class BusQueryDispatcher(object):
+    """
+        Routes replies to pending BusQuery objects sharing one emitter.
+
+        Every query gets a unique "query_id" in its message context,
+        responders echo it back and the matching query is resolved as soon
+        as the reply arrives. Replies without a "query_id" (responders that
+        do not propagate context) resolve the oldest query waiting for that
+        message type.
+
+        A single listener is kept per response type, no matter how many
+        queries are in flight, and removed when nobody is waiting for it.
+    """
+    _dispatchers = WeakKeyDictionary()
+    _dispatchers_lock = Lock()
+
+    def __init__(self, emitter):
+        self.emitter = emitter
+        self.lock = Lock()
+        self.pending = {}
+        self.waiting = {}
+
+    @classmethod
+    def get(cls, emitter):
+        with cls._dispatchers_lock:
+            dispatcher = cls._dispatchers.get(emitter)
+            if dispatcher is None:
+                dispatcher = cls(emitter)
+                cls._dispatchers[emitter] = dispatcher
+            return dispatcher
+
+    def register(self, query):
+        with self.lock:
+            self.pending[query.query_id] = query
+            for response_type in query.response_types:
+                if response_type not in self.waiting:
+                    self.waiting[response_type] = []
+                    self.emitter.on(response_type, self._handle)
+                self.waiting[response_type].append(query.query_id)
+
+    def unregister(self, query):
+        with self.lock:
+            self.pending.pop(query.query_id, None)
+            for response_type in query.response_types:
+                query_ids = self.waiting.get(response_type)
+                if query_ids is None:
+                    continue
+                if query.query_id in query_ids:
+                    # timed out, nobody answered
+                    query_ids.remove(query.query_id)
+                if not query_ids:
+                    self.waiting.pop(response_type)
+                    self._remove_listener(response_type)
+
+    def _remove_listener(self, response_type):
+        # WebsocketClient exposes remove, a bare pyee emitter remove_listener
+        if hasattr(self.emitter, "remove"):
+            self.emitter.remove(response_type, self._handle)
+        else:
+            self.emitter.remove_listener(response_type, self._handle)
+
+    def _handle(self, message):
+        context = message.context or {}
+        query_id = context.get("query_id")
+        with self.lock:
+            query_ids = self.waiting.get(message.type, [])
+            if query_id is None and query_ids:
+                query_id = query_ids[0]
+            if query_id not in query_ids:
+                # reply to somebody else's query, or already answered
+                return
+            query = self.pending.pop(query_id)
+            for ids in self.waiting.values():
+                if query_id in ids:
+                    ids.remove(query_id)
+        query.resolve(message)
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.pending)
+
+
 class BusQuery():
     def __init__(self, emitter, message_type, message_data=None,
                  message_context=None):
@@ -13,32 +97,43 @@ class BusQuery():
         self.query_type = message_type
         self.query_data = message_data
         self.query_context = message_context
+        self.query_id = None
+        self.response_types = []
+        self._answered = Event()
 
-    def _end_wait(self, message):
+    def resolve(self, message):
         self.response = message
         self.waiting = False
+        self._answered.set()
 
     def _wait_response(self, timeout):
-        start = time.time()
-        elapsed = 0
         self.waiting = True
-        while self.waiting and elapsed < timeout:
-            elapsed = time.time() - start
-            time.sleep(0.1)
+        self._answered.wait(timeout)
         self.waiting = False
 
     def send(self, response_type=None, timeout=10):
         self.response = Message(None, None, None)
+        self._answered.clear()
         if response_type is None:
             response_type = self.query_type + ".reply"
         self.add_response_type(response_type)
-        self.emitter.emit(
-            Message(self.query_type, self.query_data, self.query_context))
-        self._wait_response(timeout)
+        self.query_id = str(uuid4())
+        context = dict(self.query_context or {})
+        context["query_id"] = self.query_id
+        dispatcher = BusQueryDispatcher.get(self.emitter)
+        dispatcher.register(self)
+        try:
+            self.emitter.emit(
+                Message(self.query_type, self.query_data, context))
+            self._wait_response(timeout)
+        finally:
+            # answered or timed out, either way stop listening
+            dispatcher.unregister(self)
         return self.response.data
 
     def add_response_type(self, response_type):
-        self.emitter.once(response_type, self._end_wait)
+        if response_type not in self.response_types:
+            self.response_types.append(response_type)
 
     def get_response_type(self):
         return self.response.type
@@ -72,5 +167,11 @@ class BusResponder():
             self.response_context = context
 
     def respond(self, message):
+        context = self.response_context
+        query_id = (message.context or {}).get("query_id")
+        if query_id is not None:
+            # echo correlation id so the query resolves immediately
+            context = dict(context or {})
+            context["query_id"] = query_id
         self.emitter.emit(Message(self.response_type, self.response_data,
-                                  self.response_context))
+                                  context))
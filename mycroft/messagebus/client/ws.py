@@ -17,6 +17,7 @@
 import json
 import time
 from multiprocessing.pool import ThreadPool
+from threading import Lock
 
 from pyee import EventEmitter
 from websocket import WebSocketApp
@@ -45,6 +46,9 @@ class WebsocketClient(object):
         self.emitter = EventEmitter()
         self.client = self.create_client()
         self.pool = ThreadPool(10)
+        # handlers and skill loaders emit from many threads, frames must
+        # not interleave on the socket
+        self.send_lock = Lock()
         self.retry = 5
 
     def build_url(self, host, port, route, ssl):
@@ -88,9 +92,11 @@ class WebsocketClient(object):
                 not self.client.sock.connected):
             return
         if hasattr(message, 'serialize'):
-            self.client.send(message.serialize())
+            data = message.serialize()
         else:
-            self.client.send(json.dumps(message.__dict__))
+            data = json.dumps(message.__dict__)
+        with self.send_lock:
+            self.client.send(data)
 
     def on(self, event_name, func):
         self.emitter.on(event_name, func)
@@ -58,6 +58,8 @@ class WebsocketEventHandler(tornado.websocket.WebSocketHandler):
             client.write_message(message)
 
     def open(self):
+        # small request/reply messages, do not let Nagle hold them back
+        self.set_nodelay(True)
         self.write_message(Message("connected").serialize())
         client_connections.append(self)
 
@@ -29,6 +29,7 @@ from os.path import join, abspath, dirname, splitext, isdir, \
     basename, exists
 from os import listdir
 from functools import wraps
+from threading import Lock
 
 from adapt.intent import Intent, IntentBuilder
 
@@ -38,7 +39,11 @@ from mycroft.dialog import DialogLoader
 from mycroft.filesystem import FileSystemAccess
 from mycroft.messagebus.message import Message
 from mycroft.util.log import getLogger
+from mycroft.skills.lazy import LazySkill, SkillEmitter, load_manifest, \
+    save_manifest, create_manifest
 from mycroft.skills.settings import SkillSettings
+from mycroft.skills.vocab_cache import VocabCache
+from mycroft.skills.watcher import get_last_modified_date
 from mycroft import MYCROFT_ROOT_PATH
 
 from inspect import getargspec
@@ -52,11 +57,52 @@ if config_dir == "default":
 else:
     SKILLS_DIR = config_dir
 
+# skills loaded only once they are needed, see mycroft.skills.lazy
+LAZY_SKILLS = skills_config.get("lazy_skills", [])
+
 MainModule = '__init__'
 
+# parsed vocabulary and regex files, kept on disk between runs
+vocab_cache = VocabCache(skills_config.get("vocab_cache", True))
+
 logger = getLogger(__name__)
 
 
+def read_vocab_file(path, vocab_type):
+    """
+        Read a vocabulary file (*.voc)
+
+        Args:
+            path:       path to vocabulary file
+            vocab_type: keyword name
+        Returns:    list of register_vocab data, one per entity and alias
+    """
+    vocab = []
+    with open(path, 'r') as voc_file:
+        for line in voc_file.readlines():
+            parts = line.strip().split("|")
+            entity = parts[0]
+            vocab.append({'start': entity, 'end': vocab_type})
+            for alias in parts[1:]:
+                vocab.append({'start': alias, 'end': vocab_type,
+                              'alias_of': entity})
+    return vocab
+
+
+def read_regex_file(path):
+    """
+        Read and validate a regex file (*.rx)
+
+        Returns:    list of register_vocab data, one per regex
+    """
+    vocab = []
+    with open(path, 'r') as reg_file:
+        for line in reg_file.readlines():
+            re.compile(line.strip())
+            vocab.append({'regex': line.strip()})
+    return vocab
+
+
 def load_vocab_from_file(path, vocab_type, emitter):
     """
         Load mycroft vocabulary from file. and send it on the message bus for
@@ -68,18 +114,8 @@ def load_vocab_from_file(path, vocab_type, emitter):
             emitter:    emitter to access the message bus
     """
     if path.endswith('.voc'):
-        with open(path, 'r') as voc_file:
-            for line in voc_file.readlines():
-                parts = line.strip().split("|")
-                entity = parts[0]
-
-                emitter.emit(Message("register_vocab", {
-                    'start': entity, 'end': vocab_type
-                }))
-                for alias in parts[1:]:
-                    emitter.emit(Message("register_vocab", {
-                        'start': alias, 'end': vocab_type, 'alias_of': entity
-                    }))
+        for data in read_vocab_file(path, vocab_type):
+            emitter.emit(Message("register_vocab", data))
 
 
 def load_regex_from_file(path, emitter):
@@ -92,11 +128,8 @@ def load_regex_from_file(path, emitter):
             emitter:    emitter to access the message bus
     """
     if path.endswith('.rx'):
-        with open(path, 'r') as reg_file:
-            for line in reg_file.readlines():
-                re.compile(line.strip())
-                emitter.emit(
-                    Message("register_vocab", {'regex': line.strip()}))
+        for data in read_regex_file(path):
+            emitter.emit(Message("register_vocab", data))
 
 
 def load_vocabulary(basedir, emitter):
@@ -113,6 +146,18 @@ def load_regex(basedir, emitter):
                 join(basedir, regex_type), emitter)
 
 
+def read_vocabulary(basedir):
+    """ register_vocab data of every vocabulary file in basedir """
+    return vocab_cache.read(
+        basedir, ".voc",
+        lambda path: read_vocab_file(path, splitext(basename(path))[0]))
+
+
+def read_regex(basedir):
+    """ register_vocab data of every regex file in basedir """
+    return vocab_cache.read(basedir, ".rx", read_regex_file)
+
+
 def open_intent_envelope(message):
     """ Convert dictionary received over messagebus to Intent. """
     intent_dict = message.data
@@ -122,7 +167,8 @@ def open_intent_envelope(message):
                   intent_dict.get('optional'))
 
 
-def load_skill(skill_descriptor, emitter, skill_id, BLACKLISTED_SKILLS=None):
+def load_skill(skill_descriptor, emitter, skill_id, BLACKLISTED_SKILLS=None,
+               lazy=None):
     """
         load skill from skill descriptor.
 
@@ -130,6 +176,8 @@ def load_skill(skill_descriptor, emitter, skill_id, BLACKLISTED_SKILLS=None):
             skill_descriptor: descriptor of skill to load
             emitter:          messagebus emitter
             skill_id:         id number for skill
+            lazy:             defer loading until the skill is needed,
+                              by default if the skill is in lazy_skills
     """
     BLACKLISTED_SKILLS = BLACKLISTED_SKILLS or []
     try:
@@ -138,29 +186,11 @@ def load_skill(skill_descriptor, emitter, skill_id, BLACKLISTED_SKILLS=None):
         if skill_descriptor['name'] in BLACKLISTED_SKILLS:
             logger.info("SKILL IS BLACKLISTED " + skill_descriptor["name"])
             return None
-        skill_module = imp.load_module(
-            skill_descriptor["name"] + MainModule, *skill_descriptor["info"])
-        if (hasattr(skill_module, 'create_skill') and
-                callable(skill_module.create_skill)):
-            # v2 skills framework
-            skill = skill_module.create_skill()
-            if not skill.is_current_language_supported():
-                logger.info("SKILL DOES NOT SUPPORT CURRENT LANGUAGE")
-                return None
-            skill.bind(emitter)
-            skill.skill_id = skill_id
-            skill.load_data_files(dirname(skill_descriptor['info'][1]))
-            # Set up intent handlers
-            skill.initialize()
-            logger.info(
-                "Loaded " + skill_descriptor["name"] + " with ID " + str(
-                    skill_id))
-            skill._register_decorated()
-            return skill
-        else:
-            logger.warn(
-                "Module %s does not appear to be skill" % (
-                    skill_descriptor["name"]))
+        if lazy is None:
+            lazy = skill_descriptor['name'] in LAZY_SKILLS
+        if lazy:
+            return load_lazy_skill(skill_descriptor, emitter, skill_id)
+        return _create_skill(skill_descriptor, emitter, skill_id)
     except:
         logger.error(
             "Failed to load skill: " + skill_descriptor["name"],
@@ -168,6 +198,75 @@ def load_skill(skill_descriptor, emitter, skill_id, BLACKLISTED_SKILLS=None):
     return None
 
 
+def _create_skill(skill_descriptor, emitter, skill_id):
+    """ import the skill module and create and initialize the skill """
+    with _load_lock:
+        skill_module = imp.load_module(
+            skill_descriptor["name"] + MainModule,
+            *skill_descriptor["info"])
+        # handlers decorated while importing belong to this skill
+        decorated = _pop_decorated()
+    if (hasattr(skill_module, 'create_skill') and
+            callable(skill_module.create_skill)):
+        # v2 skills framework
+        skill = skill_module.create_skill()
+        if not skill.is_current_language_supported():
+            logger.info("SKILL DOES NOT SUPPORT CURRENT LANGUAGE")
+            return None
+        skill.bind(emitter)
+        skill.skill_id = skill_id
+        skill.load_data_files(dirname(skill_descriptor['info'][1]))
+        # Set up intent handlers
+        skill.initialize()
+        logger.info(
+            "Loaded " + skill_descriptor["name"] + " with ID " + str(
+                skill_id))
+        skill._register_decorated(decorated)
+        return skill
+    else:
+        logger.warn(
+            "Module %s does not appear to be skill" % (
+                skill_descriptor["name"]))
+    return None
+
+
+def load_lazy_skill(skill_descriptor, emitter, skill_id):
+    """
+        Load a skill from its manifest, the skill module is imported when
+        one of its intents or *.request messages arrives. Without an up to
+        date manifest the skill is loaded now and its manifest saved.
+
+        Returns:    a LazySkill, the loaded skill or None
+    """
+    name = skill_descriptor["name"]
+    path = dirname(skill_descriptor['info'][1])
+    lang = ConfigurationManager.get().get("lang")
+    modified = get_last_modified_date(path)
+    manifest = load_manifest(name, modified, lang)
+    if manifest is None:
+        skill_emitter = SkillEmitter(emitter)
+        skill = _create_skill(skill_descriptor, skill_emitter, skill_id)
+        skill_emitter.recording = False
+        if skill:
+            save_manifest(name, create_manifest(skill, skill_emitter,
+                                                modified, lang))
+        return skill
+
+    if skill_descriptor['info'][0]:
+        skill_descriptor['info'][0].close()
+
+    def loader(skill_emitter):
+        return _create_skill(create_skill_descriptor(path), skill_emitter,
+                             skill_id)
+
+    skill = LazySkill(name, emitter, skill_id, manifest, loader,
+                      name + MainModule,
+                      skills_config.get("lazy_idle_timeout", 0))
+    skill.register()
+    logger.info("Waiting for " + name + " to be needed before loading it")
+    return skill
+
+
 def get_skills(skills_folder):
     logger.info("LOADING SKILLS FROM " + skills_folder)
     skills = []
@@ -217,6 +316,18 @@ def get_handler_name(handler):
 # Lists used when adding skill handlers using decorators
 _intent_list = []
 _intent_file_list = []
+# skills can be loaded from several threads, imports and the decorated
+# handlers they add are taken one skill at a time
+_load_lock = Lock()
+
+
+def _pop_decorated():
+    """ Return and reset the decorated intent and intent file handlers """
+    global _intent_list, _intent_file_list
+    decorated = (_intent_list, _intent_file_list)
+    _intent_list = []
+    _intent_file_list = []
+    return decorated
 
 
 def intent_handler(intent_parser):
@@ -385,17 +496,19 @@ class MycroftSkill(object):
         self.emitter.emit(Message('active_skill_request',
                                   {"skill_id": self.skill_id}))
 
-    def _register_decorated(self):
+    def _register_decorated(self, decorated=None):
         """
         Register all intent handlers that has been decorated with an intent.
+
+        Args:
+            decorated: (intent handlers, intent file handlers) collected
+                       when the skill was imported, pending ones if None
         """
-        global _intent_list, _intent_file_list
-        for intent_parser, handler in _intent_list:
+        intent_list, intent_file_list = decorated or _pop_decorated()
+        for intent_parser, handler in intent_list:
             self.register_intent(intent_parser, handler, need_self=True)
-        for intent_file, handler in _intent_file_list:
+        for intent_file, handler in intent_file_list:
             self.register_intent_file(intent_file, handler, need_self=True)
-        _intent_list = []
-        _intent_file_list = []
 
     def add_event(self, name, handler, need_self=False):
         """
@@ -688,20 +801,36 @@ class MycroftSkill(object):
 
     def load_data_files(self, root_directory):
         self.init_dialog(root_directory)
-        self.load_vocab_files(join(root_directory, 'vocab', self.lang))
+        vocab = self._read_vocab_files(join(root_directory, 'vocab',
+                                            self.lang))
         regex_path = join(root_directory, 'regex', self.lang)
         if exists(regex_path):
-            self.load_regex_files(regex_path)
+            vocab += read_regex(regex_path)
+        self.register_vocab_batch(vocab)
 
-    def load_vocab_files(self, vocab_dir):
+    def _read_vocab_files(self, vocab_dir):
         self.vocab_dir = vocab_dir
         if exists(vocab_dir):
-            load_vocabulary(vocab_dir, self.emitter)
-        else:
-            logger.debug('No vocab loaded, ' + vocab_dir + ' does not exist')
+            return read_vocabulary(vocab_dir)
+        logger.debug('No vocab loaded, ' + vocab_dir + ' does not exist')
+        return []
+
+    def load_vocab_files(self, vocab_dir):
+        self.register_vocab_batch(self._read_vocab_files(vocab_dir))
 
     def load_regex_files(self, regex_dir):
-        load_regex(regex_dir, self.emitter)
+        self.register_vocab_batch(read_regex(regex_dir))
+
+    def register_vocab_batch(self, vocab):
+        """
+            Register many words and regexes in a single message.
+
+            Args:
+                vocab:  list of register_vocab message data
+        """
+        if vocab:
+            self.emitter.emit(Message('register_vocab_batch',
+                                      {'vocab': vocab}))
 
     def __handle_stop(self, event):
         """
@@ -1,27 +1,55 @@
+import errno
+import fcntl
+import heapq
 import json
+import os
+import select
 import time
-from Queue import Queue
-from threading import Thread
+from threading import Thread, Lock
 
 from os.path import isfile
 
 from mycroft.messagebus.message import Message
 from mycroft.util.log import LOG
 
+# journal lines written before the schedule file is rewritten, at least
+COMPACT_JOURNAL = 1000
+# removed events left in the heap before it is rebuilt, at least
+COMPACT_HEAP = 1000
+
 
 class EventScheduler(Thread):
+    """
+        Emits scheduled events on the messagebus.
+
+        Pending events are kept in a heap ordered by time, the thread sleeps
+        until the first one is due or until the schedule changes. Python 2
+        timed Condition.wait polls, so the thread sleeps in select on a pipe
+        that is written to when the schedule changes.
+
+        Changes are appended to a journal next to the schedule file, the
+        schedule file itself is only rewritten when the journal grew larger
+        than the schedule and on shutdown.
+    """
     def __init__(self, emitter, schedule_file='/opt/mycroft/schedule.json'):
         super(EventScheduler, self).__init__()
+        # event name -> pending [time, seq, event, repeat, data] entries
         self.events = {}
+        self.heap = []
+        self.seq = 0
+        self.removed = 0
+        self.lock = Lock()
         self.emitter = emitter
         self.isRunning = True
         self.schedule_file = schedule_file
+        self.journal = None
+        self.journal_lines = 0
+        self._wake_r, self._wake_w = os.pipe()
+        flags = fcntl.fcntl(self._wake_w, fcntl.F_GETFL)
+        fcntl.fcntl(self._wake_w, fcntl.F_SETFL, flags | os.O_NONBLOCK)
         if self.schedule_file:
             self.load()
 
-        self.add = Queue()
-        self.remove = Queue()
-        self.update = Queue()
         self.emitter.on('mycroft.scheduler.schedule_event',
                         self.schedule_event_handler)
         self.emitter.on('mycroft.scheduler.remove_event',
@@ -30,86 +58,161 @@ class EventScheduler(Thread):
                         self.update_event_handler)
         self.start()
 
+    @property
+    def journal_file(self):
+        return self.schedule_file + '.journal'
+
     def load(self):
         """
-            Load json data with active events from json file.
+            Load active events from the schedule file and its journal.
+
+            Non repeating events that already happened are discarded,
+            repeating events that were missed are emitted once.
         """
+        events = {}
+        journaled = isfile(self.journal_file)
         if isfile(self.schedule_file):
             with open(self.schedule_file) as f:
                 try:
-                    json_data = json.load(f)
+                    events = json.load(f)
                 except Exception as e:
                     LOG.error(e)
-            current_time = time.time()
-            for key in json_data:
-                event_list = json_data[key]
-                # discard non repeating events that has already happened
-                self.events[key] = [tuple(e) for e in event_list
-                                    if e[0] > current_time or e[1]]
-
-    def fetch_new_events(self):
-        """
-            Fetch new events and add to list of pending events.
-        """
-        while not self.add.empty():
-            event, sched_time, repeat, data = self.add.get(timeout=1)
-            # get current list of scheduled times for event, [] if missing
-            event_list = self.events.get(event, [])
-            # add received event and time
-            event_list.append((sched_time, repeat, data))
-            self.events[event] = event_list
-
-    def remove_events(self):
-        """
-            Remove event from event list.
-        """
-        while not self.remove.empty():
-            event = self.remove.get()
-            if event in self.events:
-                self.events.pop(event)
+        for event in events:
+            events[event] = [list(item) for item in events[event]]
+        if journaled:
+            with open(self.journal_file) as f:
+                for line in f:
+                    try:
+                        self._replay(events, json.loads(line))
+                    except (ValueError, KeyError, IndexError):
+                        # interrupted write
+                        pass
+        current_time = time.time()
+        for event in events:
+            for sched_time, repeat, data in events[event]:
+                if sched_time <= current_time:
+                    if not repeat:
+                        continue
+                    # only the last missed repetition
+                    missed = int((current_time - sched_time) / repeat)
+                    sched_time += missed * repeat
+                self._push(event, sched_time, repeat, data)
+        if journaled:
+            # start over from a compact schedule file
+            self.store()
 
-    def update_events(self):
-        """
-            Update event list with new data.
-        """
-        while not self.remove.empty():
-            event, data = self.update.get()
-            # if there is an active event with this name
-            if len(self.events.get(event, [])) > 0:
-                time, repeat, _ = self.events[event][0]
-                self.events[event][0] = (time, repeat, data)
+    @staticmethod
+    def _replay(events, change):
+        op = change['op']
+        event = change['event']
+        if op == 'add':
+            events.setdefault(event, []).append(
+                [change['time'], change['repeat'], change['data']])
+        elif op == 'remove':
+            events.pop(event, None)
+        elif op == 'update' and events.get(event):
+            # entries that already fired are still listed, match the
+            # occurrence that was updated
+            for item in sorted(events[event]):
+                if EventScheduler._occurs(item, change['time']):
+                    item[0] = change['time']
+                    item[2] = change['data']
+                    break
+
+    @staticmethod
+    def _occurs(item, sched_time):
+        """ whether the [time, repeat, data] item occurs at sched_time """
+        first, repeat, _ = item
+        if first == sched_time:
+            return True
+        if not repeat or first > sched_time:
+            return False
+        # the live times are summed up interval by interval
+        repetitions = round((sched_time - first) / repeat)
+        return abs(first + repetitions * repeat - sched_time) < 0.001
+
+    def _log(self, change):
+        """ append a change to the journal, called with the lock held """
+        if not self.schedule_file:
+            return
+        try:
+            if self.journal is None:
+                self.journal = open(self.journal_file, 'a')
+            self.journal.write(json.dumps(change) + '\n')
+            self.journal.flush()
+        except (IOError, OSError) as e:
+            LOG.error('Could not write schedule journal: ' + str(e))
+            return
+        self.journal_lines += 1
+        if self.journal_lines > max(COMPACT_JOURNAL, 2 * len(self.heap)):
+            self._store()
+
+    def _push(self, event, sched_time, repeat, data):
+        """ add a pending event, called with the lock held """
+        self.seq += 1
+        entry = [sched_time, self.seq, event, repeat, data]
+        heapq.heappush(self.heap, entry)
+        self.events.setdefault(event, []).append(entry)
+        return entry
+
+    def _pop_due(self, current_time):
+        """ remove and return the events due, called with the lock held """
+        due = []
+        while self.heap and self.heap[0][0] <= current_time:
+            entry = heapq.heappop(self.heap)
+            sched_time, _, event, repeat, data = entry
+            if event is None:
+                self.removed -= 1
+                continue
+            pending = self.events[event]
+            for i, e in enumerate(pending):
+                if e is entry:
+                    del pending[i]
+                    break
+            if repeat:
+                self._push(event, sched_time + repeat, repeat, data)
+            elif not pending:
+                del self.events[event]
+            due.append((event, data))
+        return due
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, 'x')
+        except OSError as e:
+            # the pipe is full, the thread will wake up anyway
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def _sleep(self, timeout):
+        """ sleep timeout seconds (None: forever) or until woken up """
+        readable, _, _ = select.select([self._wake_r], [], [], timeout)
+        if readable:
+            os.read(self._wake_r, 4096)
 
     def run(self):
         while self.isRunning:
-            # Fetch newly scheduled events
-            self.fetch_new_events()
-            # Remove events
-            self.remove_events()
-            # Update events
-            self.update_events()
-
-            # Check all events
-            for event in self.events:
+            with self.lock:
                 current_time = time.time()
-                e = self.events[event]
-                # Get scheduled times that has passed
-                passed = [(t, r, d) for (t, r, d) in e if t <= current_time]
-                # and remaining times that we're still waiting for
-                remaining = [(t, r, d) for t, r, d in e if t > current_time]
-                # Trigger registered methods
-                for sched_time, repeat, data in passed:
-                    self.emitter.emit(Message(event, data))
-                    # if this is a repeated event add a new trigger time
-                    if repeat:
-                        remaining.append((sched_time + repeat, repeat, data))
-                # update list of events
-                self.events[event] = remaining
-            time.sleep(0.5)
+                due = self._pop_due(current_time)
+                timeout = None
+                if self.heap:
+                    timeout = max(0, self.heap[0][0] - current_time)
+            for event, data in due:
+                self.emitter.emit(Message(event, data))
+            if not due:
+                self._sleep(timeout)
 
     def schedule_event(self, event, sched_time, repeat=None, data=None):
-        """ Send event to thread using thread safe queue. """
+        """ Add event to the schedule and wake the thread. """
         data = data or {}
-        self.add.put((event, sched_time, repeat, data))
+        with self.lock:
+            entry = self._push(event, sched_time, repeat, data)
+            self._log({'op': 'add', 'event': event, 'time': sched_time,
+                       'repeat': repeat, 'data': data})
+            first = self.heap[0] is entry
+        if first:
+            self._wake()
 
     def schedule_event_handler(self, message):
         """
@@ -135,8 +238,17 @@ class EventScheduler(Thread):
             LOG.error('Scheduled event time not provided')
 
     def remove_event(self, event):
-        """ Remove event using thread safe queue. """
-        self.remove.put(event)
+        """ Remove all pending occurrences of event. """
+        with self.lock:
+            for entry in self.events.pop(event, []):
+                # left in the heap, skipped when it comes up
+                entry[2] = None
+                self.removed += 1
+            self._log({'op': 'remove', 'event': event})
+            if self.removed > max(COMPACT_HEAP, len(self.heap) / 2):
+                self.heap = [e for e in self.heap if e[2] is not None]
+                heapq.heapify(self.heap)
+                self.removed = 0
 
     def remove_event_handler(self, message):
         """ Messagebus interface to the remove_event method. """
@@ -144,7 +256,14 @@ class EventScheduler(Thread):
         self.remove_event(event)
 
     def update_event(self, event, data):
-        self.update((event, data))
+        """ Replace the data of the next occurrence of event. """
+        with self.lock:
+            pending = self.events.get(event)
+            if pending:
+                first = min(pending)
+                first[4] = data
+                self._log({'op': 'update', 'event': event,
+                           'time': first[0], 'data': data})
 
     def update_event_handler(self, message):
         """ Messagebus interface to the update_event method. """
@@ -152,16 +271,34 @@ class EventScheduler(Thread):
         data = message.data.get('data')
         self.update_event(event, data)
 
+    def _store(self):
+        """ rewrite the schedule file, called with the lock held """
+        events = {}
+        for event, pending in self.events.iteritems():
+            events[event] = [(t, r, d) for t, _, _, r, d in sorted(pending)]
+        try:
+            with open(self.schedule_file + '.tmp', 'w') as f:
+                json.dump(events, f)
+            os.rename(self.schedule_file + '.tmp', self.schedule_file)
+            if self.journal:
+                self.journal.close()
+            self.journal = open(self.journal_file, 'w')
+        except (IOError, OSError) as e:
+            LOG.error('Could not store schedule: ' + str(e))
+            return
+        self.journal_lines = 0
+
     def store(self):
         """
-            Write current schedule to disk.
+            Write current schedule to disk and empty the journal.
         """
-        with open(self.schedule_file, 'w') as f:
-            json.dump(self.events, f)
+        with self.lock:
+            self._store()
 
     def shutdown(self):
         """ Stop the running thread. """
         self.isRunning = False
+        self._wake()
         # Remove listeners
         self.emitter.remove_all_listeners('mycroft.scheduler.schedule_event')
         self.emitter.remove_all_listeners('mycroft.scheduler.remove_event')
@@ -169,4 +306,9 @@ class EventScheduler(Thread):
         # Wait for thread to finish
         self.join()
         # Store all pending scheduled events
-        self.store()
+        if self.schedule_file:
+            self.store()
+        if self.journal:
+            self.journal.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
@@ -17,9 +17,15 @@
 
 
 from adapt.engine import IntentDeterminationEngine
+import copy
+import re
 import time
+from collections import OrderedDict
+from itertools import count
 from time import sleep
-from threading import Timer
+from threading import Timer, Lock, Condition
+from uuid import uuid4
+from mycroft.messagebus.api import BusQuery
 from mycroft.messagebus.message import Message
 from mycroft.skills.core import open_intent_envelope
 from mycroft.util.log import getLogger
@@ -131,10 +137,233 @@ class ContextManager(object):
         return result
 
 
+class IntentIndex(object):
+    """
+    IntentIndex
+    Inverted index from vocabulary to the intent parsers that could match.
+
+    Adapt validates every registered parser against every parse result of
+    an utterance. An intent can only match if each of its required entity
+    types (and one type of each one_of group) was tagged in the utterance
+    or is available from context, so only those parsers need to be handed
+    to Adapt. The index mirrors how Adapt tags: vocabulary is matched
+    lower case on token boundaries, regex entities can tag anything.
+    """
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.lock = Lock()
+        # first word -> {phrase: set(entity types)}
+        self.vocab = {}
+        self.regex_types = set()
+        # entity type -> set((intent key, clause)), clause is the index of
+        # a require or one_of group of that intent
+        self.clauses = {}
+        # intent key -> (parser, number of clauses)
+        self.intents = {}
+        self.always = set()
+        self.keys = count()
+
+    def register_vocab(self, phrase, entity_type, alias_of=None):
+        phrase = phrase.lower()
+        entries = [(phrase, entity_type.lower())]
+        if not alias_of:
+            # adapt also tags the keyword name itself as a Concept
+            entries.append((entity_type.lower(), 'concept'))
+        with self.lock:
+            for text, tag in entries:
+                words = self.vocab.setdefault(text.split(' ')[0], {})
+                words.setdefault(text, set()).add(tag)
+
+    def register_regex(self, regex_str):
+        groups = re.compile(regex_str).groupindex.keys()
+        with self.lock:
+            self.regex_types.update(group.lower() for group in groups)
+
+    def register_intent(self, parser):
+        groups = [(entity_type,) for entity_type, _ in parser.requires]
+        groups += [tuple(one_of) for one_of in parser.at_least_one]
+        with self.lock:
+            key = next(self.keys)
+            self.intents[key] = (parser, len(groups))
+            if not groups:
+                self.always.add(key)
+            for clause, group in enumerate(groups):
+                for entity_type in group:
+                    self.clauses.setdefault(entity_type.lower(), set()).add(
+                        (key, clause))
+
+    def detach(self, predicate):
+        """ drop every intent parser for which predicate(parser) is True """
+        with self.lock:
+            removed = set(key for key, (parser, _) in self.intents.items()
+                          if predicate(parser))
+            for key in removed:
+                del self.intents[key]
+            self.always -= removed
+            for entity_type in self.clauses.keys():
+                entries = set(entry for entry in self.clauses[entity_type]
+                              if entry[0] not in removed)
+                if entries:
+                    self.clauses[entity_type] = entries
+                else:
+                    del self.clauses[entity_type]
+
+    def entity_types(self, utterance):
+        """ entity types Adapt could tag in the (normalized) utterance """
+        tokens = self.tokenizer.tokenize(utterance.lower())
+        found = set()
+        with self.lock:
+            found.update(self.regex_types)
+            for i, token in enumerate(tokens):
+                phrases = self.vocab.get(token)
+                if not phrases:
+                    continue
+                tail = ' '.join(tokens[i:]) + ' '
+                for phrase, tags in phrases.iteritems():
+                    if tail.startswith(phrase + ' '):
+                        found.update(tags)
+        return found
+
+    def candidates(self, utterance, context=None):
+        """
+        Intent parsers that could match the utterance, in registration
+        order, context is a list of adapt context entities
+        """
+        available = self.entity_types(utterance)
+        for entity in context or []:
+            for _, entity_type in entity.get('data', []):
+                available.add(entity_type.lower())
+        with self.lock:
+            satisfied = {}
+            for entity_type in available:
+                for key, clause in self.clauses.get(entity_type, ()):
+                    satisfied.setdefault(key, set()).add(clause)
+            keys = [key for key, clauses in satisfied.iteritems()
+                    if len(clauses) == self.intents[key][1]]
+            keys.extend(self.always)
+            return [self.intents[key][0] for key in sorted(keys)]
+
+
+class IntentCache(object):
+    """
+    IntentCache
+    LRU cache of intent determination results.
+
+    Keyed by normalized utterance, language and a fingerprint of the
+    context frames, so the same words in a different conversation state
+    are looked up again. Results depend on the whole intent registry and
+    are cleared whenever vocabulary or intents are registered or detached,
+    which is also how skills enable and disable intents.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        # bumped on every clear, results computed before are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_time = 0.0
+
+    @staticmethod
+    def key(utterance, lang, context=None):
+        fingerprint = tuple(
+            (e['data'][0][1], e['data'][0][0],
+             round(e.get('confidence', 1.0), 3))
+            for e in context or [])
+        return utterance, lang, fingerprint
+
+    def get(self, key):
+        """ returns (found, intent), intent is None for cached failures """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False, None
+            intent, elapsed = self.entries.pop(key)
+            self.entries[key] = (intent, elapsed)
+            self.hits += 1
+            self.saved_time += elapsed
+            return True, intent
+
+    def put(self, key, intent, elapsed, generation):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            if generation != self.generation:
+                # registry changed while this was computed
+                return
+            self.entries.pop(key, None)
+            self.entries[key] = (intent, elapsed)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+                    "saved_time": self.saved_time}
+
+
+class ConverseRequest(object):
+    """
+    ConverseRequest
+    One utterance offered to the converse method of the active skills.
+
+    All skills are asked at once and answer in any order, responses are
+    matched by skill id. The winner is the first skill in priority order
+    (most recently active first) that wants the utterance, it is known as
+    soon as every skill before it declined. Skills that did not answer by
+    the deadline count as declined.
+    """
+    def __init__(self, skill_ids):
+        self.id = str(uuid4())
+        self.skill_ids = list(skill_ids)
+        self.results = {}
+        self.condition = Condition()
+
+    def respond(self, skill_id, result):
+        with self.condition:
+            if skill_id in self.skill_ids and skill_id not in self.results:
+                self.results[skill_id] = bool(result)
+                self.condition.notify_all()
+
+    def _decide(self, final=False):
+        """ returns (decided, winning skill id or None) """
+        for skill_id in self.skill_ids:
+            if skill_id not in self.results:
+                if not final:
+                    return False, None
+            elif self.results[skill_id]:
+                return True, skill_id
+        return True, None
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                decided, winner = self._decide()
+                if decided:
+                    return winner
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return self._decide(final=True)[1]
+                self.condition.wait(remaining)
+
+
 class IntentService(object):
     def __init__(self, emitter):
         self.config = ConfigurationManager.get().get('context', {})
         self.engine = IntentDeterminationEngine()
+        self.index = IntentIndex(self.engine.tokenizer)
+        self.intent_cache = IntentCache(ConfigurationManager.get().get(
+            'skills', {}).get('intent_cache_size', 256))
         self.context_keywords = self.config.get('keywords', ['Location'])
         self.context_max_frames = self.config.get('max_frames', 3)
         self.context_timeout = self.config.get('timeout', 2)
@@ -142,6 +371,8 @@ class IntentService(object):
         self.context_manager = ContextManager(self.context_timeout)
         self.emitter = emitter
         self.emitter.on('register_vocab', self.handle_register_vocab)
+        self.emitter.on('register_vocab_batch',
+                        self.handle_register_vocab_batch)
         self.emitter.on('register_intent', self.handle_register_intent)
         self.emitter.on('recognizer_loop:utterance', self.handle_utterance)
         self.emitter.on('detach_intent', self.handle_detach_intent)
@@ -154,23 +385,36 @@ class IntentService(object):
         self.active_skills = []  # [skill_id , timestamp]
         self.skill_ids = {}  # {skill_id: [intents]}
         self.converse_timeout = 5  # minutes to prune active_skills
+        self.converse_deadline = 5  # seconds to wait for converse responses
+        self.converse_requests = {}  # {request id: ConverseRequest}
+        self.converse_lock = Lock()
         # Context related handlers
         self.emitter.on('add_context', self.handle_add_context)
         self.emitter.on('remove_context', self.handle_remove_context)
         self.emitter.on('clear_context', self.handle_clear_context)
+        self.emitter.on('intent.cache.stats.request',
+                        self.handle_intent_cache_stats_request)
 
-    def do_conversation(self, utterances, skill_id, lang):
-        self.emitter.emit(Message("skill.converse.request", {
-            "skill_id": skill_id, "utterances": utterances, "lang": lang}))
-        self.waiting = True
-        self.result = False
-        start_time = time.time()
-        t = 0
-        while self.waiting and t < 5:
-            t = time.time() - start_time
-            sleep(0.1)
-        self.waiting = False
-        return self.result
+    def do_conversation(self, utterances, skill_ids, lang):
+        """
+            Asks all skills in skill_ids, in priority order, if they want to
+            handle the utterances, returns the id of the skill that does or
+            None
+        """
+        if not skill_ids:
+            return None
+        request = ConverseRequest(skill_ids)
+        with self.converse_lock:
+            self.converse_requests[request.id] = request
+        try:
+            for skill_id in skill_ids:
+                self.emitter.emit(Message("skill.converse.request", {
+                    "skill_id": skill_id, "utterances": utterances,
+                    "lang": lang}, {"converse_id": request.id}))
+            return request.wait(self.converse_deadline)
+        finally:
+            with self.converse_lock:
+                self.converse_requests.pop(request.id, None)
 
     def handle_intent_to_skill_request(self, message):
         intent = message.data["intent_name"]
@@ -178,19 +422,25 @@ class IntentService(object):
             for name in self.skill_ids[id]:
                 if name == intent:
                     self.emitter.emit(Message("intent_to_skill_response", {
-                        "skill_id": id, "intent_name": intent}))
+                        "skill_id": id, "intent_name": intent},
+                        message.context))
                     return id
         self.emitter.emit(Message("intent_to_skill_response", {
-            "skill_id": 0, "intent_name": intent}))
+            "skill_id": 0, "intent_name": intent}, message.context))
         return 0
 
     def handle_conversation_response(self, message):
-        # id = message.data["skill_id"]
-        # no need to crosscheck id because waiting before new request is made
-        # no other skill will make this request is safe assumption
-        result = message.data["result"]
-        self.result = result
-        self.waiting = False
+        skill_id = message.data.get("skill_id")
+        result = message.data.get("result", False)
+        converse_id = (message.context or {}).get("converse_id")
+        with self.converse_lock:
+            if converse_id in self.converse_requests:
+                requests = [self.converse_requests[converse_id]]
+            else:
+                # skills that do not echo context, match by skill id only
+                requests = self.converse_requests.values()
+        for request in requests:
+            request.respond(skill_id, result)
 
     def remove_active_skill(self, skill_id):
         for skill in self.active_skills:
@@ -234,17 +484,7 @@ class IntentService(object):
         lang = message.data.get('lang', None)
         if not lang:
             lang = "en-us"
-        best_intent = None
-        try:
-            # normalize() changes "it's a boy" to "it is boy", etc.
-            best_intent = next(self.engine.determine_intent(
-                normalize(utterance, lang), 100))
-
-            # TODO - Should Adapt handle this?
-            best_intent['utterance'] = utterance
-        except StopIteration, e:
-            logger.exception(e)
-
+        best_intent = self.determine_intent(utterance, lang)
         if best_intent and best_intent.get('confidence', 0.0) > 0.0:
             skill_id = int(best_intent['intent_type'].split(":")[0])
             intent_name = best_intent['intent_type'].split(":")[1]
@@ -255,6 +495,48 @@ class IntentService(object):
             "skill_id": 0, "utterance": utterance, "lang": lang, "intent_name": ""}, message.context))
         return False
 
+    def determine_intent(self, utterance, lang, context_manager=None):
+        """
+            Best intent for a single utterance, or None, served from the
+            intent cache when the same utterance was seen in the same
+            context since the registry last changed.
+        """
+        # normalize() changes "it's a boy" to "it is boy", etc.
+        normalized = normalize(utterance, lang)
+        context = context_manager.get_context() if context_manager else []
+        key = self.intent_cache.key(normalized, lang, context)
+        found, best_intent = self.intent_cache.get(key)
+        if not found:
+            generation = self.intent_cache.generation
+            start = time.time()
+            try:
+                # tags are always included, so results for the bus
+                # requests can be reused for utterances
+                best_intent = next(self.get_engine(
+                    normalized, context).determine_intent(
+                    normalized, 100, include_tags=True,
+                    context_manager=context_manager))
+            except StopIteration, e:
+                logger.exception(e)
+            self.intent_cache.put(key, best_intent, time.time() - start,
+                                  generation)
+        if best_intent is None:
+            return None
+        best_intent = dict(best_intent)
+        # TODO - Should Adapt handle this?
+        best_intent['utterance'] = utterance
+        return best_intent
+
+    def get_engine(self, utterance, context=None):
+        """
+            Returns a view of the engine that only validates the intent
+            parsers the index found for this utterance, the shared engine
+            is not modified so concurrent lookups do not interfere.
+        """
+        engine = copy.copy(self.engine)
+        engine.intent_parsers = self.index.candidates(utterance, context)
+        return engine
+
     def get_message_context(self, context=None):
         if context is None:
             context = {}
@@ -282,27 +564,21 @@ class IntentService(object):
                               if time.time() - skill[1] <= self.converse_timeout * 60]
 
         # check if any skill wants to handle utterance
-        for skill in self.active_skills:
-            if self.do_conversation(utterances, skill[0], lang):
-                # update timestamp, or there will be a timeout where
-                # intent stops conversing whether its being used or not
-                self.add_active_skill(skill[0])
-                return
+        skill_id = self.do_conversation(
+            utterances, [skill[0] for skill in self.active_skills], lang)
+        if skill_id is not None:
+            # update timestamp, or there will be a timeout where
+            # intent stops conversing whether its being used or not
+            self.add_active_skill(skill_id)
+            return
 
         # no skill wants to handle utterance, proceed
         best_intent = None
         for utterance in utterances:
-            try:
-                # normalize() changes "it's a boy" to "it is boy", etc.
-                best_intent = next(self.engine.determine_intent(
-                                   normalize(utterance, lang), 100,
-                                   include_tags=True,
-                                   context_manager=self.context_manager))
-                # TODO - Should Adapt handle this?
-                best_intent['utterance'] = utterance
-            except StopIteration, e:
-                logger.exception(e)
-                continue
+            intent = self.determine_intent(utterance, lang,
+                                           self.context_manager)
+            if intent is not None:
+                best_intent = intent
 
         if best_intent and best_intent.get('confidence', 0.0) > 0.0:
             self.update_context(best_intent)
@@ -320,19 +596,32 @@ class IntentService(object):
             }, context))
 
     def handle_register_vocab(self, message):
-        start_concept = message.data.get('start')
-        end_concept = message.data.get('end')
-        regex_str = message.data.get('regex')
-        alias_of = message.data.get('alias_of')
+        self._register_vocab(message.data)
+        self.intent_cache.clear()
+
+    def handle_register_vocab_batch(self, message):
+        for data in message.data.get('vocab', []):
+            self._register_vocab(data)
+        self.intent_cache.clear()
+
+    def _register_vocab(self, data):
+        start_concept = data.get('start')
+        end_concept = data.get('end')
+        regex_str = data.get('regex')
+        alias_of = data.get('alias_of')
         if regex_str:
             self.engine.register_regex_entity(regex_str)
+            self.index.register_regex(regex_str)
         else:
             self.engine.register_entity(
                 start_concept, end_concept, alias_of=alias_of)
+            self.index.register_vocab(start_concept, end_concept, alias_of)
 
     def handle_register_intent(self, message):
         intent = open_intent_envelope(message)
         self.engine.register_intent_parser(intent)
+        self.index.register_intent(intent)
+        self.intent_cache.clear()
         #  map intent_name to skill_id
         skill_id = int(intent.name.split(":")[0])
         intent_name = intent.name.split(":")[1]
@@ -346,6 +635,8 @@ class IntentService(object):
         new_parsers = [
             p for p in self.engine.intent_parsers if p.name != intent_name]
         self.engine.intent_parsers = new_parsers
+        self.index.detach(lambda p: p.name == intent_name)
+        self.intent_cache.clear()
 
     def handle_detach_skill(self, message):
         skill_id = message.data.get('skill_id')
@@ -353,6 +644,12 @@ class IntentService(object):
             p for p in self.engine.intent_parsers if
             not p.name.startswith(skill_id)]
         self.engine.intent_parsers = new_parsers
+        self.index.detach(lambda p: p.name.startswith(skill_id))
+        self.intent_cache.clear()
+
+    def handle_intent_cache_stats_request(self, message):
+        self.emitter.emit(message.reply("intent.cache.stats.reply",
+                                        self.intent_cache.stats()))
 
     def handle_add_context(self, message):
         """
@@ -390,45 +687,37 @@ class IntentService(object):
 
 
 class IntentParser():
+    """
+    Asks the intent service which intent/skill would handle an utterance
+
+    Each request is an independent BusQuery, so one parser can be shared by
+    several threads with lookups in flight at the same time.
+    """
     def __init__(self, emitter, time_out=5):
         self.emitter = emitter
         self.waiting = False
         self.intent = ""
         self.id = 0
-        self.emitter.on("intent_response", self.handle_receive_intent)
-        self.emitter.on("intent_to_skill_response", self.handle_receive_skill_id)
         self.time_out = time_out
 
     def determine_intent(self, utterance, lang="en-us"):
-        self.waiting = True
-        self.emitter.emit(Message("intent_request", {"utterance": utterance, "lang": lang}))
-        start_time = time.time()
-        t = 0
-        while self.waiting and t < self.time_out:
-            t = time.time() - start_time
-            sleep(0.1)
-        return self.intent, self.id
+        query = BusQuery(self.emitter, "intent_request",
+                         {"utterance": utterance, "lang": lang})
+        data = query.send("intent_response", self.time_out)
+        if data is None:
+            return "", 0
+        self.id = data["skill_id"]
+        self.intent = data["intent_name"]
+        return data["intent_name"], data["skill_id"]
 
     def get_skill_id(self, intent_name):
-        self.waiting = True
-        self.id = 0
-        self.emitter.emit(Message("intent_to_skill_request", {"intent_name": intent_name}))
-        start_time = time.time()
-        t = 0
-        while self.waiting and t < self.time_out:
-            t = time.time() - start_time
-            sleep(0.1)
-        self.waiting = False
-        return self.id
-
-    def handle_receive_intent(self, message):
-        self.id = message.data["skill_id"]
-        self.intent = message.data["intent_name"]
-        self.waiting = False
-
-    def handle_receive_skill_id(self, message):
-        self.id = message.data["skill_id"]
-        self.waiting = False
+        query = BusQuery(self.emitter, "intent_to_skill_request",
+                         {"intent_name": intent_name})
+        data = query.send("intent_to_skill_response", self.time_out)
+        if data is None:
+            return 0
+        self.id = data["skill_id"]
+        return data["skill_id"]
 
 
 class IntentLayers():
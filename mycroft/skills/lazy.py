@@ -0,0 +1,332 @@
+# Copyright 2016 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Core.
+#
+# Mycroft Core is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Mycroft Core is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Mycroft Core.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Lazy skills
+
+A lazy skill is only imported and initialized when it is first needed.
+The first time it is loaded it is loaded normally, through a SkillEmitter
+that records what it registers on the bus, and that is saved as the skill
+manifest. On the next start the LazySkill replays the manifest (vocab,
+regex and intents) and listens for the intents and the *.request messages
+of the skill, the real skill is loaded when one of them arrives. It can be
+unloaded again after being idle for a while.
+
+Manifests are kept in ~/.mycroft/skill_manifests and are discarded when
+the skill folder changes or the language changes.
+"""
+import copy
+import gc
+import json
+import sys
+import time
+from threading import Lock, Timer
+
+from mycroft.filesystem import FileSystemAccess
+from mycroft.messagebus.message import Message
+from mycroft.util.log import getLogger
+
+__author__ = 'jarbas'
+
+logger = getLogger(__name__)
+
+MANIFEST_VERSION = 1
+# registrations saved in the manifest and replayed by lazy skills
+REGISTRATION_TYPES = ("register_vocab", "register_vocab_batch",
+                      "register_intent", "padatious:register_intent")
+# intent name field of each registration
+INTENT_NAME_FIELDS = {"register_intent": "name",
+                      "padatious:register_intent": "intent_name"}
+
+
+class SkillEmitter(object):
+    """
+        Wraps the skills emitter for a single skill.
+
+        Registrations the skill emits are recorded while recording is set,
+        message types in swallow are not sent. Handlers for trigger events
+        are kept here and called through dispatch, every other handler is
+        added to the real emitter and removed again by release.
+    """
+    def __init__(self, emitter, triggers=None):
+        self.emitter = emitter
+        self.triggers = set(triggers or [])
+        self.handlers = {}
+        self.listeners = []
+        self.events = set()
+        self.registrations = []
+        self.recording = True
+        self.swallow = set()
+
+    def emit(self, message):
+        if self.recording and message.type in REGISTRATION_TYPES:
+            self.registrations.append({"type": message.type,
+                                       "data": copy.deepcopy(message.data)})
+        if message.type in self.swallow:
+            return
+        self.emitter.emit(message)
+
+    def on(self, event_name, func):
+        if self.recording:
+            self.events.add(event_name)
+        if event_name in self.triggers:
+            self.handlers.setdefault(event_name, []).append(func)
+        else:
+            self.listeners.append((event_name, func))
+            self.emitter.on(event_name, func)
+
+    def once(self, event_name, func):
+        self.emitter.once(event_name, func)
+
+    def remove(self, event_name, func):
+        if event_name in self.handlers:
+            if func in self.handlers[event_name]:
+                self.handlers[event_name].remove(func)
+            return
+        if (event_name, func) in self.listeners:
+            self.listeners.remove((event_name, func))
+        self.emitter.remove(event_name, func)
+
+    def remove_all_listeners(self, event_name):
+        if event_name in self.handlers:
+            self.handlers.pop(event_name)
+            return
+        self.listeners = [(e, f) for e, f in self.listeners
+                          if e != event_name]
+        self.emitter.remove_all_listeners(event_name)
+
+    def dispatch(self, message):
+        """ call the handlers of the skill for a trigger message """
+        for handler in list(self.handlers.get(message.type, [])):
+            handler(message)
+
+    def release(self):
+        """ remove every handler the skill left on the bus """
+        for event_name, func in self.listeners:
+            try:
+                self.emitter.remove(event_name, func)
+            except ValueError:
+                pass
+        self.listeners = []
+        self.handlers = {}
+
+    def __getattr__(self, item):
+        return getattr(self.emitter, item)
+
+
+def _manifests():
+    return FileSystemAccess("skill_manifests")
+
+
+def load_manifest(folder, modified, lang):
+    """
+        Read the manifest of a skill folder.
+
+        Returns:    the manifest or None if missing or out of date
+    """
+    try:
+        with _manifests().open(folder + ".json", "r") as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or \
+            manifest.get("modified") != modified or \
+            manifest.get("lang") != lang:
+        return None
+    return manifest
+
+
+def save_manifest(folder, manifest):
+    try:
+        with _manifests().open(folder + ".json", "w") as f:
+            json.dump(manifest, f)
+    except IOError:
+        logger.error("Could not save manifest of " + folder)
+
+
+def create_manifest(skill, emitter, modified, lang):
+    """
+        Create the manifest of a skill loaded through a SkillEmitter.
+
+        Intent names are saved without the skill id, it is only known once
+        the skill is loaded.
+    """
+    prefix = str(skill.skill_id) + ':'
+    registrations = []
+    intents = []
+    for registration in emitter.registrations:
+        data = registration["data"]
+        field = INTENT_NAME_FIELDS.get(registration["type"])
+        if field and data.get(field, "").startswith(prefix):
+            data[field] = data[field][len(prefix):]
+            intents.append(data[field])
+        registrations.append(registration)
+    requests = sorted(e for e in emitter.events if e.endswith(".request"))
+    return {"version": MANIFEST_VERSION, "modified": modified,
+            "lang": lang, "name": skill.name,
+            "registrations": registrations, "intents": intents,
+            "requests": requests}
+
+
+class LazySkill(object):
+    """
+        Stands in for a skill until one of its intents or *.request
+        messages is received.
+
+        Args:
+            folder:         skill folder
+            emitter:        messagebus emitter
+            skill_id:       id number for skill
+            manifest:       manifest of the skill
+            loader:         loader(emitter) returning the loaded skill
+            module:         name of the skill module
+            idle_timeout:   seconds without messages before unloading the
+                            skill again, 0 to keep it loaded
+    """
+    def __init__(self, folder, emitter, skill_id, manifest, loader,
+                 module=None, idle_timeout=0):
+        self.folder = folder
+        self.emitter = emitter
+        self.skill_id = skill_id
+        self.manifest = manifest
+        self.loader = loader
+        self.module = module
+        self.idle_timeout = idle_timeout
+        self.name = manifest["name"]
+        self.reload_skill = True
+        self.external_reload = True
+        self.external_shutdown = True
+        self.instance = None
+        self.skill_emitter = None
+        self.lock = Lock()
+        self.busy = 0
+        self.timer = None
+        self.prefix = str(skill_id) + ':'
+        self.triggers = [self.prefix + name for name in manifest["intents"]]
+        self.triggers += manifest["requests"]
+
+    @property
+    def active(self):
+        return self.instance is not None
+
+    def register(self):
+        """ register the manifest on the bus and wait for a trigger """
+        for registration in self.manifest["registrations"]:
+            data = dict(registration["data"])
+            field = INTENT_NAME_FIELDS.get(registration["type"])
+            if field:
+                data[field] = self.prefix + data[field]
+            self.emitter.emit(Message(registration["type"], data))
+        for trigger in self.triggers:
+            self.emitter.on(trigger, self.handle_trigger)
+
+    def activate(self):
+        """
+            load the skill if it is not loaded, returns the instance
+
+            The skill is not unloaded until release() is called.
+        """
+        with self.lock:
+            if self.instance is None:
+                start = time.time()
+                emitter = SkillEmitter(self.emitter, self.triggers)
+                # the manifest is already registered
+                emitter.recording = False
+                emitter.swallow.update(REGISTRATION_TYPES)
+                try:
+                    self.instance = self.loader(emitter)
+                except Exception:
+                    logger.error("Failed to activate skill " + self.folder,
+                                 exc_info=True)
+                if self.instance is None:
+                    emitter.release()
+                    return None
+                self.skill_emitter = emitter
+                logger.info("Activated " + self.folder + " in %.2f seconds"
+                            % (time.time() - start))
+            self.busy += 1
+            return self.instance
+
+    def release(self):
+        """ done with the instance returned by activate() """
+        with self.lock:
+            self.busy -= 1
+        self._touch()
+
+    def handle_trigger(self, message):
+        if self.activate() is None:
+            return
+        try:
+            self.skill_emitter.dispatch(message)
+        finally:
+            self.release()
+
+    def converse(self, utterances, lang="en-us"):
+        with self.lock:
+            instance = self.instance
+            if instance is None:
+                return False
+            self.busy += 1
+        try:
+            return instance.converse(utterances, lang)
+        finally:
+            self.release()
+
+    def _touch(self):
+        if not self.idle_timeout:
+            return
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+            self.timer = Timer(self.idle_timeout, self.unload)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def unload(self):
+        """ unload the skill but keep listening for triggers """
+        with self.lock:
+            if self.instance is None or self.busy:
+                return
+            # the intents stay registered for the next activation
+            self.skill_emitter.swallow.add("detach_skill")
+            self._shutdown_instance()
+        if self.module:
+            sys.modules.pop(self.module, None)
+        gc.collect()
+        logger.info("Unloaded idle skill " + self.folder)
+
+    def _shutdown_instance(self):
+        try:
+            self.instance.shutdown()
+        except Exception:
+            logger.error("Failed to shutdown skill " + self.folder,
+                         exc_info=True)
+        self.skill_emitter.release()
+        self.skill_emitter = None
+        self.instance = None
+
+    def shutdown(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+        for trigger in self.triggers:
+            self.emitter.remove(trigger, self.handle_trigger)
+        with self.lock:
+            if self.instance is not None:
+                self._shutdown_instance()
+            else:
+                self.emitter.emit(Message("detach_skill",
+                                          {"skill_id": self.prefix}))
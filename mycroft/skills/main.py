@@ -21,6 +21,7 @@ import os
 import subprocess
 import sys
 import time
+from multiprocessing.pool import ThreadPool
 from os.path import exists, join
 from threading import Timer, Thread, Event
 
@@ -33,8 +34,9 @@ from mycroft.skills.core import load_skill, create_skill_descriptor, \
     MainModule, FallbackSkill
 from mycroft.skills.intent_service import IntentService
 from mycroft.skills.padatious_service import PadatiousService
+from mycroft.skills.watcher import SkillsWatcher
 from mycroft.util import connected
-from mycroft.util.log import getLogger
+from mycroft.util.log import getLogger, LOG
 from mycroft.api import is_paired
 import mycroft.dialog
 from mycroft import MYCROFT_ROOT_PATH
@@ -48,7 +50,6 @@ msm = False
 
 ws = None
 loaded_skills = {}
-last_modified_skill = 0
 skill_reload_thread = None
 skills_manager_timer = None
 id_counter = 0
@@ -56,6 +57,10 @@ id_counter = 0
 skills_config = ConfigurationManager.instance().get("skills")
 PRIORITY_SKILLS = skills_config["priority_skills"]
 BLACKLISTED_SKILLS = skills_config["blacklisted_skills"]
+# skills loaded at the same time on startup
+SKILL_LOADER_THREADS = skills_config.get("loader_threads", 4)
+# set once all skills found on startup were loaded
+skills_ready = Event()
 
 SKILLS_DIR = skills_config.get("directory")
 if SKILLS_DIR is None or SKILLS_DIR == "default":
@@ -226,69 +231,73 @@ def check_connection():
         thread.start()
 
 
-def _get_last_modified_date(path):
+def _load_skill(skill_folder, skill):
     """
-        Get last modified date excluding compiled python files, hidden
-        directories and the settings.json file.
+        Load a skill and report on the bus how long it took.
 
-        Arg:
-            path:   skill directory to check
-        Returns:    time of last change
+        Args:
+            skill_folder:   skill folder in SKILLS_DIR
+            skill:          the loaded_skills entry of the skill
+        Returns:    the skill instance or None
+    """
+    start = time.time()
+    skill["instance"] = load_skill(
+        create_skill_descriptor(skill["path"]), ws, skill["id"])
+    data = {"skill": skill["id"], "folder": skill_folder,
+            "duration": time.time() - start}
+    if skill["instance"]:
+        ws.emit(Message("skill.loaded", data))
+    else:
+        ws.emit(Message("skill.loaded.fail", data))
+    return skill["instance"]
+
+
+def load_priority(pool=None):
+    """
+        Load PRIORITY_SKILLS, at the same time if a thread pool is given,
+        returns once all of them are loaded.
     """
-    last_date = 0
-    root_dir, subdirs, files = os.walk(path).next()
-    # get subdirs and remove hidden ones
-    subdirs = [s for s in subdirs if not s.startswith('.')]
-    for subdir in subdirs:
-        for root, _, _ in os.walk(join(path, subdir)):
-            base = os.path.basename(root)
-            # checking if is a hidden path
-            if not base.startswith(".") and not base.startswith("/."):
-                last_date = max(last_date, os.path.getmtime(root))
-
-    # check files of interest in the skill root directory
-    files = [f for f in files
-             if not f.endswith('.pyc') and f != 'settings.json']
-    for f in files:
-        last_date = max(last_date, os.path.getmtime(os.path.join(path, f)))
-    return last_date
-
-
-def load_priority():
     global ws, loaded_skills, SKILLS_DIR, PRIORITY_SKILLS, id_counter
 
+    def load(skill_folder):
+        try:
+            skill = loaded_skills.get(skill_folder)
+            skill["path"] = os.path.join(SKILLS_DIR, skill_folder)
+            # checking if is a skill
+            if not MainModule + ".py" in os.listdir(skill["path"]):
+                return
+            # checking if skill is loaded
+            if skill.get("loaded"):
+                return
+
+            _load_skill(skill_folder, skill)
+            skill["loaded"] = True
+        except TypeError:
+            logger.error(skill_folder + " does not seem to exist")
+
     if exists(SKILLS_DIR):
-        for skill_folder in PRIORITY_SKILLS:
-            try:
-                skill = loaded_skills.get(skill_folder)
-                skill["path"] = os.path.join(SKILLS_DIR, skill_folder)
-                # checking if is a skill
-                if not MainModule + ".py" in os.listdir(skill["path"]):
-                    continue
-                # getting the newest modified date of skill
-                skill["last_modified"] = _get_last_modified_date(skill["path"])
-                # checking if skill is loaded
-                if skill.get("loaded"):
-                    continue
-
-                skill["instance"] = load_skill(
-                    create_skill_descriptor(skill["path"]), ws, skill["id"])
-                skill["loaded"] = True
-            except TypeError:
-                logger.error(skill_folder + " does not seem to exist")
+        if pool:
+            pool.map(load, PRIORITY_SKILLS)
+        else:
+            map(load, PRIORITY_SKILLS)
 
 
 class WatchSkills(Thread):
     """
         Thread function to reload skills when a change is detected.
+
+        Loads every skill once, then sleeps until the SkillsWatcher reports
+        skill folders that changed on disk (or a reload/shutdown request
+        for one) and only checks those.
     """
     def __init__(self):
         super(WatchSkills, self).__init__()
         self._stop_event = Event()
+        self.watcher = SkillsWatcher(
+            SKILLS_DIR, skills_config.get("reload_debounce", 1.0))
 
     def run(self):
-        global ws, loaded_skills, last_modified_skill, \
-            id_counter
+        global ws, loaded_skills, id_counter
 
         # Scan the folder that contains Skills.
         list = filter(lambda x: os.path.isdir(
@@ -304,146 +313,166 @@ class WatchSkills(Thread):
                                                "reload_request": False,
                                                "shutdown": False}
 
-        # Load priority skills first
-        load_priority()
-
-        # Scan the file folder that contains Skills.  If a Skill is updated,
-        # unload the existing version from memory and reload from the disk.
+        start = time.time()
+        pool = ThreadPool(SKILL_LOADER_THREADS)
+        try:
+            # Load priority skills first
+            load_priority(pool)
+            # watch before loading the rest so no change is missed
+            self.watcher.start()
+            logger.debug("Watching skills using " + self.watcher.mode)
+            pool.map(self._load_on_startup, list)
+        finally:
+            pool.close()
+            pool.join()
+        self.emit_ready(time.time() - start)
+
+        # If a Skill is updated, unload the existing version from memory and
+        # reload from the disk.
         while not self._stop_event.is_set():
-            if exists(SKILLS_DIR):
-                # checking skills dir and getting all skills there
-                list = filter(lambda x: os.path.isdir(
-                    os.path.join(SKILLS_DIR, x)), os.listdir(SKILLS_DIR))
-
-                for skill_folder in list:
-                    if skill_folder in BLACKLISTED_SKILLS:
-                        continue
-
-                    if skill_folder not in loaded_skills:
-                        # check if its a new skill just added to skills_folder
-                        id_counter += 1
-                        loaded_skills[skill_folder] = {"id": id_counter,
-                                                       "loaded": False,
-                                                       "do_not_reload": False,
-                                                       "do_not_load": False,
-                                                       "reload_request": False,
-                                                       "shutdown": False}
-                    skill = loaded_skills.get(skill_folder)
-                    # see if this skill was supposed to be shutdown
-                    if skill["shutdown"]:
+            for skill_folder in self.watcher.wait():
+                if os.path.isdir(os.path.join(SKILLS_DIR, skill_folder)):
+                    self.check_skill(skill_folder)
+
+    def _load_on_startup(self, skill_folder):
+        if self._stop_event.is_set():
+            return
+        try:
+            self.check_skill(skill_folder, modified=False)
+        except Exception:
+            logger.error("Failed to load skill " + skill_folder,
+                         exc_info=True)
+
+    def emit_ready(self, duration):
+        loaded = [folder for folder, skill in loaded_skills.items()
+                  if skill.get("instance")]
+        logger.info("%d skills loaded in %.1f seconds" %
+                    (len(loaded), duration))
+        skills_ready.set()
+        ws.emit(Message("skills.ready", {"duration": duration,
+                                         "skills": loaded}))
+
+    def check_skill(self, skill_folder, modified=True):
+        """
+            Load, reload or shutdown a skill as needed.
+
+            Args:
+                skill_folder:   skill folder in SKILLS_DIR
+                modified:       the skill changed on disk
+        """
+        global ws, loaded_skills, id_counter
+
+        if skill_folder in BLACKLISTED_SKILLS:
+            return
+
+        if skill_folder not in loaded_skills:
+            # check if its a new skill just added to skills_folder
+            id_counter += 1
+            loaded_skills[skill_folder] = {"id": id_counter,
+                                           "loaded": False,
+                                           "do_not_reload": False,
+                                           "do_not_load": False,
+                                           "reload_request": False,
+                                           "shutdown": False}
+        skill = loaded_skills.get(skill_folder)
+        # see if this skill was supposed to be shutdown
+        if skill["shutdown"]:
+            logger.debug(
+                "Skill " + skill_folder + " shutdown was requested")
+            skill["shutdown"] = False
+            if skill.get("loaded"):
+                if skill.get("instance"):
+                    if skill["instance"].external_shutdown:
+                        skill["instance"].shutdown()
+                        del skill["instance"]
+                        skill["loaded"] = False
+                        ws.emit(Message("shutdown_skill_response",
+                                        {"status": "shutdown",
+                                         "skill_id": skill["id"]}))
+                        return
+                    else:
+                        ws.emit(
+                            Message("shutdown_skill_response",
+                                    {"status": "forbidden",
+                                     "skill_id": skill["id"]}))
                         logger.debug(
-                            "Skill " + skill_folder + " shutdown was requested")
-                        skill["shutdown"] = False
-                        if skill.get("loaded"):
-                            if skill.get("instance"):
-                                if skill["instance"].external_shutdown:
-                                    skill["instance"].shutdown()
-                                    del skill["instance"]
-                                    skill["loaded"] = False
-                                    ws.emit(Message("shutdown_skill_response",
-                                                    {"status": "shutdown",
-                                                     "skill_id": skill["id"]}))
-                                    continue
-                                else:
-                                    ws.emit(
-                                        Message("shutdown_skill_response",
-                                                {"status": "forbidden",
-                                                 "skill_id": skill["id"]}))
-                                    logger.debug(
-                                        "External shutdown for " + skill_folder + " is forbidden")
-                                    continue
-                        else:
-                            ws.emit(Message("shutdown_skill_response",
-                                            {"status": "shutdown",
-                                             "skill_id": skill["id"]}))
-                            logger.debug(skill_folder + " already shutdown")
-                            continue
-                    # check if we are supposed to load this skill
-                    elif skill["do_not_load"]:
-                        continue
-                    skill["path"] = os.path.join(SKILLS_DIR, skill_folder)
-                    # checking if is a skill
-                    if not MainModule + ".py" in os.listdir(skill["path"]):
-                        continue
-                    # getting the newest modified date of skill
-                    skill["last_modified"] = _get_last_modified_date(
-                        skill["path"])
-                    modified = skill.get("last_modified", 0)
-
-                    # checking if skill is loaded and wasn't modified
-                    if skill.get(
-                            "loaded") and (
-                            modified <= last_modified_skill and not skill[
-                        "reload_request"]):
-                        continue
-                    # checking if skill was modified or reload was requested
-                    elif skill.get(
-                            "instance") and (
-                            modified > last_modified_skill or skill[
-                        "reload_request"]):
-                        # checking if skill reload was requested
-                        if skill["reload_request"]:
-                            logger.debug(
-                                "External reload for " + skill_folder + " requested")
-                            loaded_skills[skill_folder][
-                                "reload_request"] = False
-                            if skill["instance"].external_reload:
-                                ws.emit(Message("reload_skill_response",
-                                                {"status": "reloading",
-                                                 "skill_id": skill["id"]}))
-                                skill["do_not_reload"] = False
-                            else:
-                                ws.emit(Message("reload_skill_response",
-                                                {"status": "forbidden",
-                                                 "skill_id": skill["id"]}))
-                                logger.debug(
-                                    "External reload for " + skill_folder + " is forbidden")
-                                skill["do_not_reload"] = True
-                        # check if skills allows auto_reload
-                        elif not skill["instance"].reload_skill:
-                            continue
-                        else:
-                            skill["do_not_reload"] = False
-                        # check if we are suposed to reload skill
-                        if not skill["do_not_reload"]:
-                            logger.debug("Reloading Skill: " + skill_folder)
-                            # removing listeners and stopping threads
-                            if skill.get("instance") is not None:
-                                logger.debug(
-                                    "Shutting down Skill: " + skill_folder)
-                                skill["instance"].shutdown()
-                                del skill["instance"]
-                            else:
-                                logger.debug(
-                                    "Skill " + skill_folder + " is already shutdown")
-
-                    # load skill
-                    if not skill["do_not_reload"]:
-                        skill["loaded"] = True
-                        skill["instance"] = load_skill(
-                            create_skill_descriptor(skill["path"]), ws,
-                            skill["id"])
-
-                        if skill["instance"]:
-                            ws.emit(Message("skill.loaded",
-                                            {"skill": skill["id"]}))
-                        else:
-                            ws.emit(Message("skill.loaded.fail",
-                                            {"skill": skill["id"]}))
-                            skill["do_not_load"] = True
-                    loaded_skills[skill_folder] = skill
-
-            # get the last modified skill
-            modified_dates = map(lambda x: x.get("last_modified"),
-                                 loaded_skills.values())
-            if len(modified_dates) > 0:
-                last_modified_skill = max(modified_dates)
-
-            # Pause briefly before beginning next scan
-            time.sleep(2)
+                            "External shutdown for " + skill_folder + " is forbidden")
+                        return
+            else:
+                ws.emit(Message("shutdown_skill_response",
+                                {"status": "shutdown",
+                                 "skill_id": skill["id"]}))
+                logger.debug(skill_folder + " already shutdown")
+                return
+        # check if we are supposed to load this skill
+        elif skill["do_not_load"]:
+            return
+        skill["path"] = os.path.join(SKILLS_DIR, skill_folder)
+        # checking if is a skill
+        if not MainModule + ".py" in os.listdir(skill["path"]):
+            return
+
+        # checking if skill is loaded and wasn't modified
+        if skill.get("loaded") and not (modified or skill["reload_request"]):
+            return
+        # checking if skill was modified or reload was requested
+        elif skill.get("instance") and (modified or skill["reload_request"]):
+            # checking if skill reload was requested
+            if skill["reload_request"]:
+                logger.debug(
+                    "External reload for " + skill_folder + " requested")
+                loaded_skills[skill_folder][
+                    "reload_request"] = False
+                if skill["instance"].external_reload:
+                    ws.emit(Message("reload_skill_response",
+                                    {"status": "reloading",
+                                     "skill_id": skill["id"]}))
+                    skill["do_not_reload"] = False
+                else:
+                    ws.emit(Message("reload_skill_response",
+                                    {"status": "forbidden",
+                                     "skill_id": skill["id"]}))
+                    logger.debug(
+                        "External reload for " + skill_folder + " is forbidden")
+                    skill["do_not_reload"] = True
+            # check if skills allows auto_reload
+            elif not skill["instance"].reload_skill:
+                return
+            else:
+                skill["do_not_reload"] = False
+            # check if we are suposed to reload skill
+            if not skill["do_not_reload"]:
+                logger.debug("Reloading Skill: " + skill_folder)
+                # removing listeners and stopping threads
+                if skill.get("instance") is not None:
+                    logger.debug(
+                        "Shutting down Skill: " + skill_folder)
+                    skill["instance"].shutdown()
+                    del skill["instance"]
+                else:
+                    logger.debug(
+                        "Skill " + skill_folder + " is already shutdown")
+
+        # load skill
+        if not skill["do_not_reload"]:
+            skill["loaded"] = True
+            if not _load_skill(skill_folder, skill):
+                skill["do_not_load"] = True
+        loaded_skills[skill_folder] = skill
+
+    def request_check(self, skill_folder):
+        """ check skill_folder right away, after a bus request """
+        self.watcher.request(skill_folder)
 
     def stop(self):
         self._stop_event.set()
+        self.watcher.stop()
+
+
+def _request_skill_check(skill_folder):
+    """ wake the skill watcher to act on a reload or shutdown request """
+    if skill_reload_thread:
+        skill_reload_thread.request_check(skill_folder)
 
 
 def handle_shutdown_skill_request(message):
@@ -457,6 +486,7 @@ def handle_shutdown_skill_request(message):
             loaded_skills[skill]["reload_request"] = False
             # loaded_skills[skill]["loaded"] = False
             ws.emit(Message("shutdown_skill_response", {"status": "waiting", "skill_id": skill_id}))
+            _request_skill_check(skill)
             break
 
 
@@ -470,6 +500,7 @@ def handle_reload_skill_request(message):
             loaded_skills[skill]["shutdown"] = False
             loaded_skills[skill]["loaded"] = False
             ws.emit(Message("reload_skill_response", {"status": "waiting", "skill_id": skill_id}))
+            _request_skill_check(skill)
             break
 
 
@@ -478,6 +509,9 @@ def handle_conversation_request(message):
     utterances = message.data["utterances"]
     lang = message.data["lang"]
     global ws, loaded_skills
+    # context carries the converse request id, answers always name the
+    # requested skill so the intent service can match them
+    context = message.context
     # loop trough skills list and call converse for skill with skill_id
     for skill in loaded_skills:
         if loaded_skills[skill]["id"] == skill_id:
@@ -486,17 +520,17 @@ def handle_conversation_request(message):
             except:
                 logger.error("converse requested but skill not loaded")
                 ws.emit(Message("skill.converse.response", {
-                    "skill_id": 0, "result": False}))
+                    "skill_id": skill_id, "result": False}, context))
                 return
             try:
                 result = instance.converse(utterances, lang)
                 ws.emit(Message("skill.converse.response", {
-                    "skill_id": skill_id, "result": result}))
+                    "skill_id": skill_id, "result": result}, context))
                 return
             except:
                 logger.error("Converse method malformed for skill " + str(skill_id))
     ws.emit(Message("skill.converse.response", {
-        "skill_id": 0, "result": False}))
+        "skill_id": skill_id, "result": False}, context))
 
 
 def handle_loaded_skills_request(message):
@@ -518,6 +552,7 @@ def handle_loaded_skills_request(message):
 def main():
     global ws
     lock = Lock('skills')  # prevent multiple instances of this service
+    LOG.init('skills')
 
     # Connect this Skill management process to the websocket
     ws = WebsocketClient()
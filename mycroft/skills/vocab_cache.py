@@ -0,0 +1,102 @@
+# Copyright 2016 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Core.
+#
+# Mycroft Core is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Mycroft Core is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Mycroft Core.  If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import json
+import os
+from os.path import join
+
+from mycroft.filesystem import FileSystemAccess
+from mycroft.util.log import getLogger
+
+__author__ = 'jarbas'
+
+logger = getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class VocabCache(object):
+    """
+        Parsed vocabulary and regex files, kept in ~/.mycroft/vocab_cache
+        with one cache file per directory. A file is only parsed again
+        when its modification time or size changed.
+
+        Args:
+            enabled:    use the cache on disk, parse every file if False
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_file(directory, extension):
+        return hashlib.md5(directory + extension).hexdigest() + ".json"
+
+    def _load(self, name):
+        try:
+            with FileSystemAccess("vocab_cache").open(name, "r") as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        if cache.get("version") != CACHE_VERSION:
+            return {}
+        return cache.get("files", {})
+
+    def _save(self, name, files):
+        try:
+            with FileSystemAccess("vocab_cache").open(name, "w") as f:
+                json.dump({"version": CACHE_VERSION, "files": files}, f)
+        except IOError:
+            logger.error("Could not save vocab cache " + name)
+
+    def read(self, directory, extension, parse):
+        """
+            Read every file in directory ending with extension.
+
+            Args:
+                directory:  vocab or regex directory
+                extension:  ".voc" or ".rx"
+                parse:      parse(path) returning the entries of a file
+            Returns:    the entries of all files, ordered by file name
+        """
+        names = sorted(f for f in os.listdir(directory)
+                       if f.endswith(extension))
+        if not self.enabled:
+            entries = []
+            for name in names:
+                entries += parse(join(directory, name))
+            return entries
+
+        cache_file = self._cache_file(directory, extension)
+        cached = self._load(cache_file)
+        files = {}
+        entries = []
+        for name in names:
+            path = join(directory, name)
+            stat = os.stat(path)
+            key = [stat.st_mtime, stat.st_size]
+            if name in cached and cached[name]["key"] == key:
+                self.hits += 1
+                files[name] = cached[name]
+            else:
+                self.misses += 1
+                files[name] = {"key": key, "entries": parse(path)}
+            entries += files[name]["entries"]
+        if files != cached:
+            self._save(cache_file, files)
+        return entries
@@ -0,0 +1,203 @@
+# Copyright 2016 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Core.
+#
+# Mycroft Core is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Mycroft Core is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Mycroft Core.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import time
+from os.path import basename, isdir, join, relpath
+from threading import Condition, Thread, Event
+
+from mycroft.util.log import getLogger
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+__author__ = 'jarbas'
+
+logger = getLogger(__name__)
+
+
+def get_last_modified_date(path):
+    """
+        Get last modified date excluding compiled python files, hidden
+        directories and the settings.json file.
+
+        Arg:
+            path:   skill directory to check
+        Returns:    time of last change
+    """
+    last_date = 0
+    root_dir, subdirs, files = os.walk(path).next()
+    # get subdirs and remove hidden ones
+    subdirs = [s for s in subdirs if not s.startswith('.')]
+    for subdir in subdirs:
+        for root, _, _ in os.walk(join(path, subdir)):
+            base = os.path.basename(root)
+            # checking if is a hidden path
+            if not base.startswith(".") and not base.startswith("/."):
+                last_date = max(last_date, os.path.getmtime(root))
+
+    # check files of interest in the skill root directory
+    files = [f for f in files
+             if not f.endswith('.pyc') and f != 'settings.json']
+    for f in files:
+        last_date = max(last_date, os.path.getmtime(os.path.join(path, f)))
+    return last_date
+
+
+class SkillsWatcher(object):
+    """
+        Reports which skill folders of a skills directory changed.
+
+        Uses inotify through pyinotify when it is installed, one recursive
+        watch on the skills directory, so an idle system does no work at
+        all. Without it every skill folder is scanned every poll_interval
+        seconds. Changes are debounced per skill folder: a folder is only
+        reported once nothing changed in it for debounce seconds, so
+        copying or checking out a skill reloads it once.
+    """
+    MASK = 0
+    if pyinotify:
+        MASK = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | \
+            pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM | \
+            pyinotify.IN_MOVED_TO
+
+    def __init__(self, directory, debounce=1.0, poll_interval=2.0,
+                 use_inotify=True):
+        self.directory = directory
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and pyinotify is not None
+        self.condition = Condition()
+        # skill folder -> time of the last change seen
+        self.pending = {}
+        # skill folders to report right away
+        self.requested = set()
+        self.notifier = None
+        self.poll_thread = None
+        self._stop_event = Event()
+
+    @property
+    def mode(self):
+        return "inotify" if self.use_inotify else "polling"
+
+    def start(self):
+        if self.use_inotify:
+            try:
+                self._start_inotify()
+                return
+            except Exception as e:
+                logger.error("inotify unavailable, polling skills: " +
+                             str(e))
+                self.use_inotify = False
+        self.poll_thread = Thread(target=self._poll)
+        self.poll_thread.daemon = True
+        self.poll_thread.start()
+
+    def _start_inotify(self):
+        manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.ThreadedNotifier(manager,
+                                                   self._handle_event)
+        self.notifier.daemon = True
+        self.notifier.start()
+        manager.add_watch(self.directory, self.MASK, rec=True,
+                          auto_add=True, exclude_filter=self._hidden)
+
+    @staticmethod
+    def _hidden(path):
+        return basename(path).startswith('.')
+
+    def stop(self):
+        self._stop_event.set()
+        if self.notifier:
+            self.notifier.stop()
+            self.notifier = None
+        with self.condition:
+            self.condition.notify_all()
+
+    def _handle_event(self, event):
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            # events were lost, consider everything changed
+            for folder in os.listdir(self.directory):
+                self.changed(folder)
+            return
+        path = relpath(event.pathname, self.directory)
+        parts = path.split(os.sep)
+        if path == os.curdir or any(p.startswith('.') for p in parts):
+            return
+        if parts[-1].endswith('.pyc') or parts[-1] == 'settings.json':
+            return
+        self.changed(parts[0])
+
+    def _poll(self):
+        modified = {}
+        while not self._stop_event.is_set():
+            for folder in os.listdir(self.directory):
+                path = join(self.directory, folder)
+                if folder.startswith('.') or not isdir(path):
+                    continue
+                try:
+                    date = get_last_modified_date(path)
+                except OSError:
+                    # removed while scanning
+                    continue
+                if folder in modified and date > modified[folder]:
+                    self.changed(folder)
+                modified[folder] = date
+            # a timed Event.wait polls in python 2, sleep is cheaper
+            time.sleep(self.poll_interval)
+
+    def changed(self, folder):
+        """ folder changed on disk, report it after the debounce delay """
+        with self.condition:
+            self.pending[folder] = time.time()
+            self.condition.notify_all()
+
+    def request(self, folder):
+        """ report folder on the next wait, without debouncing """
+        with self.condition:
+            self.requested.add(folder)
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+            Block until skill folders are ready to be reported, stop() was
+            called or timeout seconds passed. Returns the set of folders.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while not self._stop_event.is_set():
+                now = time.time()
+                ready = set(self.requested)
+                ready.update(folder for folder, changed in
+                             self.pending.items()
+                             if now - changed >= self.debounce)
+                if ready:
+                    self.requested.clear()
+                    for folder in ready:
+                        self.pending.pop(folder, None)
+                    return ready
+                delays = [changed + self.debounce - now
+                          for changed in self.pending.values()]
+                if deadline is not None:
+                    delays.append(deadline - now)
+                    if deadline <= now:
+                        break
+                self.condition.wait(min(delays) if delays else None)
+        return set()
@@ -14,22 +14,22 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with Mycroft Core.  If not, see <http://www.gnu.org/licenses/>.
-import hashlib
 import random
-from Queue import Queue, Empty
-from threading import Thread
+from collections import deque
+from Queue import Queue
+from threading import Thread, Event, Lock
 from time import time, sleep
 
-import os
-import os.path
+import wave
 from abc import ABCMeta, abstractmethod
 from os.path import dirname, exists, isdir
 
-import mycroft.util
 from mycroft.client.enclosure.api import EnclosureAPI
 from mycroft.configuration import ConfigurationManager
 from mycroft.messagebus.message import Message
-from mycroft.util import play_wav, play_mp3, check_for_signal, create_signal
+from mycroft.tts.cache import TTSCache, get_cache
+from mycroft.util import play_wav, play_mp3, play_pcm, check_for_signal, \
+    create_signal
 from mycroft.util.log import LOG
 import re
 
@@ -48,6 +48,20 @@ class PlaybackThread(Thread):
         self._terminated = False
         self._processing_queue = False
         self._clear_visimes = False
+        # seconds from the speak request to its first audio, and silences
+        # between its sentences waiting for synthesis, latest utterances
+        self.first_audio = deque(maxlen=100)
+        self.gaps = deque(maxlen=1000)
+        self._utterance_start = None
+        self._last_end = None
+
+    def begin_utterance(self, start=None):
+        """
+            Time the audio queued from now on as a new utterance, requested
+            at start. Queued as a marker, the sentences of the previous
+            utterance still queued are not counted as its first audio.
+        """
+        self.queue.put(('utterance', start or time(), None))
 
     def init(self, tts):
         self.tts = tts
@@ -57,7 +71,11 @@ class PlaybackThread(Thread):
             Remove all pending playbacks.
         """
         while not self.queue.empty():
-            self.queue.get()
+            item = self.queue.get()
+            if item and item[0] == 'stream':
+                item[1].cancel()
+        self._utterance_start = None
+        self._last_end = None
         try:
             self.p.terminate()
         except:
@@ -70,36 +88,78 @@ class PlaybackThread(Thread):
         """
         while not self._terminated:
             try:
-                snd_type, data, visimes = self.queue.get(timeout=2)
+                # a timed get polls in python 2, stop() queues None instead
+                item = self.queue.get()
+                if item is None:
+                    continue
+                snd_type, data, visimes = item
+                if snd_type == 'utterance':
+                    self._utterance_start = data
+                    self._last_end = None
+                    if self._processing_queue and self.queue.empty():
+                        self.tts.end_audio()
+                        self._processing_queue = False
+                    continue
+                self._measure()
                 self.blink(0.5)
                 if not self._processing_queue:
                     self._processing_queue = True
                     self.tts.begin_audio()
 
-                if snd_type == 'wav':
-                    self.p = play_wav(data)
-                elif snd_type == 'mp3':
-                    self.p = play_mp3(data)
-
-                if visimes:
-                    if self.show_visimes(visimes):
-                        self.clear_queue()
+                if snd_type == 'stream':
+                    self.p = play_pcm(data.rate)
+                    self._stream(data)
                 else:
-                    self.p.communicate()
+                    if snd_type == 'wav':
+                        self.p = play_wav(data)
+                    elif snd_type == 'mp3':
+                        self.p = play_mp3(data)
+
+                    if visimes:
+                        if self.show_visimes(visimes):
+                            self.clear_queue()
+                    else:
+                        self.p.communicate()
                 self.p.wait()
 
+                self._last_end = time()
                 if self.queue.empty():
                     self.tts.end_audio()
                     self._processing_queue = False
                 self.blink(0.2)
-            except Empty:
-                pass
             except Exception, e:
                 LOG.exception(e)
                 if self._processing_queue:
                     self.tts.end_audio()
                     self._processing_queue = False
 
+    def _stream(self, stream):
+        """ write the chunks of an AudioStream to the player as they come """
+        try:
+            for chunk in stream:
+                self.p.stdin.write(chunk)
+        except IOError:
+            # the player was stopped
+            stream.cancel()
+        finally:
+            try:
+                self.p.stdin.close()
+            except IOError:
+                pass
+
+    def _measure(self):
+        now = time()
+        if self._utterance_start:
+            self.first_audio.append(now - self._utterance_start)
+            LOG.debug("TTS time to first audio: %.3f s",
+                      now - self._utterance_start)
+            self._utterance_start = None
+        elif self._last_end:
+            self.gaps.append(now - self._last_end)
+            if now - self._last_end > 0.1:
+                LOG.debug("TTS gap between sentences: %.3f s",
+                          now - self._last_end)
+
     def show_visimes(self, pairs):
         """
             Send visime data to enclosure
@@ -134,6 +194,62 @@ class PlaybackThread(Thread):
         """ Stop thread """
         self._terminated = True
         self.clear_queue()
+        self.queue.put(None)
+
+
+class AudioStream(object):
+    """
+        Audio of a sentence played while it is synthesized.
+
+        The engine puts chunks of 16 bit mono audio and ends the stream, the
+        playback thread iterates them as they come. Once iterated through,
+        the audio is saved to wav_file, when set, and on_saved is called.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.wav_file = None
+        self.on_saved = None
+        self.cancelled = False
+        self.error = None
+        self._chunks = Queue()
+        self._played = []
+
+    def put(self, chunk):
+        self._chunks.put(chunk)
+
+    def end(self, error=None):
+        self.error = error
+        self._chunks.put(None)
+
+    def cancel(self):
+        """ the rest of the audio is not needed """
+        self.cancelled = True
+
+    def __iter__(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            self._played.append(chunk)
+            yield chunk
+        if self.error:
+            raise self.error
+        if self.wav_file:
+            self._save()
+
+    def _save(self):
+        try:
+            f = wave.open(self.wav_file, 'wb')
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.rate)
+            f.writeframes(''.join(self._played))
+            f.close()
+        except (IOError, wave.Error) as e:
+            LOG.debug("Failed to save " + self.wav_file + ": " + str(e))
+            return
+        if self.on_saved:
+            self.on_saved()
 
 
 class TTS(object):
@@ -154,10 +270,15 @@ class TTS(object):
         self.validator = validator
         self.enclosure = None
         random.seed()
+        # cache key -> [lock, users], a sentence is synthesized once at a time
+        self._synthesizing = {}
+        self._synthesizing_lock = Lock()
         self.queue = Queue()
         self.playback = PlaybackThread(self.queue)
         self.playback.start()
-        self.clear_cache()
+        # cached audio is keyed by engine, cache_voice() and lang, it is
+        # kept when the voice changes
+        self.cache = get_cache()
         self.ssml_support = self.config.get("ssml", False)
         default_tags = ["speak", "lang", "p", "phoneme", "prosody", "break",
                         "sub"]
@@ -197,6 +318,29 @@ class TTS(object):
         """
         pass
 
+    def get_tts_stream(self, sentence):
+        """
+            Engines synthesizing audio progressively can return it as an
+            AudioStream, played while the rest is synthesized.
+
+            Args:
+                sentence(str): Sentence to synthesize
+
+            Returns: AudioStream, None to use get_tts
+        """
+        return None
+
+    def prepare(self, sentences):
+        """
+            Called with the sentences of an utterance before they are
+            synthesized one by one, engines synthesizing several sentences
+            at once can start here.
+
+            Args:
+                sentences (list): validated sentences, in order
+        """
+        pass
+
     def validate_ssml(self, utterance):
         """
             Check if engine supports ssml, if not remove all tags
@@ -248,19 +392,73 @@ class TTS(object):
             Args:
                 sentence:   Sentence to be spoken
         """
-        key = str(hashlib.md5(sentence.encode('utf-8', 'ignore')).hexdigest())
-        wav_file = os.path.join(mycroft.util.get_cache_directory("tts"),
-                                key + '.' + self.type)
+        self.queue.put(self.synthesize(sentence))
+
+    def can_pipeline(self):
+        """
+            True if sentences can be synthesized ahead of playback, engines
+            overriding execute() speak themselves.
+        """
+        return type(self).execute.__func__ is TTS.execute.__func__
+
+    def synthesize(self, sentence):
+        """
+            Convert sentence to audio without playing it, from the cache if
+            possible.
 
-        if os.path.exists(wav_file):
+            Args:
+                sentence:   Sentence to be spoken
+
+            Returns: (type, audio file, visimes) tuple for the playback
+                     queue, ('stream', AudioStream, None) for streamed audio
+        """
+        key = self.cache_key(sentence)
+        # the same sentence synthesized twice at once would write the same
+        # cache file, the second one waits and is served from the cache
+        with self._synthesizing_lock:
+            synthesizing = self._synthesizing.setdefault(key, [Lock(), 0])
+            synthesizing[1] += 1
+        try:
+            with synthesizing[0]:
+                return self._synthesize(sentence, key)
+        finally:
+            with self._synthesizing_lock:
+                synthesizing[1] -= 1
+                if not synthesizing[1]:
+                    del self._synthesizing[key]
+
+    def _synthesize(self, sentence, key):
+        cached = self.cache.get(key)
+        if cached:
             LOG.debug("TTS cache hit")
-            phonemes = self.load_phonemes(key)
+            wav_file, phonemes = cached
         else:
+            wav_file = self.cache.path(key, self.type)
+            stream = self.get_tts_stream(sentence)
+            if stream:
+                # cached once played through
+                stream.wav_file = wav_file
+                stream.on_saved = lambda: self.cache.add(key, wav_file)
+                return 'stream', stream, None
             wav_file, phonemes = self.get_tts(sentence, wav_file)
-            if phonemes:
-                self.save_phonemes(key, phonemes)
+            self.cache.add(key, wav_file, phonemes)
+
+        return self.type, wav_file, self.visime(phonemes)
+
+    def cache_key(self, sentence):
+        """ key of the sentence in the TTS cache """
+        return TTSCache.key(sentence, self.__class__.__name__,
+                            self.cache_voice(), self.lang)
+
+    def cache_voice(self):
+        """
+            What makes the audio of the engine differ for the same sentence
+            and lang, engines with other settings than voice override it.
+        """
+        return self.voice
 
-        self.queue.put((self.type, wav_file, self.visime(phonemes)))
+    def is_cached(self, sentence):
+        return self.cache.get(self.cache_key(sentence)) is not None
 
     def visime(self, phonemes):
         """
@@ -274,55 +472,134 @@ class TTS(object):
 
     def clear_cache(self):
         """ Remove all cached files. """
-        if not os.path.exists(mycroft.util.get_cache_directory('tts')):
-            return
-        for f in os.listdir(mycroft.util.get_cache_directory("tts")):
-            file_path = os.path.join(mycroft.util.get_cache_directory("tts"),
-                                     f)
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
+        self.cache.clear()
 
-    def save_phonemes(self, key, phonemes):
-        """
-            Cache phonemes
+    def __del__(self):
+        self.playback.stop()
+        self.playback.join()
 
-            Args:
-                key:        Hash key for the sentence
-                phonemes:   phoneme string to save
-        """
-        # Clean out the cache as needed
-        cache_dir = mycroft.util.get_cache_directory("tts")
-        mycroft.util.curate_cache(cache_dir)
 
-        pho_file = os.path.join(cache_dir, key + ".pho")
-        try:
-            with open(pho_file, "w") as cachefile:
-                cachefile.write(phonemes)
-        except:
-            LOG.debug("Failed to write .PHO to cache")
-            pass
+class _Synthesis(object):
+    """ a sentence being synthesized by a TTSPipeline worker """
+    def __init__(self, sentence, generation):
+        self.sentence = sentence
+        self.generation = generation
+        self.audio = None
+        self.error = None
+        self.done = Event()
+
+
+class TTSPipeline(object):
+    """
+        Synthesizes the sentences of an utterance ahead of playback.
+
+        Sentences are synthesized in order by a pool of worker threads, up
+        to look_ahead sentences past the next one to play. Each one is
+        queued for playback as soon as it and all sentences before it are
+        ready, so the next sentence is usually ready before the current
+        one ends.
+
+        cancel() drops the sentences not queued yet, audio still being
+        synthesized is thrown away when it is done.
+    """
+    def __init__(self, tts, workers=1, look_ahead=2):
+        self.tts = tts
+        self.look_ahead = max(0, look_ahead)
+        self.tasks = Queue()
+        self.lock = Lock()
+        self.generation = 0
+        self.pending = []
+        self.workers = []
+        for _ in range(max(1, workers)):
+            worker = Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            if task.generation == self.generation:
+                try:
+                    task.audio = self.tts.synthesize(task.sentence)
+                except Exception as e:
+                    task.error = e
+                if task.generation != self.generation:
+                    self._discard(task.audio)
+            task.done.set()
 
-    def load_phonemes(self, key):
+    @staticmethod
+    def _discard(audio):
+        """ stop streamed audio thrown away from synthesizing """
+        if audio and audio[0] == 'stream':
+            audio[1].cancel()
+
+    def _submit(self, sentence, generation):
+        task = _Synthesis(sentence, generation)
+        with self.lock:
+            if generation != self.generation:
+                task.done.set()
+            else:
+                self.pending.append(task)
+        self.tasks.put(task)
+        return task
+
+    def speak(self, sentences, start=None, stopped=None):
         """
-            Load phonemes from cache file.
+            Queue the sentences for playback, synthesized ahead.
+
+            Blocks until every sentence is queued or the utterance is
+            cancelled.
 
             Args:
-                Key:    Key identifying phoneme cache
+                sentences (list): the sentences, in order
+                start (float): time of the speak request, for metrics
+                stopped (callable): checked before queueing each sentence,
+                                    stops speaking if it returns True
         """
-        pho_file = os.path.join(mycroft.util.get_cache_directory("tts"),
-                                key + ".pho")
-        if os.path.exists(pho_file):
-            try:
-                with open(pho_file, "r") as cachefile:
-                    phonemes = cachefile.read().strip()
-                return phonemes
-            except:
-                LOG.debug("Failed to read .PHO from cache")
-        return None
-
-    def __del__(self):
-        self.playback.stop()
-        self.playback.join()
+        generation = self.generation
+        self.tts.playback.begin_utterance(start)
+        sentences = list(sentences)
+        self.tts.prepare(sentences)
+        tasks = []
+        sentences = iter(sentences)
+        for sentence in sentences:
+            tasks.append(self._submit(sentence, generation))
+            if len(tasks) > self.look_ahead:
+                break
+        while tasks:
+            task = tasks.pop(0)
+            task.done.wait()
+            with self.lock:
+                if task in self.pending:
+                    self.pending.remove(task)
+            if generation != self.generation or (stopped and stopped()):
+                self._discard(task.audio)
+                self.cancel()
+                return
+            if task.error:
+                LOG.error("Error synthesizing '%s': %s",
+                          task.sentence, repr(task.error))
+            elif task.audio:
+                self.tts.queue.put(task.audio)
+            for sentence in sentences:
+                tasks.append(self._submit(sentence, generation))
+                break
+
+    def cancel(self):
+        """ Stop the utterances being spoken, nothing more is queued """
+        with self.lock:
+            self.generation += 1
+            pending, self.pending = self.pending, []
+        for task in pending:
+            task.done.set()
+
+    def shutdown(self):
+        self.cancel()
+        for _ in self.workers:
+            self.tasks.put(None)
 
 
 class TTSValidator(object):
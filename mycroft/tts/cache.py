@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+from glob import glob
+from os.path import getsize, isfile, join
+from threading import Lock
+from time import time
+
+import mycroft.util
+from mycroft.configuration import ConfigurationManager
+from mycroft.util.log import LOG
+
+__author__ = 'jarbas'
+
+
+class TTSCache(object):
+    """
+        Synthesized audio kept on disk with a byte budget.
+
+        Files are named after the cache key, the audio (key.wav, key.mp3,
+        ...) and the phonemes (key.pho) of a sentence. An sqlite index
+        in the cache directory holds the size and last access of every
+        entry, when the budget is exceeded the least recently used entries
+        are removed. Files removed from the directory by someone else are
+        dropped from the index when found missing.
+    """
+    def __init__(self, directory=None, max_bytes=50 * 1024 * 1024):
+        self.directory = directory or mycroft.util.get_cache_directory("tts")
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.lock = Lock()
+        self.db = sqlite3.connect(join(self.directory, "index.db"),
+                                  check_same_thread=False)
+        # it is a cache, losing the last changes is fine
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                        "key TEXT PRIMARY KEY, ext TEXT, size INTEGER, "
+                        "last_access REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS lru ON "
+                        "entries (last_access)")
+        self._reconcile()
+
+    @staticmethod
+    def key(sentence, engine, voice, lang):
+        """ cache key of a sentence spoken by an engine, voice and lang """
+        text = u"\n".join(unicode(part) for part in
+                          (engine, voice, lang, sentence))
+        return hashlib.md5(text.encode('utf-8', 'ignore')).hexdigest()
+
+    def path(self, key, ext):
+        return join(self.directory, key + '.' + ext)
+
+    def _reconcile(self):
+        """ drop index entries without files and files without entries """
+        with self.lock:
+            known = set()
+            for key, ext in self.db.execute("SELECT key, ext FROM entries"):
+                if isfile(self.path(key, ext)):
+                    known.add(key)
+                else:
+                    self.db.execute("DELETE FROM entries WHERE key = ?",
+                                    (key,))
+            for filename in os.listdir(self.directory):
+                if filename.startswith("index.db"):
+                    continue
+                if filename.split('.')[0] not in known:
+                    try:
+                        os.remove(join(self.directory, filename))
+                    except OSError:
+                        pass
+            self.db.commit()
+            self.total = self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        """
+            Look up a sentence and mark it as used.
+
+            Returns:
+                (audio file, phonemes) tuple, None if it is not cached
+        """
+        with self.lock:
+            row = self.db.execute("SELECT ext, size FROM entries WHERE "
+                                  "key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            audio_file = self.path(key, row[0])
+            if not isfile(audio_file):
+                self._remove(key, row[0], row[1])
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE entries SET last_access = ? WHERE "
+                            "key = ?", (time(), key))
+            self.db.commit()
+        phonemes = None
+        pho_file = self.path(key, "pho")
+        if isfile(pho_file):
+            try:
+                with open(pho_file) as f:
+                    phonemes = f.read().strip()
+            except IOError:
+                LOG.debug("Failed to read .PHO from cache")
+        return audio_file, phonemes
+
+    def add(self, key, audio_file, phonemes=None):
+        """
+            Index audio written to path(key, ext), evicting the least
+            recently used entries to stay within the budget.
+
+            Returns:
+                int: number of entries evicted
+        """
+        ext = audio_file.rsplit('.', 1)[-1]
+        if audio_file != self.path(key, ext):
+            # not written to the cache
+            return 0
+        size = 0
+        try:
+            size = getsize(audio_file)
+            if phonemes:
+                with open(self.path(key, "pho"), "w") as f:
+                    f.write(phonemes)
+                size += len(phonemes)
+        except (IOError, OSError) as e:
+            LOG.debug("Failed to cache " + audio_file + ": " + str(e))
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE key = ?",
+                                  (key,)).fetchone()
+            if row:
+                self.total -= row[0]
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES "
+                            "(?, ?, ?, ?)", (key, ext, size, time()))
+            self.total += size
+            evicted = self._evict(keep=key)
+            self.db.commit()
+        return evicted
+
+    def _remove(self, key, ext, size):
+        """ remove an entry and its files, called with the lock held """
+        for path in (self.path(key, ext), self.path(key, "pho")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.total -= size
+
+    def _evict(self, keep=None):
+        evicted = 0
+        while self.total > self.max_bytes:
+            rows = self.db.execute("SELECT key, ext, size FROM entries "
+                                   "ORDER BY last_access LIMIT 20").fetchall()
+            rows = [row for row in rows if row[0] != keep]
+            if not rows:
+                break
+            for key, ext, size in rows:
+                self._remove(key, ext, size)
+                evicted += 1
+                self.evictions += 1
+                if self.total <= self.max_bytes:
+                    break
+        return evicted
+
+    def clear(self):
+        """ Remove every cached file. """
+        with self.lock:
+            for key, ext, size in self.db.execute(
+                    "SELECT key, ext, size FROM entries").fetchall():
+                self._remove(key, ext, size)
+            self.db.commit()
+            self.total = 0
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def dialog_lines(skills_dir, lang):
+    """ lines of the .dialog files of every skill, templates excluded """
+    for dialog in sorted(glob(join(skills_dir, "*", "dialog", lang,
+                                   "*.dialog"))):
+        with open(dialog) as f:
+            for line in f:
+                line = line.decode('utf-8', 'ignore').strip()
+                if line and "{{" not in line and not line.startswith("#"):
+                    yield line
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_cache():
+    """ The TTS cache shared by the TTS engines of this process """
+    global _cache
+    # a second TTSCache would remove the files missing from its index,
+    # audio the first one is writing included
+    with _cache_lock:
+        if _cache is None:
+            config = ConfigurationManager.get().get("tts", {}).get("cache",
+                                                                   {})
+            _cache = TTSCache(max_bytes=config.get("max_bytes",
+                                                   50 * 1024 * 1024))
+    return _cache
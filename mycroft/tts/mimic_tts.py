@@ -41,7 +41,6 @@ class Mimic(TTS):
     def __init__(self, lang, config):
         super(Mimic, self).__init__(lang, config, MimicValidator(self))
         self.init_args()
-        self.clear_cache()
         self.type = 'wav'
         self.extra_tags = ["voice", "emphasis", "audio", "sub", "ssml"]
 
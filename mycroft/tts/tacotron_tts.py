@@ -17,10 +17,13 @@
 
 
 import time
-from mycroft.tts import TTS, TTSValidator
+from itertools import izip
+from Queue import Queue, Empty
+from threading import Thread, Event, Lock
+
+from mycroft.tts import TTS, TTSValidator, AudioStream
 from mycroft.util.log import getLogger
 from mycroft.configuration import ConfigurationManager
-from mycroft.util import play_wav
 from mycroft import MYCROFT_ROOT_PATH as root_path
 
 __author__ = 'jarbas'
@@ -28,42 +31,200 @@ __author__ = 'jarbas'
 LOGGER = getLogger("Tacotron")
 
 
+class _Request(object):
+    """ a sentence waiting for the TacotronServer """
+    def __init__(self, sentence, stream=None):
+        self.sentence = sentence
+        self.stream = stream
+        self.wav = None
+        self.error = None
+        self.cancelled = False
+        self.done = Event()
+
+    def finish(self, error=None):
+        self.error = error
+        if self.stream:
+            self.stream.end(error)
+        self.done.set()
+
+
+class TacotronServer(Thread):
+    """
+        Keeps the Tacotron model loaded, synthesizing the sentences
+        submitted from any thread in batches of up to batch_size.
+
+        The sentences submitted together, and any others waiting when the
+        model is free, are padded and run as one batch.
+
+        With stream_frames, each request streams its audio in blocks of that
+        many frames as they are inverted, instead of the whole waveform.
+    """
+    def __init__(self, synthesizer, batch_size=8, iters=None,
+                 stream_frames=0):
+        super(TacotronServer, self).__init__()
+        self.daemon = True
+        self.synthesizer = synthesizer
+        self.batch_size = max(1, batch_size)
+        self.iters = iters
+        self.stream_frames = stream_frames
+        self.requests = Queue()
+        self.waiting = []
+
+    def submit(self, sentences):
+        """
+            Returns:
+                list: a _Request per sentence, done when synthesized
+        """
+        if self.stream_frames:
+            rate = self.synthesizer.sample_rate
+            requests = [_Request(sentence, AudioStream(rate))
+                        for sentence in sentences]
+        else:
+            requests = [_Request(sentence) for sentence in sentences]
+        self.requests.put(requests)
+        return requests
+
+    @staticmethod
+    def _pending(requests):
+        for request in requests:
+            if request.cancelled or (request.stream and
+                                     request.stream.cancelled):
+                request.cancelled = True
+                request.finish(RuntimeError("Cancelled"))
+        return [request for request in requests if not request.cancelled]
+
+    def _next_batch(self):
+        while not self.waiting:
+            requests = self.requests.get()
+            if requests is None:
+                return None
+            self.waiting = self._pending(requests)
+        while len(self.waiting) < self.batch_size:
+            try:
+                requests = self.requests.get_nowait()
+            except Empty:
+                break
+            if requests is None:
+                self.requests.put(None)
+                break
+            self.waiting += self._pending(requests)
+        batch = self.waiting[:self.batch_size]
+        self.waiting = self.waiting[self.batch_size:]
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.time()
+            texts = [request.sentence for request in batch]
+            try:
+                if self.stream_frames:
+                    self._stream(batch, texts)
+                else:
+                    # each sentence is done as soon as its audio is ready
+                    wavs = self.synthesizer.synthesize_batch(texts,
+                                                             self.iters)
+                    for request, wav in izip(batch, wavs):
+                        request.wav = wav
+                        request.finish()
+            except Exception as e:
+                for request in batch:
+                    if not request.done.is_set():
+                        request.finish(e)
+            LOGGER.info("Synthesized %d sentences in %.2f s" %
+                        (len(batch), time.time() - start))
+
+    def _stream(self, batch, texts):
+        streams = self.synthesizer.synthesize_stream(texts, self.iters,
+                                                     self.stream_frames)
+        for request, chunks in izip(batch, streams):
+            if request.stream.cancelled:
+                request.finish(RuntimeError("Cancelled"))
+                continue
+            for chunk in chunks:
+                request.stream.put(chunk.tostring())
+                if request.stream.cancelled:
+                    break
+            request.finish()
+
+    def stop(self):
+        self.requests.put(None)
+
+
 class Tacotron(TTS):
     def __init__(self, lang, voice):
         super(Tacotron, self).__init__(lang, voice,
                                        TacotronValidator(self))
+        self.type = 'wav'
         config = ConfigurationManager.get().get('tts', {}).get("tacotron", {})
         model = config.get("model", "tacotron-20170720")
         path = root_path + "/jarbas_models/tf_tacotron/trained/" + model + \
                "/model.ckpt"
         path = config.get("path", path)
+        self.model_path = path
+        self.server = None
+        self.prepared = {}
+        self.lock = Lock()
         try:
             from jarbas_models.tf_tacotron.synthesizer import Synthesizer
-            self.synthesizer = Synthesizer()
-            self.synthesizer.load(path)
+            synthesizer = Synthesizer()
+            synthesizer.load(path)
+            self.server = TacotronServer(
+                synthesizer, config.get("batch_size", 8),
+                config.get("griffin_lim_iters"),
+                config.get("stream_frames", 0))
+            self.server.start()
             LOGGER.info("Loaded Tacotron")
         except Exception as e:
             LOGGER.error(e)
             LOGGER.error("Install tacotron by running "
                          "/JarbasAI/scripts/install_tacotron.sh")
-            self.synthesizer = None
 
-    def execute(self, sentence, output="/tmp/tacotron_tts.wav"):
-        if self.synthesizer is None:
-            LOGGER.error("Tacotron failed to load")
+    def cache_voice(self):
+        return self.model_path
+
+    def prepare(self, sentences):
+        """ submit the sentences of an utterance not cached as one batch """
+        if self.server is None:
             return
-        self.begin_audio()
-        try:
-            start = time.time()
-            LOGGER.info("Tacotron, Synthethize")
-            self.synthesizer.synthesize(sentence, output)
-            play_wav(output)
-            LOGGER.info("elapsed time" + str(time.time() - start))
-        except Exception as e:
-            LOGGER.error(e)
-            LOGGER.error("Install tacotron by running "
-                         "/JarbasAI/scripts/install_tacotron.sh")
-        self.end_audio()
+        with self.lock:
+            # left over by a cancelled utterance
+            for request in self.prepared.values():
+                request.cancelled = True
+            sentences = [s for i, s in enumerate(sentences)
+                         if s not in sentences[:i] and not self.is_cached(s)]
+            self.prepared = dict(zip(sentences,
+                                     self.server.submit(sentences)))
+
+    def _request(self, sentence):
+        if self.server is None:
+            raise RuntimeError("Tacotron failed to load")
+        with self.lock:
+            request = self.prepared.pop(sentence, None)
+        if request is None:
+            request = self.server.submit([sentence])[0]
+        return request
+
+    def get_tts_stream(self, sentence):
+        if self.server is None or not self.server.stream_frames:
+            return None
+        return self._request(sentence).stream
+
+    def get_tts(self, sentence, wav_file):
+        request = self._request(sentence)
+        request.done.wait()
+        if request.error:
+            raise request.error
+        from jarbas_models.tf_tacotron.util import audio
+        audio.save_wav(request.wav, wav_file)
+        return wav_file, None
+
+    def __del__(self):
+        if self.server:
+            self.server.stop()
+        super(Tacotron, self).__del__()
 
 
 class TacotronValidator(TTSValidator):
@@ -101,6 +101,17 @@ def play_mp3(uri):
     return subprocess.Popen(play_mp3_cmd)
 
 
+def play_pcm(rate):
+    """ player of 16 bit mono audio at rate written to its stdin """
+    config = mycroft.configuration.ConfigurationManager.instance()
+    play_cmd = config.get("play_pcm_cmdline")
+    play_pcm_cmd = str(play_cmd).split(" ")
+    for index, cmd in enumerate(play_pcm_cmd):
+        if cmd == "%1":
+            play_pcm_cmd[index] = str(rate)
+    return subprocess.Popen(play_pcm_cmd, stdin=subprocess.PIPE)
+
+
 def record(file_path, duration, rate, channels):
     if duration > 0:
         return subprocess.Popen(
@@ -14,11 +14,13 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with Mycroft Core.  If not, see <http://www.gnu.org/licenses/>.
-import inspect
 import logging
 import sys
-
+import time
+from logging.handlers import RotatingFileHandler
 from os.path import isfile
+from Queue import Queue, Empty, Full
+from threading import Thread, Lock, local
 
 from mycroft.util.json_helper import load_commented_json
 
@@ -28,44 +30,189 @@ def getLogger(name="Jarbas"):
     return logging.getLogger(name)
 
 
+class AsyncLogHandler(logging.Handler):
+    """
+    Handler that only queues records, a writer thread formats and writes
+    them in batches to stdout or to a rotating log file.
+
+    A batch is written once batch_size records are waiting or
+    flush_interval seconds after its first record. When queue_size records
+    are waiting new records are dropped and counted, logging never blocks.
+    """
+
+    def __init__(self, filename=None, queue_size=10000, batch_size=100,
+                 flush_interval=0.2, max_bytes=0, backup_count=3):
+        logging.Handler.__init__(self)
+        self.queue = Queue(queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        if filename:
+            self.target = RotatingFileHandler(filename, maxBytes=max_bytes,
+                                              backupCount=backup_count)
+        else:
+            self.target = logging.StreamHandler(sys.stdout)
+        self.count_lock = Lock()
+        self.dropped = 0
+        self.reported = 0
+        self.writer = Thread(target=self._write_loop)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def setFormatter(self, fmt):
+        logging.Handler.setFormatter(self, fmt)
+        self.target.setFormatter(fmt)
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            with self.count_lock:
+                self.dropped += 1
+
+    def _drain(self, batch):
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Empty:
+                return
+
+    def _write_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            self._drain(batch)
+            if len(batch) < self.batch_size and None not in batch:
+                # a timed Queue.get polls in python 2, sleep instead
+                time.sleep(self.flush_interval)
+                self._drain(batch)
+            stop = None in batch
+            self._write([r for r in batch if r is not None])
+            if stop:
+                return
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.target.format(record))
+            except Exception:
+                self.handleError(record)
+        dropped = self.dropped
+        if dropped > self.reported:
+            lines.append(self.target.format(logging.LogRecord(
+                'mycroft.util.log', logging.WARNING, __file__, 0,
+                '%d log records dropped, %d in total',
+                (dropped - self.reported, dropped), None)))
+            self.reported = dropped
+        if not lines:
+            return
+        self.target.acquire()
+        try:
+            self.target.stream.write('\n'.join(lines) + '\n')
+            self.target.stream.flush()
+            if self.max_bytes and isinstance(self.target,
+                                             RotatingFileHandler) and \
+                    self.target.stream.tell() >= self.max_bytes:
+                self.target.doRollover()
+        except Exception:
+            if batch:
+                self.handleError(batch[-1])
+        finally:
+            self.target.release()
+
+    def close(self):
+        """ write what is queued and stop the writer thread """
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(5)
+        self.target.close()
+        logging.Handler.close(self)
+
+
 class LOG:
     """
     Custom logger class that acts like logging.Logger
     The logger name is automatically generated by the module of the caller
 
+    Calls below the configured level return before the caller is looked
+    up, so pass arguments instead of formatting the message yourself.
+
     Usage:
         LOG.debug('My message: %s', debug_str)
         LOG('custom_name').debug('Another message')
     """
 
-    _custom_name = None
+    # name given to LOG(name), per thread
+    _custom = local()
     handler = None
     level = None
+    # (code object, line number) or custom name -> logger
+    _loggers = {}
 
     @classmethod
-    def init(cls):
+    def init(cls, process=None):
+        """
+        Set up logging from the system config, logging.processes.<process>
+        overrides the logging settings for that process.
+        """
         sys_config = '/etc/mycroft/mycroft.conf'
         config = load_commented_json(sys_config) if isfile(sys_config) else {}
-        cls.level = logging.getLevelName(config.get('log_level', 'DEBUG'))
+        log_config = dict(config.get('logging', {}))
+        log_config.update(log_config.pop('processes', {}).get(process, {}))
+        cls.level = logging.getLevelName(
+            log_config.get('log_level', config.get('log_level', 'DEBUG')))
         fmt = '%(asctime)s.%(msecs)03d - ' \
               '%(name)s - %(levelname)s - %(message)s'
         datefmt = '%H:%M:%S'
         formatter = logging.Formatter(fmt, datefmt)
-        cls.handler = logging.StreamHandler(sys.stdout)
+        if cls.handler:
+            # loggers of a previous init write to the old handler
+            for l in cls._loggers.values() + [logging.getLogger('')]:
+                l.removeHandler(cls.handler)
+            if isinstance(cls.handler, AsyncLogHandler):
+                cls.handler.close()
+        cls._loggers = {}
+        cls.handler = cls._create_handler(log_config)
         cls.handler.setFormatter(formatter)
         cls.create_logger('')  # Enables logging in external modules
 
-        def make_method(fn):
+        def make_method(fn, level):
             @classmethod
             def method(cls, *args, **kwargs):
+                if level < cls.level or \
+                        level <= logging.root.manager.disable:
+                    cls._custom.name = None
+                    return
                 cls._log(fn, *args, **kwargs)
 
             method.__func__.__doc__ = fn.__doc__
             return method
 
         # Copy actual logging methods from logging.Logger
-        for name in ['debug', 'info', 'warning', 'error', 'exception']:
-            setattr(cls, name, make_method(getattr(logging.Logger, name)))
+        for name, level in [('debug', logging.DEBUG),
+                            ('info', logging.INFO),
+                            ('warning', logging.WARNING),
+                            ('error', logging.ERROR),
+                            ('exception', logging.ERROR)]:
+            setattr(cls, name, make_method(getattr(logging.Logger, name),
+                                           level))
+
+    @staticmethod
+    def _create_handler(config):
+        filename = config.get('file')
+        if config.get('async'):
+            return AsyncLogHandler(filename,
+                                   config.get('queue_size', 10000),
+                                   config.get('batch_size', 100),
+                                   config.get('flush_interval', 0.2),
+                                   config.get('max_bytes', 0),
+                                   config.get('backup_count', 3))
+        if filename:
+            return RotatingFileHandler(filename,
+                                       maxBytes=config.get('max_bytes', 0),
+                                       backupCount=config.get('backup_count',
+                                                              3))
+        return logging.StreamHandler(sys.stdout)
 
     @classmethod
     def create_logger(cls, name):
@@ -76,31 +223,29 @@ class LOG:
         return l
 
     def __init__(self, name):
-        LOG._custom_name = name
+        LOG._custom.name = name
 
     @classmethod
     def _log(cls, func, *args, **kwargs):
-        if cls._custom_name is not None:
-            name = cls._custom_name
-            cls._custom_name = None
+        name = getattr(cls._custom, 'name', None)
+        if name is not None:
+            cls._custom.name = None
+            logger = cls._loggers.get(name)
+            if logger is None:
+                logger = cls._loggers[name] = cls.create_logger(name)
         else:
             # Stack:
             # [0] - _log()
             # [1] - debug(), info(), warning(), or error()
             # [2] - caller
-            stack = inspect.stack()
-
-            # Record:
-            # [0] - frame object
-            # [1] - filename
-            # [2] - line number
-            # [3] - function
-            # ...
-            record = stack[2]
-            mod = inspect.getmodule(record[0])
-            module_name = mod.__name__ if mod else ''
-            name = module_name + ':' + record[3] + ':' + str(record[2])
-        func(cls.create_logger(name), *args, **kwargs)
+            frame = sys._getframe(2)
+            key = (frame.f_code, frame.f_lineno)
+            logger = cls._loggers.get(key)
+            if logger is None:
+                name = frame.f_globals.get('__name__', '') + ':' + \
+                    frame.f_code.co_name + ':' + str(frame.f_lineno)
+                logger = cls._loggers[key] = cls.create_logger(name)
+        func(logger, *args, **kwargs)
 
 
 LOG.init()
@@ -0,0 +1,110 @@
+import mmap
+import os
+import struct
+import time
+
+from mycroft.util.log import LOG
+from mycroft.util.signal import get_ipc_directory
+
+# sequence number (odd while a level is written), energy, threshold
+MIC_LEVEL = struct.Struct('Qdd')
+# reads of a level being written before giving up, the writer may have died
+READ_RETRIES = 1000
+
+
+def get_mic_level_file():
+    """ the file in the IPC directory holding the microphone level """
+    return os.path.join(get_ipc_directory(), "mic_level.shm")
+
+
+def _map(path, create=False):
+    """ None if the file was not sized by the writer yet """
+    flags = os.O_RDWR | os.O_CREAT if create else os.O_RDONLY
+    fd = os.open(path, flags, 0666)
+    try:
+        if os.fstat(fd).st_size < MIC_LEVEL.size:
+            if not create:
+                return None
+            os.ftruncate(fd, MIC_LEVEL.size)
+        access = mmap.ACCESS_WRITE if create else mmap.ACCESS_READ
+        return mmap.mmap(fd, MIC_LEVEL.size, access=access)
+    finally:
+        os.close(fd)
+
+
+class MicLevelWriter(object):
+    """
+        Publishes the microphone energy level at most rate times a second.
+
+        The level is written to a file in the IPC directory mapped into
+        memory, readers map the same file. The sequence number is odd
+        while a level is written, readers retry instead of locking.
+        With an emitter the level is also emitted as a
+        recognizer_loop:mic_level event.
+    """
+    def __init__(self, path=None, rate=10, emitter=None):
+        self.path = path or get_mic_level_file()
+        self.interval = 1.0 / rate if rate else 0
+        self.emitter = emitter
+        self.next_report = 0
+        self.seq = 0
+        try:
+            self.map = _map(self.path, create=True)
+            self.seq = MIC_LEVEL.unpack_from(self.map)[0] & ~1
+        except (IOError, OSError, mmap.error) as e:
+            LOG.warning("Mic level not shared: " + str(e))
+            self.map = None
+
+    def report(self, energy, threshold):
+        now = time.time()
+        if now < self.next_report:
+            return
+        self.next_report = now + self.interval
+        if self.map:
+            self.map[:8] = struct.pack('Q', self.seq + 1)
+            MIC_LEVEL.pack_into(self.map, 0, self.seq + 1, energy, threshold)
+            self.seq += 2
+            self.map[:8] = struct.pack('Q', self.seq)
+        if self.emitter:
+            self.emitter.emit("recognizer_loop:mic_level",
+                              {"energy": energy, "threshold": threshold})
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+
+
+class MicLevelReader(object):
+    """ Reads the level published by MicLevelWriter, without locking. """
+    def __init__(self, path=None):
+        self.path = path or get_mic_level_file()
+        self.map = None
+
+    def read(self):
+        """
+            Returns:
+                tuple: (sequence number, energy, threshold), None if no
+                       level was published yet or it is still being written
+        """
+        if not self.map:
+            try:
+                self.map = _map(self.path)
+            except (IOError, OSError, mmap.error):
+                return None
+            if not self.map:
+                return None
+        for _ in range(READ_RETRIES):
+            seq, energy, threshold = MIC_LEVEL.unpack_from(self.map)
+            if seq & 1:
+                # being written
+                time.sleep(0)
+                continue
+            if struct.unpack_from('Q', self.map)[0] == seq:
+                return (seq, energy, threshold) if seq else None
+        return None
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
@@ -1,5 +1,11 @@
+import errno
+import fcntl
+import mmap
+import select
+import struct
 import tempfile
 import time
+from threading import Lock
 
 import os
 import os.path
@@ -7,6 +13,17 @@ import os.path
 import mycroft
 from mycroft.util.log import LOG
 
+# number of signals that can be in the table, further signals use files
+SIGNAL_SLOTS = 128
+# allocated slots, followed by the slots: name, time created (0: not set)
+SIGNAL_HEADER = struct.Struct('Q')
+SIGNAL_SLOT = struct.Struct('48sd')
+SIGNAL_STAMP = struct.Struct('d')
+SIGNAL_STAMP_OFFSET = SIGNAL_SLOT.size - SIGNAL_STAMP.size
+SIGNAL_TABLE_SIZE = SIGNAL_HEADER.size + SIGNAL_SLOTS * SIGNAL_SLOT.size
+# seconds between checks that the configuration or the table file changed
+SIGNAL_TABLE_CHECK = 1.0
+
 
 def get_ipc_directory(domain=None):
     """Get the directory used for Inter Process Communication
@@ -70,15 +87,301 @@ def create_file(filename):
         f.write('')
 
 
+class SignalTable(object):
+    """
+        Signals kept in a file in the IPC directory that every process maps
+        into memory, so checking a signal is a read from the mapping.
+
+        Slots are never freed, a process remembers the slot of every name
+        it has seen and only scans the table again when more slots were
+        allocated. Slots are allocated and single-use signals consumed
+        under an exclusive flock of the table file.
+
+        Every change wakes up the processes blocked in wait(), each of
+        them waits on its own fifo in the signal/waiters directory.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "signal.table")
+        self.waiters = os.path.join(directory, "signal", "waiters")
+        ensure_directory_exists(self.waiters)
+        self.lock = Lock()
+        # name -> slot offset
+        self.slots = {}
+        self.scanned = 0
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0666)
+        try:
+            # give everyone rights to r/w, like the IPC directory
+            os.fchmod(self.fd, 0666)
+        except OSError:
+            pass
+        try:
+            with self._locked():
+                if os.fstat(self.fd).st_size < SIGNAL_TABLE_SIZE:
+                    os.ftruncate(self.fd, SIGNAL_TABLE_SIZE)
+            self.inode = os.fstat(self.fd).st_ino
+            self.map = mmap.mmap(self.fd, SIGNAL_TABLE_SIZE)
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def _locked(self):
+        return _FileLock(self.lock, self.fd)
+
+    def valid(self, directory):
+        """ True if the table is the one in use in directory """
+        try:
+            return directory == self.directory and \
+                os.stat(self.path).st_ino == self.inode
+        except OSError:
+            return False
+
+    def _scan(self):
+        allocated = min(SIGNAL_HEADER.unpack_from(self.map, 0)[0],
+                        SIGNAL_SLOTS)
+        for i in range(self.scanned, allocated):
+            offset = SIGNAL_HEADER.size + i * SIGNAL_SLOT.size
+            name = SIGNAL_SLOT.unpack_from(self.map, offset)[0]
+            self.slots[name.rstrip('\0')] = offset
+        self.scanned = allocated
+
+    def _slot(self, name, allocate=False):
+        """ offset of the slot of name, None if it has none """
+        name = _encode(name)
+        offset = self.slots.get(name)
+        if offset is None and (allocate or self.scanned !=
+                               SIGNAL_HEADER.unpack_from(self.map, 0)[0]):
+            self._scan()
+            offset = self.slots.get(name)
+            if offset is None and allocate and self.scanned < SIGNAL_SLOTS:
+                offset = SIGNAL_HEADER.size + self.scanned * SIGNAL_SLOT.size
+                SIGNAL_SLOT.pack_into(self.map, offset, name, 0.0)
+                SIGNAL_HEADER.pack_into(self.map, 0, self.scanned + 1)
+                self._scan()
+        return offset
+
+    def fits(self, name):
+        """ True if name has or can get a slot """
+        encoded = _encode(name)
+        if len(encoded) > SIGNAL_SLOT.size - SIGNAL_STAMP.size or \
+                '\0' in encoded:
+            return False
+        return self._slot(name) is not None or self.scanned < SIGNAL_SLOTS
+
+    def stamp(self, name):
+        """
+            time signal name was created, 0 if it is not set, None if it
+            can not be in the table
+        """
+        offset = self.slots.get(name)
+        if offset is None:
+            if not self.fits(name):
+                return None
+            offset = self._slot(name)
+            if offset is None:
+                return 0
+        return SIGNAL_STAMP.unpack_from(self.map, offset +
+                                        SIGNAL_STAMP_OFFSET)[0]
+
+    def set(self, name, stamp=None):
+        """ set signal name, returns False if the table is full """
+        with self._locked():
+            offset = self._slot(name, allocate=True)
+            if offset is None:
+                return False
+            SIGNAL_STAMP.pack_into(self.map, offset + SIGNAL_STAMP_OFFSET,
+                                   stamp or time.time())
+        self.notify()
+        return True
+
+    def consume(self, name):
+        """ clear signal name, returns the time it was created or 0 """
+        offset = self._slot(name)
+        if offset is None:
+            return 0
+        with self._locked():
+            stamp = SIGNAL_STAMP.unpack_from(self.map, offset +
+                                             SIGNAL_STAMP_OFFSET)[0]
+            if stamp:
+                SIGNAL_STAMP.pack_into(self.map, offset + SIGNAL_STAMP_OFFSET,
+                                       0.0)
+        if stamp:
+            self.notify()
+        return stamp
+
+    def notify(self):
+        """ wake up the processes waiting for a change """
+        try:
+            waiters = os.listdir(self.waiters)
+        except OSError:
+            return
+        for waiter in waiters:
+            path = os.path.join(self.waiters, waiter)
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # nobody reads it, the waiter is gone
+                    _remove(path)
+                continue
+            try:
+                os.write(fd, 'x')
+            except OSError:
+                # the fifo is full, the waiter will wake up anyway
+                pass
+            finally:
+                os.close(fd)
+
+    def wait(self, check, timeout=None, poll=None):
+        """
+            Block until check() returns True, checking again whenever the
+            table changes, and every poll seconds if given. Returns False
+            if timeout seconds passed first.
+        """
+        if check():
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        # created under a temporary name so notify() never sees a fifo
+        # that is not open yet
+        temp = os.path.join(self.directory, ".waiter-%d-%d" % (
+            os.getpid(), id(check)))
+        _remove(temp)
+        os.mkfifo(temp, 0666)
+        read_fd = os.open(temp, os.O_RDONLY | os.O_NONBLOCK)
+        # keep a writer so the fifo never reads as closed
+        write_fd = os.open(temp, os.O_WRONLY | os.O_NONBLOCK)
+        path = os.path.join(self.waiters, os.path.basename(temp))
+        try:
+            os.rename(temp, path)
+            while not check():
+                remaining = poll
+                if deadline is not None:
+                    left = deadline - time.time()
+                    if left <= 0:
+                        return False
+                    remaining = left if poll is None else min(left, poll)
+                readable, _, _ = select.select([read_fd], [], [], remaining)
+                if readable:
+                    os.read(read_fd, 4096)
+            return True
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+            _remove(temp)
+            _remove(path)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+class _FileLock(object):
+    """ holds a thread lock and an exclusive flock of fd """
+    def __init__(self, lock, fd):
+        self.thread_lock = lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+def _encode(name):
+    if isinstance(name, unicode):
+        return name.encode('utf-8')
+    return name
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_signal_table = None
+_signal_files = True
+_signal_table_checked = 0
+# signal name -> last time its file was checked, see _signal_file_stamp
+_signal_files_checked = {}
+
+
+def get_signal_table(refresh=False):
+    """Get the signal table of the IPC directory
+
+    The configuration and the table file are checked again at most once a
+    second, a process picks up a table that was recreated.
+
+    Args:
+        refresh (bool): check the configuration and the table file now
+
+    Returns:
+        SignalTable: the table, None if signals only use files
+    """
+    global _signal_table, _signal_files, _signal_table_checked
+    now = time.time()
+    if not refresh and now - _signal_table_checked < SIGNAL_TABLE_CHECK:
+        return _signal_table
+    _signal_table_checked = now
+    config = mycroft.configuration.ConfigurationManager.instance().get(
+        "signals", {})
+    _signal_files = config.get("files", True)
+    directory = None
+    if config.get("table", True):
+        directory = get_ipc_directory()
+    if _signal_table and not _signal_table.valid(directory):
+        _signal_table.close()
+        _signal_table = None
+    if directory and not _signal_table:
+        try:
+            _signal_table = SignalTable(directory)
+        except (IOError, OSError, mmap.error) as e:
+            LOG.warning("Signal table unavailable, using files: " + str(e))
+    return _signal_table
+
+
+def _signal_path(signal_name):
+    return os.path.join(get_ipc_directory(), "signal", signal_name)
+
+
+def _signal_file_stamp(signal_name):
+    """
+        Time the file of a signal missing from the table was created, 0 if
+        there is none. Such files come from processes that could not map
+        the table and from scripts creating signal files, each signal is
+        checked at most once a second.
+    """
+    now = time.time()
+    if now - _signal_files_checked.get(signal_name, 0) < SIGNAL_TABLE_CHECK:
+        return 0
+    _signal_files_checked[signal_name] = now
+    try:
+        return os.path.getctime(_signal_path(signal_name))
+    except OSError:
+        return 0
+
+
 def create_signal(signal_name):
     """Create a named signal
 
+    The signal is set in the signal table and, unless signals.files is
+    disabled, also created as a file for processes reading the files.
+
     Args:
         signal_name (str): The signal's name.  Must only contain characters
             valid in filenames.
     """
+    table = get_signal_table(refresh=True)
     try:
-        path = os.path.join(get_ipc_directory(), "signal", signal_name)
+        if table and table.fits(signal_name):
+            if _signal_files:
+                create_file(_signal_path(signal_name))
+            return table.set(signal_name)
+        path = _signal_path(signal_name)
         create_file(path)
         return os.path.isfile(path)
     except IOError:
@@ -98,7 +401,36 @@ def check_for_signal(signal_name, sec_lifetime=0):
     Returns:
         bool: True if the signal is defined, False otherwise
     """
-    path = os.path.join(get_ipc_directory(), "signal", signal_name)
+    table = get_signal_table()
+    stamp = table.stamp(signal_name) if table else None
+    if stamp is not None:
+        if not stamp and _signal_files:
+            stamp = _signal_file_stamp(signal_name)
+            if stamp:
+                table.set(signal_name, stamp)
+        if not stamp:
+            return False
+        path = _signal_path(signal_name) if _signal_files else None
+        if path and not os.path.isfile(path):
+            # the signal file was removed, as files signals are cleared
+            table.consume(signal_name)
+            return False
+        if sec_lifetime == -1:
+            return True
+        if sec_lifetime == 0:
+            # consume this single-use signal, unless another process did
+            found = table.consume(signal_name) != 0
+        elif int(stamp + sec_lifetime) < int(time.time()):
+            # remove once expired
+            table.consume(signal_name)
+            found = False
+        else:
+            return True
+        if path:
+            _remove(path)
+        return found
+
+    path = _signal_path(signal_name)
     if os.path.isfile(path):
         if sec_lifetime == 0:
             # consume this single-use signal
@@ -113,3 +445,34 @@ def check_for_signal(signal_name, sec_lifetime=0):
 
     # No such signal exists
     return False
+
+
+def wait_for_signal(signal_name, present=True, timeout=None):
+    """Wait until a named signal exists, or until it no longer exists
+
+    Blocks on the signal table instead of polling, signal files created
+    without the table are seen within a second. Signals that are not in
+    the table are checked every 0.1 seconds.
+
+    Args:
+        signal_name (str): The signal's name.
+        present (bool): wait for the signal to exist (True) or for it to
+            be gone (False).  The signal is not consumed.
+        timeout (float, optional): seconds to wait at most, forever if None
+
+    Returns:
+        bool: False if the timeout passed first, True otherwise
+    """
+    def check():
+        return check_for_signal(signal_name, -1) == present
+
+    table = get_signal_table(refresh=True)
+    if table and table.fits(signal_name):
+        return table.wait(check, timeout,
+                          SIGNAL_TABLE_CHECK if _signal_files else None)
+    deadline = None if timeout is None else time.time() + timeout
+    while not check():
+        if deadline is not None and time.time() >= deadline:
+            return False
+        time.sleep(0.1)
+    return True
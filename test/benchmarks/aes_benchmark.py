@@ -0,0 +1,66 @@
+"""AES framing throughput between jarbas clients and the server
+
+Compares the original per message handling (base64 decode of the session
+key and iv, new CFB-8 cipher, pycrypto Random iv for the next message)
+with a cached AESSession in framing version 0 (same wire format) and
+version 1 (CTR).
+
+    python test/benchmarks/aes_benchmark.py [seconds]
+"""
+import base64
+import sys
+import time
+
+from Crypto import Random
+from Crypto.Cipher import AES
+
+from mycroft.client.server.aes import AESSession
+
+
+class LegacyAES(object):
+    """ what server and client did for every message before AESSession """
+    def __init__(self, key, iv):
+        self.key = base64.b64encode(key)
+        self.iv = base64.b64encode(iv)
+
+    def encrypt(self, data):
+        iv = base64.b64decode(self.iv)
+        key = base64.b64decode(self.key)
+        cipher = AES.new(key, AES.MODE_CFB, iv)
+        self.iv = base64.b64encode(Random.new().read(AES.block_size))
+        return iv + cipher.encrypt(data)
+
+    def decrypt(self, payload):
+        iv = base64.b64decode(self.iv)
+        key = base64.b64decode(self.key)
+        cipher = AES.new(key, AES.MODE_CFB, iv)
+        return cipher.decrypt(payload)[len(iv):]
+
+
+def messages_per_second(session, data, seconds):
+    count = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        if session.decrypt(session.encrypt(data)) != data:
+            raise AssertionError("roundtrip failed")
+        count += 1
+    return count / (time.time() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    key = AESSession.new_key()
+    sessions = [("legacy", LegacyAES(key, AESSession.new_iv())),
+                ("v0 cached", AESSession(key, 0)),
+                ("v1 ctr", AESSession(key, 1))]
+    for size in (1024, 64 * 1024):
+        data = Random.get_random_bytes(size)
+        print "%d KiB messages, encrypt + decrypt" % (size / 1024)
+        for name, session in sessions:
+            rate = messages_per_second(session, data, seconds)
+            print "  %-10s %10.1f msg/s %8.1f MiB/s" % (
+                name, rate, rate * size / (1024.0 * 1024))
+
+
+if __name__ == "__main__":
+    main()
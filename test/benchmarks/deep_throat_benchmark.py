@@ -0,0 +1,115 @@
+"""deep_throat on a paragraph, the list based synthesis against numpy
+
+Times text to phonemes, phonemes to samples and the wave file write of
+PARAGRAPH, with the rules matched and the samples built and written one at
+a time as before, and with deep_throat as it is:
+
+    python test/benchmarks/deep_throat_benchmark.py
+"""
+from __future__ import division
+
+import os
+import struct
+import tempfile
+import time
+import wave
+
+import datavision
+import shijian
+
+from jarbas_utils import deep_throat
+
+PARAGRAPH = (
+    "Hello, my name is Jarbas and I am an open source artificial "
+    "intelligence. I can tell you the weather, read the news, set alarms "
+    "and timers, play music and answer questions about almost anything. "
+    "Your privacy matters to me, so everything I hear stays on this device "
+    "unless you ask me to look something up on the internet. Yesterday it "
+    "rained for three hours, but tomorrow should be sunny with a high of "
+    "twenty five degrees."
+)
+
+
+def list_text_to_phonemes(text):
+    """ the rules rebuilt and applied one after the other """
+    result = " {text} ".format(
+        text=deep_throat.ensure_text_alphanumeric(text=text).upper())
+    for rule, phoneme, rule_text in \
+            deep_throat.rules_English_to_phonemes_regex:
+        result = deep_throat.match_and_replace(
+            text=result, rule=rule, phoneme=phoneme)
+    return result
+
+
+def list_phonemes_words_values(phonemes_words):
+    """ the samples resampled and extended phoneme by phoneme """
+    def phoneme_values(phoneme):
+        return shijian.change_list_resolution(
+            values=list(deep_throat.phonemes_dictionary[phoneme]),
+            length=2000)
+
+    values = []
+    for phonemes_string in phonemes_words.split(" "):
+        for phoneme in phonemes_string.split("-"):
+            if phoneme in deep_throat.phonemes_dictionary:
+                values.extend(phoneme_values(phoneme))
+        values.extend(phoneme_values("space"))
+    values.extend(phoneme_values("space"))
+    return shijian.change_waveform_to_rectangle_waveform(values=values)
+
+
+def list_save_values_to_wave_file(values, filename):
+    """ the samples packed and written one at a time """
+    values = datavision.normalize_to_range(values, minimum=-65535 / 2,
+                                           maximum=65535 / 2)
+    file_output = wave.open(filename, "w")
+    file_output.setnchannels(1)
+    file_output.setsampwidth(2)
+    file_output.setframerate(15300)
+    for value in values:
+        file_output.writeframesraw(struct.pack("<h", int(value)))
+    file_output.writeframes("")
+    file_output.close()
+
+
+def timed(function, *args, **kwargs):
+    start = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - start
+
+
+def main():
+    filename = tempfile.mktemp(suffix=".wav")
+    phonemes = deep_throat.text_to_phonemes(text=PARAGRAPH)
+    print "%d characters, %d phonemes" % (len(PARAGRAPH),
+                                          len(phonemes.split("-")))
+    print "  %-22s %10s %10s" % ("", "lists", "numpy")
+
+    _, list_time = timed(list_text_to_phonemes, PARAGRAPH)
+    _, numpy_time = timed(deep_throat.text_to_phonemes, text=PARAGRAPH)
+    print "  %-22s %8.4f s %8.4f s" % (
+        "text to phonemes", list_time, numpy_time)
+
+    list_values, list_time = timed(list_phonemes_words_values, phonemes)
+    values, numpy_time = timed(deep_throat.phonemes_words_values,
+                               phonemes_words=phonemes)
+    print "  %-22s %8.4f s %8.4f s" % (
+        "phonemes to samples", list_time, numpy_time)
+
+    _, list_time = timed(list_save_values_to_wave_file, list_values,
+                         filename)
+    with open(filename, "rb") as f:
+        list_wav = f.read()
+    _, numpy_time = timed(deep_throat.save_values_to_wave_file,
+                          values=values, filename=filename,
+                          sample_rate=15300)
+    with open(filename, "rb") as f:
+        numpy_wav = f.read()
+    os.remove(filename)
+    print "  %-22s %8.4f s %8.4f s" % (
+        "write wave file", list_time, numpy_time)
+    print "  same audio: %s" % (list_wav == numpy_wav)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Griffin-Lim of Tacotron output, librosa STFTs vs the numpy ones
+
+Inverts random linear spectrograms the length of SENTENCES frames, with
+the hparams of the model, through the librosa stft / istft the inversion
+used before and through audio._griffin_lim:
+
+    python test/benchmarks/griffin_lim_benchmark.py [iters]
+"""
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from jarbas_models.tf_tacotron.hparams import hparams
+from jarbas_models.tf_tacotron.util import audio
+
+# frames of 12.5 ms, 2 to 5 seconds sentences
+SENTENCES = [160, 240, 320, 400]
+
+
+def librosa_griffin_lim(S):
+    n_fft, hop_length, win_length = audio._stft_parameters()
+    angles = np.exp(2j * np.pi * np.random.rand(*S.shape))
+    S_complex = np.abs(S).astype(np.complex)
+    for i in range(hparams.griffin_lim_iters):
+        if i > 0:
+            angles = np.exp(1j * np.angle(audio._stft(y)))
+        y = librosa.istft(S_complex * angles, hop_length=hop_length,
+                          win_length=win_length)
+    return y
+
+
+def main():
+    if len(sys.argv) > 1:
+        hparams.griffin_lim_iters = int(sys.argv[1])
+    print "%d iterations" % hparams.griffin_lim_iters
+    print "  %-8s %10s %10s" % ("audio", "librosa", "numpy")
+    for frames in SENTENCES:
+        S = np.random.rand(hparams.num_freq, frames)
+        seconds = frames * hparams.frame_shift_ms / 1000.0
+        times = []
+        for griffin_lim in (librosa_griffin_lim, audio._griffin_lim):
+            start = time.time()
+            griffin_lim(S)
+            times.append(time.time() - start)
+        print "  %6.1f s %8.2f s %8.2f s" % ((seconds,) + tuple(times))
+
+
+if __name__ == "__main__":
+    main()
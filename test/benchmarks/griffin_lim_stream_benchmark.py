@@ -0,0 +1,65 @@
+"""Streaming Griffin-Lim of Tacotron output against the whole waveform
+
+Inverts the spectrograms of the bundled output samples, trimmed like the
+synthesizer does, with audio.inv_spectrogram and audio.inv_spectrogram_stream,
+timing the first audio and the whole sentence:
+
+    python test/benchmarks/griffin_lim_stream_benchmark.py [iters] [frames]
+"""
+import sys
+import time
+from glob import glob
+from os.path import basename, dirname, join
+
+import numpy as np
+
+from jarbas_models.tf_tacotron.hparams import hparams
+from jarbas_models.tf_tacotron.util import audio
+
+SAMPLES = join(dirname(audio.__file__), "..", "output_samples", "*.wav")
+
+
+def spectral_convergence(S, y):
+    """ distance of the magnitudes of y to S at the best gain, lower is
+    better """
+    S = audio._db_to_amp(audio._denormalize(S) + hparams.ref_level_db)
+    S_y = np.abs(audio._stft_frames(audio._preemphasis(y))).T[:, :S.shape[1]]
+    S_y *= np.sum(S_y * S) / np.sum(S_y * S_y)
+    return np.linalg.norm(S_y - S) / np.linalg.norm(S)
+
+
+def main():
+    iters = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    block_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    print "%d iterations, blocks of %d frames" % (
+        iters or hparams.griffin_lim_iters, block_frames)
+    print "  %-28s %7s %18s %18s" % ("sample", "audio", "whole first/total",
+                                     "stream first/total")
+    for path in sorted(glob(SAMPLES)):
+        S = audio.spectrogram(audio.load_wav(path)).astype(np.float32)
+        S = S[:, :audio.find_endpoint(S)]
+        seconds = S.shape[1] * hparams.frame_shift_ms / 1000.0
+
+        start = time.time()
+        whole = audio.inv_spectrogram(S, iters)
+        whole_time = time.time() - start
+
+        start = time.time()
+        chunks = []
+        for chunk in audio.inv_spectrogram_stream(S, iters, block_frames):
+            if not chunks:
+                first = time.time() - start
+            chunks.append(chunk)
+        stream_time = time.time() - start
+        streamed = np.concatenate(chunks) / 32767.0
+
+        print "  %-28s %5.1f s %8.2f /%6.2f s %8.2f /%6.2f s" % (
+            basename(path)[:28], seconds, whole_time, whole_time, first,
+            stream_time)
+        print "  %-28s %7s %18.3f %18.3f" % (
+            "  spectral convergence", "", spectral_convergence(S, whole),
+            spectral_convergence(S, streamed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Intent determination with and without the IntentIndex pre-filter
+
+Builds synthetic registries of 500 and 2000 Adapt intents (10 per fake
+skill, each requiring its own keyword plus one keyword shared by the
+skill, some with optional or one_of keywords) and times determine_intent
+for the same utterances against the full engine and against the view
+returned by IntentService.get_engine. Both must pick the same intent.
+
+    python test/benchmarks/intent_index_benchmark.py [utterances]
+"""
+import random
+import sys
+import time
+
+from adapt.intent import IntentBuilder
+
+from mycroft.messagebus.message import Message
+from mycroft.skills.intent_service import IntentService
+from mycroft.util.parse import normalize
+
+
+class MockEmitter(object):
+    def on(self, event, f):
+        pass
+
+    def emit(self, message):
+        pass
+
+
+def build_service(intents):
+    service = IntentService(MockEmitter())
+    words = []
+    for i in range(intents):
+        skill = i / 10
+        keyword = "Keyword%d" % i
+        word = "word%d" % i
+        service.handle_register_vocab(Message("register_vocab", {
+            "start": word, "end": keyword}))
+        service.handle_register_vocab(Message("register_vocab", {
+            "start": "skill%d" % skill, "end": "Skill%dKeyword" % skill}))
+        service.handle_register_vocab(Message("register_vocab", {
+            "start": "please", "end": "PoliteKeyword"}))
+        builder = IntentBuilder("%d:Intent%d" % (skill, i)) \
+            .require(keyword).require("Skill%dKeyword" % skill)
+        if i % 3 == 0:
+            builder.optionally("PoliteKeyword")
+        if i % 7 == 0:
+            builder.one_of("PoliteKeyword", keyword)
+        service.handle_register_intent(Message("register_intent",
+                                               builder.build().__dict__))
+        words.append((word, "skill%d" % skill))
+    return service, words
+
+
+def utterances(words, count):
+    random.seed(42)
+    result = []
+    for _ in range(count):
+        word, skill = random.choice(words)
+        noise = " ".join(random.choice(words)[0] for _ in range(2))
+        result.append("please %s %s %s" % (skill, word, noise))
+    # a few utterances nothing can handle
+    result += ["tell me a joke", "how are you"] * (count / 20)
+    return result
+
+
+def timed(engine_for, sentences):
+    intents = []
+    start = time.time()
+    for sentence in sentences:
+        normalized = normalize(sentence, "en-us")
+        try:
+            intent = next(engine_for(normalized).determine_intent(
+                normalized, 100))
+            intents.append(intent.get("intent_type"))
+        except StopIteration:
+            intents.append(None)
+    return (time.time() - start) / len(sentences), intents
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for intents in (500, 2000):
+        service, words = build_service(intents)
+        sentences = utterances(words, count)
+        full, expected = timed(lambda u: service.engine, sentences)
+        indexed, found = timed(service.get_engine, sentences)
+        if expected != found:
+            raise AssertionError("index changed the chosen intents")
+        candidates = sum(len(service.index.candidates(
+            normalize(s, "en-us"))) for s in sentences) / float(len(sentences))
+        print "%d intents, %d utterances, %.1f candidates per utterance" % (
+            intents, len(sentences), candidates)
+        print "  all parsers  %8.2f ms/utterance" % (full * 1000)
+        print "  indexed      %8.2f ms/utterance  (%.1fx)" % (
+            indexed * 1000, full / indexed)
+
+
+if __name__ == "__main__":
+    main()
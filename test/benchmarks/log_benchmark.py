@@ -0,0 +1,126 @@
+"""LOG calls per second, caller lookup with inspect.stack vs sys._getframe
+
+Times LOG.debug with DEBUG disabled (log_level INFO) and enabled, writing
+to /dev/null, for the current LOG and for the previous lookup that called
+inspect.stack() on every call, and a plain logging.Logger for reference.
+
+Then times the calls from 4 threads with the synchronous handler and with
+the AsyncLogHandler, as seen by the callers, writing to a log file and to
+a slow stdout (1 ms per write, like a busy terminal or journal pipe).
+
+    python test/benchmarks/log_benchmark.py [calls]
+"""
+import inspect
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from mycroft.util.log import LOG
+
+
+class StackLOG(LOG):
+    """ LOG resolving the caller with inspect.stack(), as it used to """
+    @classmethod
+    def debug(cls, *args, **kwargs):
+        cls._log(logging.Logger.debug, *args, **kwargs)
+
+    @classmethod
+    def _log(cls, func, *args, **kwargs):
+        record = inspect.stack()[2]
+        mod = inspect.getmodule(record[0])
+        module_name = mod.__name__ if mod else ''
+        name = module_name + ':' + record[3] + ':' + str(record[2])
+        func(cls.create_logger(name), *args, **kwargs)
+
+
+def timed(log, calls):
+    start = time.time()
+    for i in xrange(calls):
+        log.debug("benchmark message %d", i)
+    return calls / (time.time() - start)
+
+
+def threaded(log, calls, threads=4):
+    workers = [Thread(target=timed, args=(log, calls / threads))
+               for _ in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return calls / (time.time() - start)
+
+
+class SlowStream(object):
+    """ stdout that takes 1 ms per write """
+    def write(self, data):
+        time.sleep(0.001)
+
+    def flush(self):
+        pass
+
+
+def handlers(calls, slow=False):
+    temp = tempfile.mkdtemp()
+    stdout = sys.stdout
+    results = []
+    try:
+        for name, config in (("sync", {}),
+                             ("async", {"async": True,
+                                        "queue_size": calls})):
+            if slow:
+                sys.stdout = SlowStream()
+            else:
+                config["file"] = os.path.join(temp, name + ".log")
+            LOG.handler = LOG._create_handler(config)
+            LOG.level = logging.DEBUG
+            LOG._loggers = {}
+            results.append((name, threaded(LOG, calls),
+                            getattr(LOG.handler, "dropped", 0)))
+            for logger in LOG._loggers.values():
+                logger.removeHandler(LOG.handler)
+            LOG.handler.close()
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(temp)
+        LOG.init()
+    return results
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        LOG.init()
+        plain = LOG.create_logger("benchmark")
+        results = []
+        for level in (logging.INFO, logging.DEBUG):
+            LOG.level = level
+            plain.setLevel(level)
+            results.append((logging.getLevelName(level),
+                            timed(StackLOG, calls / 20),
+                            timed(LOG, calls),
+                            timed(plain, calls)))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        LOG.init()
+    print "%d calls of LOG.debug, calls/s" % calls
+    print "  %-12s %12s %12s %12s" % ("log_level", "inspect", "LOG",
+                                      "logging")
+    for level, stack, frame, plain in results:
+        print "  %-12s %12.0f %12.0f %12.0f" % (level, stack, frame, plain)
+    for target, slow, count in (("a log file", False, calls),
+                                ("a slow stdout", True, calls / 20)):
+        print "%d LOG.debug calls from 4 threads to %s" % (count, target)
+        for name, rate, dropped in handlers(count, slow):
+            print "  %-6s %10.0f calls/s  %d dropped" % (name, rate, dropped)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Round-trip benchmark for BusQuery against a local tornado messagebus
+
+Starts the messagebus service, answers "bench.query" with a BusResponder
+and measures request/reply latency and queries per second, first with the
+old 100 ms sleep-polling wait and then with the event driven dispatcher.
+
+    python test/benchmarks/messagebus_benchmark.py [queries] [threads]
+"""
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+from subprocess import Popen
+from threading import Thread
+
+from mycroft.messagebus.api import BusQuery, BusResponder
+from mycroft.messagebus.client.ws import WebsocketClient
+
+
+class PollingBusQuery(BusQuery):
+    """ BusQuery as it was before the dispatcher, sleep polling 100 ms """
+    def _wait_response(self, timeout):
+        start = time.time()
+        self.waiting = True
+        while self.waiting and time.time() - start < timeout:
+            time.sleep(0.1)
+        self.waiting = False
+
+
+def start_client():
+    client = WebsocketClient()
+    t = Thread(target=client.run_forever)
+    t.setDaemon(True)
+    t.start()
+    return client
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def run(query_class, emitter, queries, threads):
+    def query(i):
+        start = time.time()
+        q = query_class(emitter, "bench.query", {"n": i})
+        if q.send("bench.query.reply", timeout=5) is None:
+            return None
+        return time.time() - start
+
+    pool = ThreadPool(threads)
+    start = time.time()
+    latencies = pool.map(query, range(queries))
+    total = time.time() - start
+    pool.close()
+    answered = [l for l in latencies if l is not None]
+    print "%-16s answered %d/%d  p50 %6.1f ms  p99 %6.1f ms  %8.1f q/s" % (
+        query_class.__name__, len(answered), queries,
+        percentile(answered, 50) * 1000, percentile(answered, 99) * 1000,
+        len(answered) / total)
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    service = Popen(["python", "mycroft/messagebus/service/main.py"])
+    try:
+        time.sleep(5)
+        responder = start_client()
+        requester = start_client()
+        time.sleep(2)
+        BusResponder(responder, "bench.query.reply", {"ok": True}, None,
+                     ["bench.query"])
+        for query_class in (PollingBusQuery, BusQuery):
+            run(query_class, requester, queries, 1)
+            run(query_class, requester, queries, threads)
+        requester.close()
+        responder.close()
+    finally:
+        service.kill()
+
+
+if __name__ == "__main__":
+    main()
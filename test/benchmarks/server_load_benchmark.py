@@ -0,0 +1,175 @@
+"""Load test for the remote client server
+
+Runs MyServerFactory in process (plain ws, no ssl) next to a local
+messagebus, connects N simulated AES clients that go through the full
+pgp/aes handshake and then send utterances, and reports the
+utterance-to-reply latency seen by the clients.
+
+The skills side is simulated on the bus: user manager lookups, intent
+requests and utterances are answered immediately, so the numbers measure
+the server itself.
+
+    python test/benchmarks/server_load_benchmark.py [clients] [utterances]
+"""
+import base64
+import sys
+import time
+from subprocess import Popen
+from threading import Thread
+
+from Crypto.Cipher import AES
+from autobahn.twisted.websocket import WebSocketClientFactory, \
+    WebSocketClientProtocol
+from twisted.internet import reactor
+
+from mycroft.client.client.pgp import get_own_keys, encrypt_string, \
+    decrypt_string, generate_client_key, export_key, import_key_from_ascii
+from mycroft.client.server.main import MyServerFactory, MyServerProtocol
+from mycroft.messagebus.client.ws import WebsocketClient
+from mycroft.messagebus.message import Message
+
+PORT = 5679
+USER = "bench@Jarbas.ai"
+PASSWD = "benchmark"
+
+
+class SimulatedSkills(object):
+    """ answers what the skills process would, as fast as possible """
+    def __init__(self):
+        self.emitter = WebsocketClient()
+        self.emitter.on("user.from_sock.request", self.handle_user)
+        self.emitter.on("intent_request", self.handle_intent)
+        self.emitter.on("recognizer_loop:utterance", self.handle_utterance)
+        t = Thread(target=self.emitter.run_forever)
+        t.setDaemon(True)
+        t.start()
+
+    def handle_user(self, message):
+        sock = message.data["sock"]
+        self.emitter.emit(message.reply("user.from_sock.reply", {
+            "id": sock, "nicknames": ["bench " + sock],
+            "forbidden_skills": [], "forbidden_messages": [],
+            "forbidden_intents": []}))
+
+    def handle_intent(self, message):
+        self.emitter.emit(Message("intent_response", {
+            "skill_id": 1, "intent_name": "BenchIntent",
+            "utterance": message.data["utterance"]}, message.context))
+
+    def handle_utterance(self, message):
+        context = message.context or {}
+        self.emitter.emit(Message("speak", {
+            "utterance": message.data["utterances"][0]},
+            {"destinatary": context.get("source", "all")}))
+
+
+class BenchClientProtocol(WebSocketClientProtocol):
+    def onOpen(self):
+        self.status = "waiting server pgp"
+        self.aes_key = None
+        self.aes_iv = None
+        self.sent = 0
+        self.start = 0
+
+    def send_aes(self, message):
+        cipher = AES.new(self.aes_key, AES.MODE_CFB, self.aes_iv)
+        self.sendMessage(self.aes_iv + cipher.encrypt(message.serialize()),
+                         isBinary=True)
+
+    def send_utterance(self):
+        self.sent += 1
+        self.start = time.time()
+        self.send_aes(Message("recognizer_loop:utterance",
+                              {"utterances": ["benchmark " +
+                                              str(self.sent)]}))
+
+    def onMessage(self, payload, isBinary):
+        factory = self.factory
+        if isBinary:
+            cipher = AES.new(self.aes_key, AES.MODE_CFB, self.aes_iv)
+            message = Message.deserialize(
+                cipher.decrypt(payload)[len(self.aes_iv):])
+            if message.type != "speak":
+                return
+            factory.latencies.append(time.time() - self.start)
+            if self.sent < factory.utterances:
+                self.send_utterance()
+            else:
+                factory.client_done()
+        elif self.status == "waiting server pgp":
+            data = Message.deserialize(payload).data
+            fp = import_key_from_ascii(
+                data["public_key"]).results[0]["fingerprint"]
+            message = Message("client.pgp.public.response",
+                              {"public_key": factory.ascii_public,
+                               "names": ["bench"]})
+            self.sendMessage(str(encrypt_string(fp, message.serialize())))
+            self.status = "waiting server aes"
+        elif self.status == "waiting server aes":
+            data = Message.deserialize(
+                decrypt_string(str(payload), PASSWD).data).data
+            self.aes_iv = base64.b64decode(data["iv"])
+            self.aes_key = base64.b64decode(data["aes_key"])
+            self.send_aes(Message("client.aes.exchange.complete",
+                                  {"status": "success"}))
+            self.status = "connected"
+            reactor.callLater(0.5, self.send_utterance)
+
+
+class BenchClientFactory(WebSocketClientFactory):
+    protocol = BenchClientProtocol
+
+    def __init__(self, clients, utterances, *args, **kwargs):
+        super(BenchClientFactory, self).__init__(*args, **kwargs)
+        self.clients = clients
+        self.utterances = utterances
+        self.latencies = []
+        self.done = 0
+        if not encrypt_string(USER, "bench").ok:
+            generate_client_key(USER, PASSWD)
+        public, private = get_own_keys(USER)
+        self.ascii_public = export_key(public[0]["fingerprint"], save=False)
+
+    def client_done(self):
+        self.done += 1
+        if self.done == self.clients:
+            reactor.stop()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    utterances = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    service = Popen(["python", "mycroft/messagebus/service/main.py"])
+    try:
+        time.sleep(5)
+        SimulatedSkills()
+        address = u"ws://127.0.0.1:" + str(PORT)
+        server = MyServerFactory(address)
+        server.protocol = MyServerProtocol
+        reactor.listenTCP(PORT, server)
+        factory = BenchClientFactory(clients, utterances, address)
+        time.sleep(2)
+        start = time.time()
+        for _ in range(clients):
+            reactor.connectTCP("127.0.0.1", PORT, factory)
+        reactor.callLater(clients * utterances + 60, reactor.stop)
+        reactor.run()
+        total = time.time() - start
+        latencies = factory.latencies
+        print "%d clients, %d/%d replies in %.1f s" % (
+            clients, len(latencies), clients * utterances, total)
+        if latencies:
+            print "utterance to reply  p50 %.1f ms  p99 %.1f ms" % (
+                percentile(latencies, 50) * 1000,
+                percentile(latencies, 99) * 1000)
+    finally:
+        service.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Micro-benchmark of routing a reply to a client by socket number
+
+Compares the ClientIndex lookup used by the server with the linear scan
+over every connected peer it replaced, for 1k and 10k simulated clients.
+
+    python test/benchmarks/server_lookup_benchmark.py
+"""
+import random
+import timeit
+
+from mycroft.client.server.main import ClientIndex
+
+LOOKUPS = 10000
+
+
+def simulated_peers(count):
+    return ["tcp:10.0.%d.%d:%d" % (i // 250, i % 250, 20000 + i)
+            for i in range(count)]
+
+
+def scan(clients, sock_num):
+    """ lookup as handle_speak did it before the index """
+    for client in clients:
+        c, ip, sock = client.split(":")
+        if sock == sock_num:
+            return client
+
+
+def main():
+    for count in (1000, 10000):
+        peers = simulated_peers(count)
+        clients = dict((peer, {"object": None}) for peer in peers)
+        index = ClientIndex()
+        for peer in peers:
+            index.add(peer)
+        socks = [peer.split(":")[2] for peer in
+                 random.sample(peers, min(count, 1000))]
+
+        def lookup_scan():
+            for sock in socks:
+                scan(clients, sock)
+
+        def lookup_index():
+            for sock in socks:
+                clients.get(index.peer_from_sock(sock))
+
+        runs = max(1, LOOKUPS // len(socks))
+        for name, f in (("scan", lookup_scan), ("index", lookup_index)):
+            total = timeit.timeit(f, number=runs)
+            print "%6d clients  %-5s  %10.2f us/lookup" % (
+                count, name, total / (runs * len(socks)) * 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""check_for_signal per second, signal files vs the signal table
+
+Times check_for_signal('buttonPress') while the signal is not set, as the
+speech client does for every audio chunk, with signals as files only
+(signals.table false) and with the signal table, and how long
+wait_for_signal takes to return once another thread creates the signal.
+
+The IPC directory is a temporary directory.
+
+    python test/benchmarks/signal_benchmark.py [calls]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from mycroft.configuration import ConfigurationManager
+from mycroft.util import signal
+from mycroft.util.signal import check_for_signal, create_signal, \
+    wait_for_signal
+
+
+def configure(table):
+    config = ConfigurationManager.instance()
+    config["signals"] = {"table": table, "files": True}
+    signal.get_signal_table(refresh=True)
+
+
+def checks(calls):
+    start = time.time()
+    for _ in xrange(calls):
+        check_for_signal("buttonPress")
+    return calls / (time.time() - start)
+
+
+def wake_up(delay=0.25):
+    def create_later():
+        time.sleep(delay)
+        create_signal("buttonPress")
+    Thread(target=create_later).start()
+    start = time.time()
+    wait_for_signal("buttonPress")
+    check_for_signal("buttonPress")
+    return time.time() - start - delay
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    config = ConfigurationManager.instance()
+    ipc_path = config.get("ipc_path")
+    config["ipc_path"] = tempfile.mkdtemp()
+    try:
+        print "%d check_for_signal calls, signal not set" % calls
+        for name, table in (("files", False), ("table", True)):
+            configure(table)
+            print "  %-6s %10.0f checks/s  woken up %5.1f ms late" % (
+                name, checks(calls), wake_up() * 1000)
+    finally:
+        shutil.rmtree(config["ipc_path"])
+        config["ipc_path"] = ipc_path
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Idle CPU of the skill watcher
+
+Builds a synthetic skills directory (90 skills, some with large model
+directories) and measures the CPU time this process uses while nothing
+changes, for:
+
+    rescan    the old WatchSkills loop, os.walk of every skill every 2 s
+    polling   SkillsWatcher without pyinotify, same scan in one thread
+    inotify   SkillsWatcher with pyinotify
+
+    python test/benchmarks/skill_watcher_benchmark.py [seconds]
+"""
+import os
+import sys
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread, Event
+
+from mycroft.skills.watcher import SkillsWatcher, get_last_modified_date, \
+    pyinotify
+
+SKILLS = 90
+MODEL_SKILLS = 10
+MODEL_FILES = 500
+
+
+def build_tree():
+    directory = mkdtemp()
+    for i in range(SKILLS):
+        skill = os.path.join(directory, "skill_%d" % i)
+        for sub in ("vocab/en-us", "dialog/en-us", "regex/en-us"):
+            os.makedirs(os.path.join(skill, sub))
+            for j in range(5):
+                open(os.path.join(skill, sub, "file%d" % j), "w").close()
+        open(os.path.join(skill, "__init__.py"), "w").close()
+        if i < MODEL_SKILLS:
+            for j in range(MODEL_FILES):
+                model = os.path.join(skill, "models", "part%d" % (j / 50))
+                if not os.path.isdir(model):
+                    os.makedirs(model)
+                open(os.path.join(model, "w%d" % j), "w").close()
+    return directory
+
+
+def rescan(directory, stop):
+    """ what WatchSkills.run did every 2 seconds """
+    while not stop.is_set():
+        for folder in os.listdir(directory):
+            path = os.path.join(directory, folder)
+            if os.path.isdir(path) and "__init__.py" in os.listdir(path):
+                get_last_modified_date(path)
+        time.sleep(2)
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def measure(name, start, stop, seconds):
+    before = cpu_time()
+    start()
+    time.sleep(seconds)
+    stop()
+    used = cpu_time() - before
+    print "  %-8s %7.3f s cpu in %d s  (%.2f%%)" % (
+        name, used, seconds, 100.0 * used / seconds)
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    directory = build_tree()
+    try:
+        print "%d skills, %d with %d model files, idle for %d s" % (
+            SKILLS, MODEL_SKILLS, MODEL_FILES, seconds)
+        stop_event = Event()
+        thread = Thread(target=rescan, args=(directory, stop_event))
+        thread.daemon = True
+        measure("rescan", thread.start, stop_event.set, seconds)
+
+        modes = [False] + ([True] if pyinotify else [])
+        for use_inotify in modes:
+            watcher = SkillsWatcher(directory, use_inotify=use_inotify)
+            waiter = Thread(target=watcher.wait)
+            waiter.daemon = True
+
+            def start():
+                watcher.start()
+                waiter.start()
+            measure(watcher.mode, start, watcher.stop, seconds)
+    finally:
+        rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
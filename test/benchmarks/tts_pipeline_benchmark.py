@@ -0,0 +1,117 @@
+"""Time to first audio and gaps between sentences, sequential vs pipelined TTS
+
+Speaks an utterance of 8 sentences with an engine taking SYNTH seconds to
+synthesize a sentence and PLAY seconds to play it (sleeps, nothing is
+played), as handle_speak used to (execute per sentence) and through a
+TTSPipeline with 1 and 2 workers. Reported from the PlaybackThread:
+
+    first audio   seconds from the speak request to the first sentence
+    gaps          silence between sentences, mean and max
+    total         seconds until the last sentence finished playing
+
+    python test/benchmarks/tts_pipeline_benchmark.py [synth] [play]
+"""
+import logging
+import sys
+import time
+
+import mycroft.tts
+from mycroft.tts import TTS, TTSPipeline, TTSValidator
+
+SENTENCES = 8
+
+
+class Validator(TTSValidator):
+    def validate_lang(self):
+        pass
+
+    def validate_connection(self):
+        pass
+
+    def get_tts_class(self):
+        return TTS
+
+
+class Emitter(object):
+    def emit(self, message):
+        pass
+
+
+class Playing(object):
+    """ a play_wav process taking PLAY seconds """
+    def __init__(self, duration):
+        self.duration = duration
+
+    def communicate(self):
+        time.sleep(self.duration)
+
+    def wait(self):
+        pass
+
+
+class SleepTTS(TTS):
+    def __init__(self, synth):
+        super(SleepTTS, self).__init__('en-us', {}, Validator(self))
+        self.type = 'wav'
+        self.synth = synth
+        self.ws = Emitter()
+        self.playback.init(self)
+        self.playback.enclosure = None
+
+    def synthesize(self, sentence):
+        time.sleep(self.synth)
+        return self.type, sentence, None
+
+
+def wait_played(tts):
+    while not tts.queue.empty() or tts.playback._processing_queue:
+        time.sleep(0.005)
+
+
+def sequential(tts, sentences):
+    start = time.time()
+    tts.playback.begin_utterance(start)
+    for sentence in sentences:
+        tts.execute(sentence)
+
+
+def pipelined(workers):
+    def speak(tts, sentences):
+        pipeline = TTSPipeline(tts, workers, look_ahead=2)
+        pipeline.speak(sentences, time.time())
+        pipeline.shutdown()
+    return speak
+
+
+def run(speak, synth, play):
+    mycroft.tts.play_wav = lambda uri: Playing(play)
+    tts = SleepTTS(synth)
+    sentences = ["sentence %d" % i for i in range(SENTENCES)]
+    start = time.time()
+    speak(tts, sentences)
+    wait_played(tts)
+    total = time.time() - start
+    tts.playback.stop()
+    tts.playback.join()
+    gaps = list(tts.playback.gaps)
+    return tts.playback.first_audio[-1], sum(gaps) / len(gaps), max(gaps), \
+        total
+
+
+def main():
+    synth = float(sys.argv[1]) if len(sys.argv) > 1 else 0.4
+    play = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    logging.disable(logging.DEBUG)
+    print "%d sentences, %.2f s to synthesize, %.2f s to play each" % (
+        SENTENCES, synth, play)
+    print "  %-12s %12s %10s %10s %8s" % ("", "first audio", "mean gap",
+                                          "max gap", "total")
+    for name, speak in (("sequential", sequential),
+                        ("1 worker", pipelined(1)),
+                        ("2 workers", pipelined(2))):
+        print "  %-12s %10.3f s %8.3f s %8.3f s %6.2f s" % (
+            (name,) + run(speak, synth, play))
+
+
+if __name__ == "__main__":
+    main()
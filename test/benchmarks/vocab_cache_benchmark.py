@@ -0,0 +1,146 @@
+"""Skill vocabulary registration at startup, per entry vs batched and cached
+
+Registers the en-us vocab and regex folders of every skill in the bundled
+jarbas_skills tree three ways and reports the time spent reading the
+files, going through the bus (serializing and deserializing messages) and
+registering in a fresh IntentService:
+
+    per entry   load_vocabulary/load_regex, one register_vocab per entry
+    batch cold  one register_vocab_batch per skill, empty vocab cache
+    batch warm  one register_vocab_batch per skill, cache from the last run
+
+The vocab cache is kept in a temporary HOME so ~/.mycroft is not touched.
+
+    python test/benchmarks/vocab_cache_benchmark.py [rounds]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from os.path import exists, join
+
+HOME = tempfile.mkdtemp()
+os.environ["HOME"] = HOME
+
+# All of the nopep8 comments below are to avoid E402 errors, HOME is set
+# before mycroft is imported
+from mycroft import MYCROFT_ROOT_PATH                       # nopep8
+from mycroft.messagebus.message import Message              # nopep8
+from mycroft.skills import core                             # nopep8
+from mycroft.skills.core import load_regex, load_vocabulary, \
+    read_regex, read_vocabulary                             # nopep8
+from mycroft.skills.intent_service import IntentService     # nopep8
+from mycroft.skills.vocab_cache import VocabCache           # nopep8
+
+SKILLS_DIR = join(MYCROFT_ROOT_PATH, "jarbas_skills")
+LANG = "en-us"
+
+
+class MockEmitter(object):
+    def on(self, event, f):
+        pass
+
+    def emit(self, message):
+        pass
+
+
+class CollectingEmitter(object):
+    def __init__(self):
+        self.messages = []
+
+    def emit(self, message):
+        self.messages.append(message)
+
+
+def skill_folders():
+    folders = []
+    for skill in sorted(os.listdir(SKILLS_DIR)):
+        vocab = join(SKILLS_DIR, skill, "vocab", LANG)
+        regex = join(SKILLS_DIR, skill, "regex", LANG)
+        if exists(vocab) or exists(regex):
+            folders.append((vocab if exists(vocab) else None,
+                            regex if exists(regex) else None))
+    return folders
+
+
+def per_entry(folders):
+    emitter = CollectingEmitter()
+    start = time.time()
+    for vocab, regex in folders:
+        if vocab:
+            load_vocabulary(vocab, emitter)
+        if regex:
+            load_regex(regex, emitter)
+    return time.time() - start, emitter.messages
+
+
+def batched(folders):
+    emitter = CollectingEmitter()
+    start = time.time()
+    for vocab, regex in folders:
+        entries = read_vocabulary(vocab) if vocab else []
+        if regex:
+            entries += read_regex(regex)
+        emitter.emit(Message("register_vocab_batch", {"vocab": entries}))
+    return time.time() - start, emitter.messages
+
+
+def deliver(messages):
+    """ returns bus and register seconds and the bytes sent """
+    service = IntentService(MockEmitter())
+    start = time.time()
+    sent = [message.serialize() for message in messages]
+    received = [Message.deserialize(data) for data in sent]
+    bus = time.time() - start
+    start = time.time()
+    for message in received:
+        if message.type == "register_vocab_batch":
+            service.handle_register_vocab_batch(message)
+        else:
+            service.handle_register_vocab(message)
+    return bus, time.time() - start, sum(len(data) for data in sent)
+
+
+def report(name, results):
+    read = sum(r[0] for r in results) / len(results)
+    bus = sum(r[1] for r in results) / len(results)
+    register = sum(r[2] for r in results) / len(results)
+    messages, size = results[0][3], results[0][4]
+    print "  %-11s %6d msgs %8.1f KiB  read %7.1f ms  bus %7.1f ms  " \
+          "register %7.1f ms  total %7.1f ms" % (
+              name, messages, size / 1024.0, read * 1000, bus * 1000,
+              register * 1000, (read + bus + register) * 1000)
+
+
+def run(method, folders):
+    read, messages = method(folders)
+    bus, register, size = deliver(messages)
+    return read, bus, register, len(messages), size
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    folders = skill_folders()
+    print "%d skills with %s vocab or regex, %d rounds" % (
+        len(folders), LANG, rounds)
+    try:
+        report("per entry", [run(per_entry, folders)
+                             for _ in range(rounds)])
+        cold = []
+        for _ in range(rounds):
+            shutil.rmtree(join(HOME, ".mycroft", "vocab_cache"), True)
+            core.vocab_cache = VocabCache()
+            cold.append(run(batched, folders))
+        report("batch cold", cold)
+        warm = []
+        for _ in range(rounds):
+            core.vocab_cache = VocabCache()
+            warm.append(run(batched, folders))
+        report("batch warm", warm)
+    finally:
+        shutil.rmtree(HOME, True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""CPU time of the wake word loop, pre-roll kept in a string vs a ring buffer
+
+Replays test/unittests/client/data/weather_mycroft.wav in 1024 sample
+chunks, as the microphone delivers them, and reports CPU milliseconds per
+minute of audio:
+
+    pre-roll    keeping the wake word audio and building the tested audio
+                every SEC_BETWEEN_WW_CHECKS, as the loop used to (string
+                slicing and concatenation) and with CyclicAudioBuffer
+    phrase      recording a 10 second phrase, str += chunk vs a chunk list
+    loop        ResponsiveRecognizer._wait_until_wake_word with a wake word
+                engine that never fires
+
+The pre-roll is timed for 1 second (TEST_WW_SEC) and 10 seconds (kept for
+wake word upload).
+
+    python test/benchmarks/wake_word_buffer_benchmark.py [minutes]
+"""
+import sys
+import time
+import wave
+from os.path import dirname, join
+
+from speech_recognition import AudioSource
+
+from mycroft.client.speech.mic import CyclicAudioBuffer, ResponsiveRecognizer
+
+WAV = join(dirname(__file__), "..", "unittests", "client", "data",
+           "weather_mycroft.wav")
+CHUNK = 1024
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+SEC_PER_BUFFER = float(CHUNK) / SAMPLE_RATE
+BUFFERS_PER_CHECK = ResponsiveRecognizer.SEC_BETWEEN_WW_CHECKS / \
+    SEC_PER_BUFFER
+TEST_SIZE = 1 * SAMPLE_RATE * SAMPLE_WIDTH
+SILENCE = '\0' * int(ResponsiveRecognizer.SILENCE_SEC * SAMPLE_RATE *
+                     SAMPLE_WIDTH)
+
+
+def load_chunks(minutes):
+    w = wave.open(WAV)
+    data = w.readframes(w.getnframes())
+    w.close()
+    size = CHUNK * SAMPLE_WIDTH
+    chunks = [data[i:i + size] for i in range(0, len(data) - size + 1, size)]
+    count = int(minutes * 60 / SEC_PER_BUFFER)
+    return (chunks * (count / len(chunks) + 1))[:count]
+
+
+def string_pre_roll(chunks, max_size):
+    byte_data = SILENCE
+    since_check = 0.0
+    for chunk in chunks:
+        if len(byte_data) < max_size:
+            byte_data += chunk
+        else:
+            byte_data = byte_data[len(chunk):] + chunk
+        since_check += 1.0
+        if since_check > BUFFERS_PER_CHECK:
+            since_check -= BUFFERS_PER_CHECK
+            chopped = byte_data[-TEST_SIZE:] \
+                if TEST_SIZE < len(byte_data) else byte_data
+            chopped + SILENCE
+
+
+def ring_pre_roll(chunks, max_size):
+    audio_buffer = CyclicAudioBuffer(max_size + CHUNK * SAMPLE_WIDTH,
+                                     SILENCE)
+    test_data = bytearray(TEST_SIZE + len(SILENCE))
+    since_check = 0.0
+    for chunk in chunks:
+        audio_buffer.append(chunk)
+        since_check += 1.0
+        if since_check > BUFFERS_PER_CHECK:
+            since_check -= BUFFERS_PER_CHECK
+            audio_buffer.copy_last(TEST_SIZE, test_data)
+            bytes(test_data)
+
+
+def string_phrase(chunks):
+    byte_data = '\0' * SAMPLE_WIDTH
+    for chunk in chunks:
+        byte_data += chunk
+    return byte_data
+
+
+def list_phrase(chunks):
+    parts = ['\0' * SAMPLE_WIDTH]
+    for chunk in chunks:
+        parts.append(chunk)
+    return b''.join(parts)
+
+
+class ReplayStream(object):
+    def __init__(self, chunks, recognizer):
+        self.chunks = iter(chunks)
+        self.recognizer = recognizer
+
+    def read(self, size):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            self.recognizer.stop()
+            return '\0' * CHUNK * SAMPLE_WIDTH
+
+
+class ReplaySource(AudioSource):
+    def __init__(self, stream):
+        self.stream = stream
+        self.CHUNK = CHUNK
+        self.SAMPLE_RATE = SAMPLE_RATE
+        self.SAMPLE_WIDTH = SAMPLE_WIDTH
+
+
+class NeverWakeWord(object):
+    num_phonemes = 10
+
+    def found_wake_word(self, frame_data):
+        return False
+
+
+def wake_word_loop(chunks):
+    recognizer = ResponsiveRecognizer(NeverWakeWord())
+    recognizer.save_wake_words = False
+    source = ReplaySource(ReplayStream(chunks, recognizer))
+    recognizer._wait_until_wake_word(source, SEC_PER_BUFFER, None)
+
+
+def cpu_ms_per_minute(f, minutes, *args):
+    start = time.clock()
+    f(*args)
+    return (time.clock() - start) * 1000 / minutes
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    chunks = load_chunks(minutes)
+    print "%.1f minutes of audio in %d chunks, CPU ms per minute of audio" % (
+        minutes, len(chunks))
+    for seconds in (1, 10):
+        max_size = seconds * SAMPLE_RATE * SAMPLE_WIDTH
+        print "  pre-roll %2d s  string %8.1f  ring %8.1f" % (
+            seconds, cpu_ms_per_minute(string_pre_roll, minutes, chunks,
+                                       max_size),
+            cpu_ms_per_minute(ring_pre_roll, minutes, chunks, max_size))
+    phrase = chunks[:int(10 / SEC_PER_BUFFER)]
+    print "  phrase 10 s   string %8.3f  list %8.3f  (ms per phrase)" % (
+        cpu_ms_per_minute(string_phrase, 1, phrase),
+        cpu_ms_per_minute(list_phrase, 1, phrase))
+    print "  loop          %8.1f" % cpu_ms_per_minute(wake_word_loop, minutes,
+                                                      chunks)
+
+
+if __name__ == "__main__":
+    main()
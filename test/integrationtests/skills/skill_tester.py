@@ -68,6 +68,7 @@ class RegistrationOnlyEmitter(object):
             if event in [
                 'register_intent',
                 'register_vocab',
+                'register_vocab_batch',
                 'recognizer_loop:utterance'
             ]:
                 print "Event: " + str(event)
@@ -0,0 +1,53 @@
+import base64
+import unittest
+
+from Crypto.Cipher import AES
+
+from mycroft.client.server.aes import AESSession
+from mycroft.messagebus.message import Message
+
+
+class AESSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.key = AESSession.new_key()
+        self.message = Message("speak", {"utterance": "hello " * 300},
+                               {"destinatary": "all"}).serialize()
+
+    def test_roundtrip(self):
+        for version in (0, 1):
+            session = AESSession(self.key, version)
+            payload = session.encrypt(self.message)
+            self.assertEqual(session.decrypt(payload), self.message)
+
+    def test_fresh_iv_per_frame(self):
+        session = AESSession(self.key, 1)
+        self.assertNotEqual(session.encrypt(self.message),
+                            session.encrypt(self.message))
+
+    def test_version_0_readable_by_old_peers(self):
+        # old peers decrypt with whatever iv they hold and drop the
+        # first block, CFB resynchronises after it
+        payload = AESSession(self.key).encrypt(self.message)
+        stale_iv = AESSession.new_iv()
+        cipher = AES.new(self.key, AES.MODE_CFB, stale_iv)
+        self.assertEqual(cipher.decrypt(payload)[len(stale_iv):],
+                         self.message)
+
+    def test_old_peer_frames_readable(self):
+        iv = AESSession.new_iv()
+        payload = iv + AES.new(self.key, AES.MODE_CFB, iv).encrypt(
+            self.message)
+        self.assertEqual(AESSession(self.key).decrypt(payload),
+                         self.message)
+
+    def test_version_mismatch(self):
+        iv = "\x00" * AES.block_size
+        payload = iv + AES.new(self.key, AES.MODE_CFB, iv).encrypt(
+            self.message)
+        session = AESSession(self.key, 1)
+        self.assertRaises(ValueError, session.decrypt, payload)
+        self.assertRaises(ValueError, session.set_version, 2)
+
+    def test_from_b64(self):
+        session = AESSession.from_b64(base64.b64encode(self.key))
+        self.assertEqual(session.key, self.key)
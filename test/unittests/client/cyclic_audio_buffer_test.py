@@ -0,0 +1,86 @@
+import unittest
+
+from speech_recognition import AudioSource
+
+from mycroft.client.speech.mic import CyclicAudioBuffer, ResponsiveRecognizer
+
+
+class MockStream(object):
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, chunk_size):
+        return self.chunks.pop(0)
+
+
+class MockSource(AudioSource):
+    def __init__(self, chunks):
+        self.stream = MockStream(chunks)
+        self.CHUNK = 1024
+        self.SAMPLE_RATE = 16000
+        self.SAMPLE_WIDTH = 2
+
+
+class MockWakeWord(object):
+    """ records the audio tested, finds the wake word on the nth test """
+    num_phonemes = 10
+
+    def __init__(self, found_on):
+        self.found_on = found_on
+        self.tested = []
+
+    def found_wake_word(self, frame_data):
+        self.tested.append(frame_data)
+        return len(self.tested) == self.found_on
+
+
+class CyclicAudioBufferTest(unittest.TestCase):
+    def test_fill_and_wrap(self):
+        buf = CyclicAudioBuffer(8, b'ab')
+        self.assertEqual(buf.get(), b'ab')
+        buf.append(b'cdef')
+        self.assertEqual(buf.get(), b'abcdef')
+        buf.append(b'ghij')
+        self.assertEqual(len(buf), 8)
+        self.assertEqual(buf.get(), b'cdefghij')
+        self.assertEqual(buf.get_last(3), b'hij')
+        self.assertEqual(buf.get_last(20), b'cdefghij')
+
+    def test_append_larger_than_buffer(self):
+        buf = CyclicAudioBuffer(4, b'ab')
+        buf.append(b'0123456789')
+        self.assertEqual(buf.get(), b'6789')
+        buf.append(b'x')
+        self.assertEqual(buf.get(), b'789x')
+
+    def test_copy_last(self):
+        buf = CyclicAudioBuffer(6, b'abcde')
+        buf.append(b'fgh')
+        target = bytearray(b'......')
+        self.assertEqual(buf.copy_last(4, target), 4)
+        self.assertEqual(target, bytearray(b'efgh..'))
+
+
+class WakeWordBufferTest(unittest.TestCase):
+    def test_tested_audio(self):
+        chunks = [chr(i) * 2048 for i in range(1, 60)]
+        wake_word = MockWakeWord(found_on=8)
+        recognizer = ResponsiveRecognizer(wake_word)
+        recognizer.config = {}
+        recognizer.save_wake_words = False
+        recognizer._wait_until_wake_word(MockSource(chunks), 0.064, None)
+
+        # the last TEST_WW_SEC of audio, followed by silence
+        silence = b'\0' * 320
+        test_size = 32000
+        expected = []
+        for i in range(len(wake_word.tested)):
+            # a check every 0.2 / 0.064 chunks
+            consumed = int((i + 1) * 0.2 / 0.064) + 1
+            audio = silence + b''.join(chunks[:consumed])
+            expected.append(audio[-test_size:] + silence)
+        self.assertEqual(wake_word.tested, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
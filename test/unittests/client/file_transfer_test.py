@@ -0,0 +1,65 @@
+import os
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from Crypto import Random
+
+from mycroft.client.server.file_transfer import FileSender, FileTransfer, \
+    parse_chunk_frame, negotiate_chunk_size, safe_extension, \
+    MAX_CHUNK_SIZE, MIN_CHUNK_SIZE
+
+
+class FileTransferTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.key = Random.get_random_bytes(32)
+        self.source = os.path.join(self.dir, "source.jpg")
+        with open(self.source, "wb") as f:
+            f.write(Random.get_random_bytes(300000))
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    def transfer(self, sender, chunk_size=65536):
+        path = os.path.join(self.dir, "received.jpg")
+        receiver = FileTransfer(sender.transfer_id, self.key, sender.iv,
+                                path, sender.size, chunk_size)
+        for frame in sender.frames(chunk_size):
+            transfer_id, chunk = parse_chunk_frame(frame)
+            self.assertEqual(transfer_id, sender.transfer_id)
+            receiver.write(chunk)
+        return receiver, path
+
+    def test_transfer(self):
+        sender = FileSender(self.key, self.source)
+        receiver, path = self.transfer(sender)
+        self.assertTrue(receiver.finish(sender.hexdigest()))
+        with open(path, "rb") as received, open(self.source, "rb") as sent:
+            self.assertEqual(received.read(), sent.read())
+
+    def test_corrupted_transfer(self):
+        sender = FileSender(self.key, self.source)
+        receiver, path = self.transfer(sender, 4096)
+        self.assertFalse(receiver.finish("0" * 64))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(receiver.temp_path))
+
+    def test_not_a_chunk(self):
+        self.assertEqual(parse_chunk_frame(Random.get_random_bytes(64)),
+                         (None, None))
+
+    def test_negotiate_chunk_size(self):
+        self.assertEqual(negotiate_chunk_size(10 ** 9), MAX_CHUNK_SIZE)
+        self.assertEqual(negotiate_chunk_size(1), MIN_CHUNK_SIZE)
+        self.assertEqual(negotiate_chunk_size(8192), 8192)
+        self.assertEqual(negotiate_chunk_size("fast", 8192), 8192)
+
+    def test_safe_extension(self):
+        self.assertEqual(safe_extension(".jpg"), ".jpg")
+        self.assertEqual(safe_extension("../../etc/passwd"), ".etcpasswd")
+        self.assertEqual(safe_extension(""), ".bin")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from threading import Thread
+
+from pyee import EventEmitter
+
+from mycroft.messagebus.api import BusQuery, BusResponder, \
+    BusQueryDispatcher
+from mycroft.messagebus.message import Message
+
+
+class MockEmitter(EventEmitter):
+    """ loops emitted messages straight back to listeners """
+    def emit(self, message, *args):
+        if isinstance(message, Message):
+            Thread(target=EventEmitter.emit,
+                   args=(self, message.type, message)).start()
+        else:
+            EventEmitter.emit(self, message, *args)
+
+
+class TestBusQuery(unittest.TestCase):
+    def setUp(self):
+        self.emitter = MockEmitter()
+
+    def test_response(self):
+        BusResponder(self.emitter, "test.reply", {"answer": 42}, None,
+                     ["test"])
+        query = BusQuery(self.emitter, "test", {"question": "?"})
+        self.assertEqual(query.send(timeout=5), {"answer": 42})
+        self.assertEqual(query.get_response_type(), "test.reply")
+        self.assertEqual(query.get_response_context()["query_id"],
+                         query.query_id)
+
+    def test_timeout(self):
+        query = BusQuery(self.emitter, "test")
+        self.assertIsNone(query.send(timeout=0.1))
+        # timed out queries do not leave listeners behind
+        self.assertEqual(self.emitter.listeners("test.reply"), [])
+        dispatcher = BusQueryDispatcher.get(self.emitter)
+        self.assertEqual(dispatcher.in_flight(), 0)
+
+    def test_concurrent_queries(self):
+        def answer(message):
+            number = message.data["number"]
+            self.emitter.emit(message.reply("square.reply",
+                                            {"number": number * number}))
+        self.emitter.on("square", answer)
+
+        results = {}
+
+        def ask(number):
+            query = BusQuery(self.emitter, "square", {"number": number})
+            results[number] = query.send(timeout=5)["number"]
+
+        threads = [Thread(target=ask, args=(n,)) for n in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, dict((n, n * n) for n in range(20)))
+
+    def test_reply_without_query_id(self):
+        self.emitter.on("test", lambda m: self.emitter.emit(
+            Message("test.reply", {"answer": True})))
+        query = BusQuery(self.emitter, "test")
+        self.assertEqual(query.send(timeout=5), {"answer": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
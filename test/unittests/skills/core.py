@@ -13,6 +13,7 @@ from mycroft.messagebus.message import Message
 from mycroft.skills.core import load_regex_from_file, load_regex, \
     load_vocab_from_file, load_vocabulary, MycroftSkill, \
     load_skill, create_skill_descriptor, open_intent_envelope
+from mycroft.skills.vocab_cache import VocabCache
 
 __author__ = 'eward'
 
@@ -179,6 +180,18 @@ class MycroftSkillTest(unittest.TestCase):
         unpacked_intent = open_intent_envelope(m)
         self.assertEqual(intent.__dict__, unpacked_intent.__dict__)
 
+    @mock.patch('mycroft.skills.core.vocab_cache', VocabCache(False))
+    def test_load_vocab_files_batch(self):
+        s = TestSkill1()
+        s.bind(self.emitter)
+        self.emitter.reset()
+        s.load_vocab_files(join(self.vocab_path, 'valid'))
+        self.assertEquals(self.emitter.get_types(), ['register_vocab_batch'])
+        vocab = self.emitter.get_results()[0]['vocab']
+        self.assertIn({'start': 'test', 'end': 'single'}, vocab)
+        self.assertIn({'start': 'watering', 'end': 'singlealias',
+                       'alias_of': 'water'}, vocab)
+
     def test_load_skill(self):
         """ Verify skill load function. """
         e_path = join(dirname(__file__), 'test_skill')
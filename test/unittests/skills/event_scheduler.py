@@ -0,0 +1,155 @@
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from os.path import join
+
+from mycroft.messagebus.message import Message
+from mycroft.skills.event_scheduler import EventScheduler
+
+__author__ = 'jarbas'
+
+
+class MockEmitter(object):
+    """ records emitted events and the time they were emitted """
+    def __init__(self):
+        self.emitted = []
+
+    def on(self, event, f):
+        pass
+
+    def emit(self, message):
+        self.emitted.append((time.time(), message))
+
+    def remove_all_listeners(self, event):
+        pass
+
+    def types(self):
+        return [m.type for _, m in self.emitted]
+
+
+class EventSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.schedule_file = join(self.temp, 'schedule.json')
+        self.emitter = MockEmitter()
+        self.scheduler = EventScheduler(self.emitter, self.schedule_file)
+
+    def tearDown(self):
+        if self.scheduler.isRunning:
+            self.scheduler.shutdown()
+        shutil.rmtree(self.temp)
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while len(self.emitter.emitted) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_fires_in_time_order(self):
+        now = time.time()
+        self.scheduler.schedule_event('c', now + 0.3)
+        self.scheduler.schedule_event('a', now + 0.1)
+        self.scheduler.schedule_event('b', now + 0.2)
+        self.wait_for(3)
+        self.assertEqual(self.emitter.types(), ['a', 'b', 'c'])
+        self.assertEqual(self.scheduler.events, {})
+
+    def test_firing_jitter(self):
+        start = time.time() + 0.2
+        expected = {}
+        for i in range(20):
+            expected['event%d' % i] = start + i * 0.05
+            self.scheduler.schedule_event('event%d' % i, start + i * 0.05)
+        # plenty of pending events later on
+        for i in range(10000):
+            self.scheduler.schedule_event('later', start + 3600 + i)
+        self.wait_for(20)
+        jitter = [fired - expected[m.type] for fired, m in
+                  self.emitter.emitted]
+        self.assertEqual(len(jitter), 20)
+        self.assertTrue(min(jitter) >= 0)
+        # the old scheduler polled every 0.5 seconds
+        self.assertLess(max(jitter), 0.05)
+        self.assertLess(sum(jitter) / len(jitter), 0.01)
+
+    def test_wakes_up_for_earlier_event(self):
+        self.scheduler.schedule_event('late', time.time() + 60)
+        time.sleep(0.05)
+        self.scheduler.schedule_event('early', time.time() + 0.05)
+        self.wait_for(1)
+        self.assertEqual(self.emitter.types(), ['early'])
+
+    def test_remove(self):
+        now = time.time()
+        self.scheduler.schedule_event('removed', now + 0.1)
+        self.scheduler.schedule_event('kept', now + 0.2)
+        self.scheduler.remove_event('removed')
+        self.wait_for(1)
+        time.sleep(0.05)
+        self.assertEqual(self.emitter.types(), ['kept'])
+
+    def test_update(self):
+        self.scheduler.schedule_event('updated', time.time() + 0.1,
+                                      data={'old': True})
+        self.scheduler.update_event_handler(Message(
+            'mycroft.scheduler.update_event',
+            {'event': 'updated', 'data': {'new': True}}))
+        self.wait_for(1)
+        self.assertEqual(self.emitter.emitted[0][1].data, {'new': True})
+
+    def test_repeat(self):
+        self.scheduler.schedule_event('repeated', time.time() + 0.05, 0.05)
+        self.wait_for(3)
+        self.assertEqual(self.emitter.types()[:3], ['repeated'] * 3)
+        self.assertEqual(len(self.scheduler.events['repeated']), 1)
+
+    def test_schedule_handler(self):
+        self.scheduler.schedule_event_handler(Message(
+            'mycroft.scheduler.schedule_event',
+            {'event': 'handled', 'time': time.time() + 0.05,
+             'data': {'x': 1}}))
+        self.wait_for(1)
+        self.assertEqual(self.emitter.emitted[0][1].data, {'x': 1})
+
+    def test_persistence(self):
+        now = time.time()
+        self.scheduler.schedule_event('kept', now + 3600, data={'a': 1})
+        self.scheduler.schedule_event('removed', now + 3600)
+        self.scheduler.remove_event('removed')
+        self.scheduler.schedule_event('repeated', now - 10, 3)
+        # journal only, as if the process died
+        scheduler = EventScheduler(MockEmitter(), self.schedule_file)
+        scheduler.shutdown()
+        with open(self.schedule_file) as f:
+            stored = json.load(f)
+        self.assertEqual(sorted(stored), ['kept', 'repeated'])
+        self.assertEqual(stored['kept'], [[now + 3600, None, {'a': 1}]])
+        # a missed repetition is emitted once, not once per interval
+        repeated = stored['repeated'][0][0]
+        self.assertTrue(now - 3 < repeated <= now + 3)
+
+    def test_update_persistence(self):
+        now = time.time()
+        self.scheduler.schedule_event('a', now + 0.1, data={'v': 1})
+        self.scheduler.schedule_event('a', now + 3600, data={'v': 2})
+        self.scheduler.schedule_event('r', now + 0.1, 0.1, data={'v': 1})
+        self.wait_for(3)
+        self.scheduler.update_event('a', {'v': 'new'})
+        self.scheduler.update_event('r', {'v': 'new'})
+        # journal only, as if the process died
+        scheduler = EventScheduler(MockEmitter(), self.schedule_file)
+        scheduler.shutdown()
+        with open(self.schedule_file) as f:
+            stored = json.load(f)
+        self.assertEqual(stored['a'], [[now + 3600, None, {'v': 'new'}]])
+        self.assertEqual(stored['r'][0][2], {'v': 'new'})
+
+    def test_journal_compacted(self):
+        self.scheduler.schedule_event('updated', time.time() + 3600)
+        for i in range(1500):
+            self.scheduler.update_event('updated', {'count': i})
+        with open(self.schedule_file) as f:
+            self.assertEqual(json.load(f)['updated'][0][2], {'count': 999})
+        with open(self.schedule_file + '.journal') as f:
+            self.assertEqual(len(f.readlines()), 500)
@@ -1,12 +1,22 @@
+import time
 import unittest
+from threading import Timer
 
-from mycroft.skills.intent_service import ContextManager
+from adapt.intent import IntentBuilder
+from adapt.tools.text.tokenizer import EnglishTokenizer
+
+from mycroft.messagebus.message import Message
+from mycroft.skills.intent_service import ContextManager, IntentIndex, \
+    IntentCache, IntentService, ConverseRequest
 
 
 class MockEmitter(object):
     def __init__(self):
         self.reset()
 
+    def on(self, event, f):
+        pass
+
     def emit(self, message):
         self.types.append(message.type)
         self.results.append(message.data)
@@ -56,5 +66,206 @@ class ContextManagerTest(unittest.TestCase):
         self.assertEqual(len(self.context_manager.frame_stack), 0)
 
 
+class IntentIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = IntentIndex(EnglishTokenizer())
+        self.index.register_vocab('time', 'TimeKeyword')
+        self.index.register_vocab('what time is it', 'TimeKeyword')
+        self.index.register_vocab('weather', 'WeatherKeyword')
+        self.index.register_vocab('forecast', 'WeatherKeyword',
+                                  alias_of='weather')
+        self.index.register_vocab('tomorrow', 'DayKeyword')
+        self.time = IntentBuilder('1:TimeIntent') \
+            .require('TimeKeyword').build()
+        self.weather = IntentBuilder('2:WeatherIntent') \
+            .require('WeatherKeyword').optionally('DayKeyword').build()
+        self.day = IntentBuilder('2:DayIntent') \
+            .one_of('WeatherKeyword', 'TimeKeyword') \
+            .require('DayKeyword').build()
+        for intent in (self.time, self.weather, self.day):
+            self.index.register_intent(intent)
+
+    def test_candidates(self):
+        self.assertEqual(self.index.candidates('what time is it'),
+                         [self.time])
+        self.assertEqual(self.index.candidates('forecast for tomorrow'),
+                         [self.weather, self.day])
+        self.assertEqual(self.index.candidates('sing a song'), [])
+
+    def test_token_boundaries(self):
+        self.assertEqual(self.index.candidates('set a timer'), [])
+        self.assertEqual(self.index.candidates('Time, please'), [self.time])
+
+    def test_context(self):
+        context = [{'data': [('tomorrow', 'DayKeyword')],
+                    'key': 'tomorrow', 'confidence': 0.5}]
+        self.assertEqual(self.index.candidates('time', context),
+                         [self.time, self.day])
+
+    def test_regex_and_unconstrained(self):
+        self.index.register_regex('play (?P<Song>.*)')
+        play = IntentBuilder('3:PlayIntent').require('Song').build()
+        anything = IntentBuilder('3:AnyIntent').optionally('Song').build()
+        self.index.register_intent(play)
+        self.index.register_intent(anything)
+        self.assertEqual(self.index.candidates('sing a song'),
+                         [play, anything])
+
+    def test_detach(self):
+        self.index.detach(lambda p: p.name == '1:TimeIntent')
+        self.assertEqual(self.index.candidates('what time is it'), [])
+        self.index.detach(lambda p: p.name.startswith('2'))
+        self.assertEqual(self.index.candidates('forecast for tomorrow'), [])
+        self.assertEqual(self.index.intents, {})
+        self.assertEqual(self.index.clauses, {})
+
+
+class IntentCacheTest(unittest.TestCase):
+    def test_lru(self):
+        cache = IntentCache(2)
+        for utterance in ('a', 'b'):
+            cache.put(cache.key(utterance, 'en-us'),
+                      {'intent_type': utterance}, 0.5, cache.generation)
+        self.assertEqual(cache.get(cache.key('a', 'en-us')),
+                         (True, {'intent_type': 'a'}))
+        cache.put(cache.key('c', 'en-us'), None, 0.5, cache.generation)
+        self.assertEqual(cache.get(cache.key('b', 'en-us')), (False, None))
+        self.assertEqual(cache.get(cache.key('c', 'en-us')), (True, None))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertEqual(stats['saved_time'], 1.0)
+
+    def test_context_fingerprint(self):
+        context = [{'data': [('london', 'Location')], 'confidence': 0.5}]
+        self.assertNotEqual(IntentCache.key('weather', 'en-us'),
+                            IntentCache.key('weather', 'en-us', context))
+
+    def test_stale_results_dropped(self):
+        cache = IntentCache()
+        generation = cache.generation
+        cache.clear()
+        cache.put(cache.key('a', 'en-us'), None, 0.1, generation)
+        self.assertEqual(cache.entries, {})
+
+
+class IntentServiceCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.emitter = MockEmitter()
+        self.service = IntentService(self.emitter)
+        self.service.handle_register_vocab(Message('register_vocab', {
+            'start': 'joke', 'end': 'JokeKeyword'}))
+        self.register('1:JokeIntent')
+
+    def register(self, name):
+        intent = IntentBuilder(name).require('JokeKeyword').build()
+        self.service.handle_register_intent(Message('register_intent',
+                                                    intent.__dict__))
+
+    def request(self):
+        self.emitter.reset()
+        self.service.handle_intent_request(Message('intent_request', {
+            'utterance': 'tell me a joke'}))
+        return self.emitter.get_results()[0]['intent_name']
+
+    def test_cached_and_invalidated(self):
+        self.assertEqual(self.request(), 'JokeIntent')
+        self.assertEqual(self.request(), 'JokeIntent')
+        self.assertEqual(self.service.intent_cache.hits, 1)
+        self.service.handle_detach_intent(Message('detach_intent', {
+            'intent_name': '1:JokeIntent'}))
+        self.assertEqual(self.request(), '')
+        self.register('2:OtherJokeIntent')
+        self.assertEqual(self.request(), 'OtherJokeIntent')
+
+    def test_vocab_batch(self):
+        self.assertEqual(self.request(), 'JokeIntent')
+        self.service.handle_register_vocab_batch(Message(
+            'register_vocab_batch', {'vocab': [
+                {'start': 'weather', 'end': 'WeatherKeyword'},
+                {'start': 'forecast', 'end': 'WeatherKeyword',
+                 'alias_of': 'weather'},
+                {'regex': '(?P<Location>paris)'}]}))
+        self.assertEqual(len(self.service.intent_cache.entries), 0)
+        self.assertIn('weatherkeyword',
+                      self.service.index.entity_types('forecast'))
+        self.assertIn('location', self.service.index.regex_types)
+
+    def test_stats_message(self):
+        self.request()
+        self.emitter.reset()
+        self.service.handle_intent_cache_stats_request(
+            Message('intent.cache.stats.request'))
+        self.assertEqual(self.emitter.get_types(),
+                         ['intent.cache.stats.reply'])
+        self.assertEqual(self.emitter.get_results()[0]['misses'], 1)
+
+
+class ConverseEmitter(MockEmitter):
+    """ answers converse requests after a per skill delay """
+    def __init__(self, answers):
+        MockEmitter.__init__(self)
+        self.answers = answers
+        self.service = None
+
+    def emit(self, message):
+        MockEmitter.emit(self, message)
+        if message.type != 'skill.converse.request':
+            return
+        skill_id = message.data['skill_id']
+        if skill_id not in self.answers:
+            return
+        delay, result = self.answers[skill_id]
+        response = Message('skill.converse.response',
+                           {'skill_id': skill_id, 'result': result},
+                           message.context)
+        Timer(delay, self.service.handle_conversation_response,
+              [response]).start()
+
+
+class ConverseTest(unittest.TestCase):
+    def converse(self, answers, skill_ids, deadline=2):
+        emitter = ConverseEmitter(answers)
+        service = IntentService(emitter)
+        service.converse_deadline = deadline
+        emitter.service = service
+        start = time.time()
+        winner = service.do_conversation(['hello'], skill_ids, 'en-us')
+        self.assertEqual(service.converse_requests, {})
+        return winner, time.time() - start
+
+    def test_requests_sent_concurrently(self):
+        answers = dict((i, (0.3, False)) for i in range(5))
+        winner, elapsed = self.converse(answers, range(5))
+        self.assertEqual(winner, None)
+        self.assertLess(elapsed, 1)
+
+    def test_priority(self):
+        # 2 answers first, but 1 is more recently active
+        answers = {1: (0.3, True), 2: (0.05, True), 3: (0.05, False)}
+        winner, _ = self.converse(answers, [3, 1, 2])
+        self.assertEqual(winner, 1)
+
+    def test_decided_before_slow_skills(self):
+        answers = {1: (0.05, True), 2: (5, False)}
+        winner, elapsed = self.converse(answers, [1, 2])
+        self.assertEqual(winner, 1)
+        self.assertLess(elapsed, 1)
+
+    def test_deadline(self):
+        # 1 never answers, 2 wants the utterance
+        answers = {2: (0.05, True)}
+        winner, elapsed = self.converse(answers, [1, 2], deadline=0.3)
+        self.assertEqual(winner, 2)
+        self.assertLess(elapsed, 1)
+
+    def test_response_without_context(self):
+        request = ConverseRequest([4, 5])
+        request.respond(5, True)
+        request.respond(7, True)
+        request.respond(4, False)
+        request.respond(4, True)
+        self.assertEqual(request.wait(0), 5)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,164 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from os.path import dirname, join
+
+import mock
+
+from mycroft.messagebus.message import Message
+from mycroft.skills.core import load_skill, create_skill_descriptor
+from mycroft.skills.lazy import LazySkill, load_manifest
+
+__author__ = 'jarbas'
+
+MODULE = 'lazy_skill__init__'
+
+
+class BusEmitter(object):
+    """ records emitted messages and calls handlers registered for them """
+    def __init__(self):
+        self.handlers = {}
+        self.messages = []
+
+    def emit(self, message):
+        self.messages.append(message)
+        for handler in list(self.handlers.get(message.type, [])):
+            handler(message)
+
+    def on(self, event, f):
+        self.handlers.setdefault(event, []).append(f)
+
+    def once(self, event, f):
+        self.on(event, f)
+
+    def remove(self, event, f):
+        self.handlers[event].remove(f)
+
+    def remove_all_listeners(self, event):
+        self.handlers.pop(event, None)
+
+    def types(self):
+        return [m.type for m in self.messages]
+
+
+class LazySkillTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.skill_dir = join(self.temp, 'lazy_skill')
+        shutil.copytree(join(dirname(__file__), 'lazy_skill'),
+                        self.skill_dir)
+        manifests = mock.Mock()
+        manifests.open = lambda name, mode: open(join(self.temp, name),
+                                                 mode)
+        patcher = mock.patch('mycroft.skills.lazy._manifests',
+                             return_value=manifests)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sys.modules.pop(MODULE, None)
+
+    def tearDown(self):
+        sys.modules.pop(MODULE, None)
+        shutil.rmtree(self.temp)
+
+    def load(self, emitter, skill_id=7):
+        return load_skill(create_skill_descriptor(self.skill_dir), emitter,
+                          skill_id, lazy=True)
+
+    def load_lazy(self):
+        # the first load creates the manifest
+        self.load(BusEmitter()).shutdown()
+        sys.modules.pop(MODULE, None)
+        emitter = BusEmitter()
+        return self.load(emitter), emitter
+
+    def test_first_load_saves_manifest(self):
+        skill = self.load(BusEmitter())
+        self.assertNotIsInstance(skill, LazySkill)
+        self.assertIn(MODULE, sys.modules)
+        manifest = load_manifest('lazy_skill', mock.ANY, mock.ANY)
+        self.assertIsNotNone(manifest)
+        self.assertEqual(manifest['name'], 'LazyTestSkill')
+        self.assertEqual(manifest['intents'], ['LazyTestIntent'])
+        self.assertEqual(manifest['requests'], ['lazy.test.request'])
+        types = [r['type'] for r in manifest['registrations']]
+        self.assertEqual(types, ['register_vocab_batch', 'register_intent'])
+
+    def test_lazy_load_registers_manifest(self):
+        skill, emitter = self.load_lazy()
+        self.assertIsInstance(skill, LazySkill)
+        self.assertFalse(skill.active)
+        self.assertNotIn(MODULE, sys.modules)
+        self.assertEqual(emitter.types(),
+                         ['register_vocab_batch', 'register_intent'])
+        self.assertEqual(emitter.messages[1].data['name'], '7:LazyTestIntent')
+        self.assertIn('7:LazyTestIntent', emitter.handlers)
+        self.assertIn('lazy.test.request', emitter.handlers)
+
+    def test_request_activates_skill(self):
+        skill, emitter = self.load_lazy()
+        emitter.emit(Message('lazy.test.request', {'file': 'a.jpg'}))
+        self.assertTrue(skill.active)
+        self.assertIn(MODULE, sys.modules)
+        replies = [m for m in emitter.messages if m.type == 'lazy.test.reply']
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(replies[0].data, {'file': 'a.jpg'})
+        # already registered from the manifest
+        self.assertEqual(emitter.types().count('register_intent'), 1)
+
+        emitter.emit(Message('lazy.test.request', {}))
+        self.assertEqual(emitter.types().count('lazy.test.reply'), 2)
+
+    def test_intent_activates_skill(self):
+        skill, emitter = self.load_lazy()
+        emitter.emit(Message('7:LazyTestIntent', {}))
+        self.assertTrue(skill.active)
+        self.assertEqual(emitter.types().count('lazy.test.intent'), 1)
+
+    def test_unload(self):
+        skill, emitter = self.load_lazy()
+        emitter.emit(Message('lazy.test.request', {}))
+        skill.unload()
+        self.assertFalse(skill.active)
+        self.assertNotIn(MODULE, sys.modules)
+        self.assertNotIn('detach_skill', emitter.types())
+        self.assertEqual(emitter.handlers.get('mycroft.stop'), [])
+
+        emitter.emit(Message('lazy.test.request', {}))
+        self.assertTrue(skill.active)
+        self.assertEqual(emitter.types().count('lazy.test.reply'), 2)
+
+    def test_not_unloaded_while_busy(self):
+        skill, emitter = self.load_lazy()
+        self.assertIsNotNone(skill.activate())
+        skill.unload()
+        self.assertTrue(skill.active)
+        skill.release()
+        skill.unload()
+        self.assertFalse(skill.active)
+
+    def test_converse_inactive(self):
+        skill, emitter = self.load_lazy()
+        self.assertFalse(skill.converse(['hello']))
+        self.assertFalse(skill.active)
+
+    def test_idle_timeout(self):
+        skill, emitter = self.load_lazy()
+        skill.idle_timeout = 30
+        with mock.patch('mycroft.skills.lazy.Timer') as timer:
+            emitter.emit(Message('lazy.test.request', {}))
+            timer.assert_called_once_with(30, skill.unload)
+
+    def test_shutdown_inactive(self):
+        skill, emitter = self.load_lazy()
+        skill.shutdown()
+        self.assertEqual(emitter.messages[-1].type, 'detach_skill')
+        self.assertEqual(emitter.messages[-1].data, {'skill_id': '7:'})
+        self.assertEqual(emitter.handlers['lazy.test.request'], [])
+
+    def test_changed_skill_reloads_manifest(self):
+        self.load(BusEmitter()).shutdown()
+        with mock.patch('mycroft.skills.core.get_last_modified_date',
+                        return_value=-1):
+            skill = self.load(BusEmitter())
+        self.assertNotIsInstance(skill, LazySkill)
@@ -0,0 +1,24 @@
+from adapt.intent import IntentBuilder
+
+from mycroft.messagebus.message import Message
+from mycroft.skills.core import MycroftSkill
+
+
+class LazyTestSkill(MycroftSkill):
+    def initialize(self):
+        self.emitter.on("lazy.test.request", self.handle_request)
+        intent = IntentBuilder("LazyTestIntent").require("LazyKeyword")
+        self.register_intent(intent.build(), self.handle_intent)
+
+    def handle_request(self, message):
+        self.emitter.emit(Message("lazy.test.reply", message.data))
+
+    def handle_intent(self, message):
+        self.emitter.emit(Message("lazy.test.intent"))
+
+    def stop(self):
+        pass
+
+
+def create_skill():
+    return LazyTestSkill()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+import mock
+
+from mycroft.skills.vocab_cache import VocabCache
+
+__author__ = 'jarbas'
+
+
+class VocabCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.vocab_dir = join(self.temp, 'vocab')
+        os.mkdir(self.vocab_dir)
+        self.write('b.voc', 'b')
+        self.write('a.voc', 'a')
+        self.write('ignored.txt', 'ignored')
+        cache_dir = join(self.temp, 'cache')
+        os.mkdir(cache_dir)
+        storage = mock.Mock()
+        storage.open = lambda name, mode: open(join(cache_dir, name), mode)
+        patcher = mock.patch('mycroft.skills.vocab_cache.FileSystemAccess',
+                             return_value=storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.parsed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def write(self, name, content):
+        with open(join(self.vocab_dir, name), 'w') as f:
+            f.write(content)
+
+    def parse(self, path):
+        self.parsed.append(os.path.basename(path))
+        with open(path) as f:
+            return [{'start': f.read(), 'end': 'Keyword'}]
+
+    def read(self, cache):
+        return cache.read(self.vocab_dir, '.voc', self.parse)
+
+    def test_reads_in_name_order(self):
+        entries = self.read(VocabCache())
+        self.assertEqual([e['start'] for e in entries], ['a', 'b'])
+        self.assertEqual(self.parsed, ['a.voc', 'b.voc'])
+
+    def test_unchanged_files_not_parsed(self):
+        expected = self.read(VocabCache())
+        self.parsed = []
+        cache = VocabCache()
+        self.assertEqual(self.read(cache), expected)
+        self.assertEqual(self.parsed, [])
+        self.assertEqual(cache.hits, 2)
+
+    def test_changed_file_parsed(self):
+        self.read(VocabCache())
+        self.parsed = []
+        self.write('a.voc', 'changed')
+        entries = self.read(VocabCache())
+        self.assertEqual(self.parsed, ['a.voc'])
+        self.assertEqual([e['start'] for e in entries], ['changed', 'b'])
+
+    def test_removed_file_dropped(self):
+        self.read(VocabCache())
+        os.remove(join(self.vocab_dir, 'b.voc'))
+        entries = self.read(VocabCache())
+        self.assertEqual([e['start'] for e in entries], ['a'])
+
+    def test_disabled(self):
+        self.read(VocabCache(False))
+        self.parsed = []
+        self.read(VocabCache(False))
+        self.assertEqual(self.parsed, ['a.voc', 'b.voc'])
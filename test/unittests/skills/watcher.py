@@ -0,0 +1,81 @@
+import os
+import time
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from mycroft.skills.watcher import SkillsWatcher, pyinotify
+
+
+class SkillsWatcherTest(unittest.TestCase):
+    use_inotify = False
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        for skill in ('skill_a', 'skill_b'):
+            os.makedirs(os.path.join(self.dir, skill, 'vocab'))
+        self.watcher = SkillsWatcher(self.dir, debounce=0.2,
+                                     poll_interval=0.1,
+                                     use_inotify=self.use_inotify)
+        self.watcher.start()
+        time.sleep(0.3)
+
+    def tearDown(self):
+        self.watcher.stop()
+        rmtree(self.dir)
+
+    def write(self, *path):
+        # make sure polling sees a newer mtime
+        time.sleep(0.01)
+        with open(os.path.join(self.dir, *path), 'w') as f:
+            f.write(str(time.time()))
+        mtime = time.time() + 1
+        os.utime(os.path.join(self.dir, *path), (mtime, mtime))
+
+    def test_changed_skill_reported(self):
+        self.write('skill_a', 'vocab', 'Keyword.voc')
+        self.assertEqual(self.watcher.wait(3), set(['skill_a']))
+        self.assertEqual(self.watcher.wait(0.5), set())
+
+    def test_debounce(self):
+        self.write('skill_b', '__init__.py')
+        start = time.time()
+        for _ in range(3):
+            time.sleep(0.1)
+            self.write('skill_b', '__init__.py')
+        self.assertEqual(self.watcher.wait(3), set(['skill_b']))
+        self.assertGreaterEqual(time.time() - start, 0.5)
+        self.assertEqual(self.watcher.wait(0.5), set())
+
+    def test_ignored_files(self):
+        self.write('skill_a', '__init__.pyc')
+        self.write('skill_a', 'settings.json')
+        self.assertEqual(self.watcher.wait(0.6), set())
+
+    def test_request(self):
+        self.watcher.request('skill_b')
+        self.assertEqual(self.watcher.wait(0), set(['skill_b']))
+
+
+@unittest.skipIf(pyinotify is None, "pyinotify not installed")
+class InotifySkillsWatcherTest(SkillsWatcherTest):
+    use_inotify = True
+
+    def test_mode(self):
+        self.assertEqual(self.watcher.mode, "inotify")
+
+    def test_new_skill_folder(self):
+        os.makedirs(os.path.join(self.dir, 'skill_c'))
+        time.sleep(0.1)
+        self.write('skill_c', '__init__.py')
+        self.assertEqual(self.watcher.wait(3), set(['skill_c']))
+
+    def test_hidden_ignored(self):
+        os.makedirs(os.path.join(self.dir, 'skill_a', '.git'))
+        self.watcher.wait(0.6)
+        self.write('skill_a', '.git', 'index')
+        self.assertEqual(self.watcher.wait(0.6), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
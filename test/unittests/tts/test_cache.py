@@ -0,0 +1,259 @@
+import os
+import tempfile
+import time
+import unittest
+import wave
+from os.path import exists, join
+from shutil import rmtree
+from threading import Thread
+
+import mock
+
+import mycroft.audio.speech as speech
+import mycroft.tts
+import mycroft.tts.cache
+from mycroft.tts.cache import TTSCache, dialog_lines, get_cache
+
+
+class MockValidator(mycroft.tts.TTSValidator):
+    def validate_lang(self):
+        pass
+
+    def validate_connection(self):
+        pass
+
+    def get_tts_class(self):
+        return mycroft.tts.TTS
+
+
+class FileTTS(mycroft.tts.TTS):
+    """ writes the sentence as audio """
+    def __init__(self, voice=None):
+        super(FileTTS, self).__init__('en-us', {'voice': voice},
+                                      MockValidator(self))
+        self.playback.stop()
+        self.playback.join()
+        self.type = 'wav'
+        self.synthesized = []
+
+    def get_tts(self, sentence, wav_file):
+        self.synthesized.append(sentence)
+        with open(wav_file, 'w') as f:
+            f.write(sentence)
+        return wav_file, 'pho ' + sentence
+
+
+class StreamTTS(FileTTS):
+    """ streams the sentence as two chunks """
+    def get_tts_stream(self, sentence):
+        self.synthesized.append(sentence)
+        stream = mycroft.tts.AudioStream(16000)
+        stream.put(sentence[:2])
+        stream.put(sentence[2:])
+        stream.end()
+        return stream
+
+
+class TestTTSCache(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.cache = TTSCache(self.temp, max_bytes=100)
+
+    def tearDown(self):
+        rmtree(self.temp)
+
+    def write(self, key, size, ext='wav'):
+        path = self.cache.path(key, ext)
+        with open(path, 'w') as f:
+            f.write('x' * size)
+        return path
+
+    def test_key(self):
+        key = TTSCache.key(u'hello', 'MimicTTS', 'ap', 'en-us')
+        self.assertEqual(key, TTSCache.key('hello', 'MimicTTS', 'ap',
+                                           'en-us'))
+        self.assertNotEqual(key, TTSCache.key('hello', 'MimicTTS', 'slt',
+                                              'en-us'))
+        self.assertNotEqual(key, TTSCache.key('hello', 'PicoTTS', 'ap',
+                                              'en-us'))
+
+    def test_get_add(self):
+        self.assertIsNone(self.cache.get('a'))
+        path = self.write('a', 10)
+        self.assertEqual(self.cache.add('a', path, 'h e'), 0)
+        self.assertEqual(self.cache.get('a'), (path, 'h e'))
+        self.assertEqual(self.cache.total, 13)
+
+    def test_not_in_cache_directory(self):
+        self.assertEqual(self.cache.add('a', '/tmp/a.wav'), 0)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru_eviction(self):
+        for key in 'abc':
+            self.cache.add(key, self.write(key, 40))
+        # b and c evicted a, the oldest
+        self.assertIsNone(self.cache.get('a'))
+        self.assertFalse(exists(self.cache.path('a', 'wav')))
+        self.cache.get('b')
+        self.assertEqual(self.cache.add('d', self.write('d', 40)), 1)
+        self.assertIsNone(self.cache.get('c'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.assertEqual(self.cache.total, 80)
+        self.assertEqual(self.cache.evictions, 2)
+
+    def test_reconcile(self):
+        self.cache.add('a', self.write('a', 10))
+        self.cache.add('b', self.write('b', 20))
+        os.remove(self.cache.path('a', 'wav'))
+        self.write('stray', 5)
+        cache = TTSCache(self.temp, max_bytes=100)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.total, 20)
+        self.assertFalse(exists(cache.path('stray', 'wav')))
+
+    def test_clear(self):
+        self.cache.add('a', self.write('a', 10), 'h')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(os.listdir(self.temp), ['index.db'])
+
+
+class TestGetCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = mycroft.tts.cache._cache
+        mycroft.tts.cache._cache = None
+
+    def tearDown(self):
+        mycroft.tts.cache._cache = self.cache
+
+    def test_created_once(self):
+        created = []
+
+        def slow_cache(max_bytes):
+            time.sleep(0.05)
+            created.append(object())
+            return created[-1]
+
+        with mock.patch('mycroft.tts.cache.TTSCache',
+                        side_effect=slow_cache):
+            threads = [Thread(target=get_cache) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertIs(get_cache(), created[0])
+
+
+class TestTTSCaching(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.cache = TTSCache(self.temp, max_bytes=1000)
+        self.get_cache = mycroft.tts.get_cache
+        mycroft.tts.get_cache = lambda: self.cache
+
+    def tearDown(self):
+        mycroft.tts.get_cache = self.get_cache
+        rmtree(self.temp)
+
+    def test_synthesize_cached(self):
+        tts = FileTTS()
+        first = tts.synthesize('hello')
+        self.assertEqual(tts.synthesize('hello'), first)
+        self.assertEqual(tts.synthesized, ['hello'])
+        self.assertTrue(tts.is_cached('hello'))
+
+    def test_voice_in_key(self):
+        FileTTS('ap').synthesize('hello')
+        tts = FileTTS('slt')
+        self.assertFalse(tts.is_cached('hello'))
+        tts.synthesize('hello')
+        self.assertEqual(tts.synthesized, ['hello'])
+
+    def test_cache_voice_in_key(self):
+        tts = FileTTS()
+        tts.cache_voice = lambda: 'model-1'
+        tts.synthesize('hello')
+        tts.cache_voice = lambda: 'model-2'
+        self.assertFalse(tts.is_cached('hello'))
+
+    def test_synthesized_once_at_a_time(self):
+        tts = FileTTS()
+        get_tts = tts.get_tts
+
+        def slow_get_tts(sentence, wav_file):
+            time.sleep(0.1)
+            return get_tts(sentence, wav_file)
+        tts.get_tts = slow_get_tts
+        # "Yes. Yes." spoken by two pipeline workers
+        results = []
+        threads = [Thread(target=lambda: results.append(
+            tts.synthesize('yes'))) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(tts.synthesized, ['yes'])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(tts._synthesizing, {})
+
+    def test_stream_cached_when_played(self):
+        tts = StreamTTS()
+        snd_type, stream, visimes = tts.synthesize('hello!')
+        self.assertEqual(snd_type, 'stream')
+        self.assertFalse(tts.is_cached('hello!'))
+        self.assertEqual(list(stream), ['he', 'llo!'])
+        snd_type, wav_file, visimes = tts.synthesize('hello!')
+        self.assertEqual(snd_type, 'wav')
+        f = wave.open(wav_file)
+        self.assertEqual((f.getframerate(), f.readframes(3)),
+                         (16000, 'hello!'))
+        self.assertEqual(tts.synthesized, ['hello!'])
+
+    def test_stream_stopped_not_cached(self):
+        tts = StreamTTS()
+        chunks = iter(tts.synthesize('hello!')[1])
+        next(chunks)
+        chunks.close()
+        self.assertFalse(tts.is_cached('hello!'))
+
+
+class TestPrewarm(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        dialog = join(self.temp, 'skill_a', 'dialog', 'en-us')
+        os.makedirs(dialog)
+        with open(join(dialog, 'hi.dialog'), 'w') as f:
+            f.write('Hello. How are you?\n\nhello {{name}}\n# comment\nhey\n')
+        self.cache = TTSCache(tempfile.mkdtemp(), max_bytes=1000)
+        self.get_cache = mycroft.tts.get_cache
+        mycroft.tts.get_cache = speech.get_cache = lambda: self.cache
+        speech.config = {}
+        speech.tts = FileTTS()
+        speech.tts_hash = hash(str(''))
+
+    def tearDown(self):
+        mycroft.tts.get_cache = speech.get_cache = self.get_cache
+        rmtree(self.temp)
+        rmtree(self.cache.directory)
+
+    def test_dialog_lines(self):
+        self.assertEqual(list(dialog_lines(self.temp, 'en-us')),
+                         ['Hello. How are you?', 'hey'])
+        self.assertEqual(list(dialog_lines(self.temp, 'pt-br')), [])
+
+    def test_prewarm(self):
+        speech.prewarm(dialog_lines(self.temp, 'en-us'))
+        self.assertEqual(speech.tts.synthesized, ['Hello.', 'How are you?',
+                                                  'hey'])
+        speech.prewarm(dialog_lines(self.temp, 'en-us'))
+        self.assertEqual(len(speech.tts.synthesized), 3)
+
+    def test_prewarm_until_full(self):
+        self.cache.max_bytes = 20
+        speech.prewarm(dialog_lines(self.temp, 'en-us'))
+        self.assertEqual(speech.tts.synthesized, ['Hello.', 'How are you?'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+try:
+    from jarbas_utils import deep_throat
+except ImportError:
+    deep_throat = None
+
+
+@unittest.skipIf(deep_throat is None, "deep_throat dependencies not installed")
+class TestDeepThroat(unittest.TestCase):
+    """ pinned to the output of the list based deep_throat """
+    def test_text_to_phonemes(self):
+        self.assertEqual(deep_throat.text_to_phonemes(text='Hello world.'),
+                         'EH-OH W-AW-R-L-D')
+
+    def test_phonemes_words_values(self):
+        values = deep_throat.phonemes_words_values(
+            phonemes_words='EH-OH W-AW-R-L-D')
+        # 7 phonemes and 3 spaces of 2000 values
+        self.assertEqual(len(values), 20000)
+        # the rectangle waveform of shijian only set the first two values
+        # and scaled the rest
+        self.assertEqual(values[0], 0)
+        self.assertAlmostEqual(values[1], 255)
+        self.assertAlmostEqual(values[2], 18206.55327663832)
+        self.assertAlmostEqual(values[3], 14559.829914957481)
+        # resampled like shijian.change_list_resolution
+        self.assertAlmostEqual(values[2000], 25500)
+        self.assertAlmostEqual(values[2001], 18177.83891945973)
+        self.assertAlmostEqual(values[2002], 10855.677838919459)
+        self.assertAlmostEqual(values.sum(), 173701187.966, places=2)
+
+    def test_phonemes_dictionary(self):
+        values = deep_throat.phonemes_values(
+            phonemes_string='EH-OH', phonemes_dictionary={'EH': [0, 10]})
+        self.assertEqual(len(values), 2000)
+        self.assertEqual((values[0], values[-1]), (0, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import time
+import unittest
+from Queue import Queue
+from threading import Thread, Lock
+
+import mycroft.tts
+from mycroft.tts import PlaybackThread, TTSPipeline
+
+
+class MockValidator(mycroft.tts.TTSValidator):
+    def validate_lang(self):
+        pass
+
+    def validate_connection(self):
+        pass
+
+    def get_tts_class(self):
+        return mycroft.tts.TTS
+
+
+class DelayTTS(mycroft.tts.TTS):
+    """ synthesizes "<seconds>" sentences in that many seconds """
+    def __init__(self):
+        super(DelayTTS, self).__init__('en-us', {}, MockValidator(self))
+        # audio goes to the queue only, nothing is played
+        self.playback.stop()
+        self.playback.join()
+        self.queued()
+        self.lock = Lock()
+        self.started = []
+        self.finished = []
+
+    def synthesize(self, sentence):
+        with self.lock:
+            self.started.append(sentence)
+        time.sleep(float(sentence))
+        with self.lock:
+            self.finished.append(sentence)
+        return 'wav', sentence, None
+
+    def queued(self):
+        items = []
+        while not self.queue.empty():
+            item = self.queue.get()
+            if item and item[0] != 'utterance':
+                items.append(item[1])
+        return items
+
+
+class SpeakingTTS(mycroft.tts.TTS):
+    def execute(self, sentence):
+        pass
+
+
+class Playing(object):
+    """ a player playing for seconds """
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def communicate(self):
+        time.sleep(self.seconds)
+
+    def wait(self):
+        pass
+
+
+class MockPlaybackTTS(object):
+    def begin_audio(self):
+        pass
+
+    def end_audio(self):
+        pass
+
+
+class TestTTSPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tts = DelayTTS()
+
+    def test_in_order(self):
+        pipeline = TTSPipeline(self.tts, workers=3, look_ahead=2)
+        sentences = ['0.15', '0.1', '0.05', '0.0']
+        pipeline.speak(sentences)
+        self.assertEqual(self.tts.queued(), sentences)
+        # synthesized concurrently, the third one finished first
+        self.assertEqual(self.tts.finished[0], '0.05')
+        pipeline.shutdown()
+
+    def test_look_ahead(self):
+        pipeline = TTSPipeline(self.tts, workers=4, look_ahead=1)
+        pipeline.speak(['0.1', '0.0', '0.0', '0.0'])
+        # the third sentence waited for the first one to be queued
+        self.assertEqual(self.tts.finished[:2], ['0.0', '0.1'])
+        self.assertEqual(len(self.tts.queued()), 4)
+        pipeline.shutdown()
+
+    def test_cancel(self):
+        pipeline = TTSPipeline(self.tts, workers=1, look_ahead=1)
+        speaking = Thread(target=pipeline.speak,
+                          args=(['0.0', '0.2', '0.2', '0.2'],))
+        speaking.start()
+        time.sleep(0.1)
+        start = time.time()
+        pipeline.cancel()
+        speaking.join()
+        # returns without waiting for the sentence being synthesized
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(self.tts.queued(), ['0.0'])
+        time.sleep(0.2)
+        self.assertEqual(self.tts.started, ['0.0', '0.2'])
+        pipeline.shutdown()
+
+    def test_stopped(self):
+        pipeline = TTSPipeline(self.tts, workers=2, look_ahead=2)
+        # the utterance marker and two sentences queued
+        # the utterance marker and two sentences queued
+        pipeline.speak(['0.0', '0.0', '0.0'],
+                       stopped=lambda: len(self.tts.queue.queue) > 2)
+        self.assertEqual(len(self.tts.queued()), 2)
+        pipeline.shutdown()
+
+    def test_can_pipeline(self):
+        self.assertTrue(self.tts.can_pipeline())
+        tts = SpeakingTTS('en-us', {}, MockValidator(None))
+        self.assertFalse(tts.can_pipeline())
+        tts.playback.stop()
+
+    def test_metrics(self):
+        play_wav = mycroft.tts.play_wav
+        mycroft.tts.play_wav = lambda uri: Playing(float(uri))
+        playback = PlaybackThread(Queue())
+        playback.init(MockPlaybackTTS())
+        playback.enclosure = None
+        try:
+            # the last sentence of the previous utterance is still queued
+            playback.queue.put(('wav', '0.2', None))
+            playback.begin_utterance(time.time() - 0.5)
+            playback.queue.put(('wav', '0.1', None))
+            playback.queue.put(('wav', '0.0', None))
+            playback.start()
+            time.sleep(0.4)
+            # the first audio of an utterance is the one queued after it
+            self.assertEqual(len(playback.first_audio), 1)
+            self.assertTrue(0.7 <= playback.first_audio[0] < 0.8)
+            # the silence between utterances is not a gap
+            self.assertEqual(len(playback.gaps), 1)
+            self.assertLess(playback.gaps[0], 0.05)
+        finally:
+            playback.stop()
+            playback.join()
+            mycroft.tts.play_wav = play_wav
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import time
+import unittest
+from threading import Event
+
+import numpy as np
+
+from mycroft.tts.tacotron_tts import TacotronServer
+
+
+class MockSynthesizer(object):
+    """ synthesizes each sentence as itself, waiting for go """
+    sample_rate = 20000
+
+    def __init__(self):
+        self.batches = []
+        self.go = Event()
+
+    def synthesize_batch(self, texts, iters=None):
+        self.go.wait()
+        self.batches.append(texts)
+        if 'error' in texts:
+            raise ValueError('error')
+        return list(texts)
+
+    def synthesize_stream(self, texts, iters=None, block_frames=64):
+        # each character is a chunk of its code
+        for text in self.synthesize_batch(texts):
+            yield (np.array([ord(c)], dtype=np.int16) for c in text)
+
+
+class TestTacotronServer(unittest.TestCase):
+    def setUp(self):
+        self.synthesizer = MockSynthesizer()
+        self.server = TacotronServer(self.synthesizer, batch_size=3)
+        self.server.start()
+
+    def tearDown(self):
+        self.synthesizer.go.set()
+        self.server.stop()
+        self.server.join()
+
+    def wait(self, requests):
+        for request in requests:
+            request.done.wait()
+        return [request.wav for request in requests]
+
+    def test_submitted_together(self):
+        self.synthesizer.go.set()
+        requests = self.server.submit(['a', 'b'])
+        self.assertEqual(self.wait(requests), ['a', 'b'])
+        self.assertEqual(self.synthesizer.batches, [['a', 'b']])
+
+    def test_batch_size(self):
+        first = self.server.submit(['a'])
+        time.sleep(0.05)
+        # waiting while a is synthesized, batched up to batch_size
+        waiting = self.server.submit(['b', 'c']) + self.server.submit(['d'])
+        waiting += self.server.submit(['e'])
+        self.synthesizer.go.set()
+        self.assertEqual(self.wait(first + waiting), list('abcde'))
+        self.assertEqual(self.synthesizer.batches,
+                         [['a'], ['b', 'c', 'd'], ['e']])
+
+    def test_cancelled(self):
+        first = self.server.submit(['a'])
+        time.sleep(0.05)
+        cancelled = self.server.submit(['b', 'c'])
+        cancelled[0].cancelled = True
+        self.synthesizer.go.set()
+        self.assertEqual(self.wait(first + cancelled), ['a', None, 'c'])
+        self.assertEqual(self.synthesizer.batches, [['a'], ['c']])
+
+    def test_done_one_by_one(self):
+        inverted = Event()
+
+        def synthesize_batch(texts):
+            yield texts[0]
+            inverted.wait()
+            yield texts[1]
+
+        self.synthesizer.synthesize_batch = lambda texts, iters: \
+            synthesize_batch(texts)
+        first, second = self.server.submit(['a', 'b'])
+        first.done.wait()
+        self.assertFalse(second.done.is_set())
+        inverted.set()
+        self.assertEqual(self.wait([second]), ['b'])
+
+    def test_error(self):
+        self.synthesizer.go.set()
+        requests = self.server.submit(['a', 'error'])
+        self.wait(requests)
+        self.assertTrue(all(isinstance(r.error, ValueError)
+                            for r in requests))
+
+
+class TestTacotronStreaming(unittest.TestCase):
+    def setUp(self):
+        self.synthesizer = MockSynthesizer()
+        self.synthesizer.go.set()
+        self.server = TacotronServer(self.synthesizer, stream_frames=64)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.server.join()
+
+    def test_stream(self):
+        first, second = self.server.submit(['ab', 'c'])
+        self.assertEqual(first.stream.rate, 20000)
+        self.assertEqual(list(first.stream), ['a\x00', 'b\x00'])
+        self.assertEqual(list(second.stream), ['c\x00'])
+
+    def test_cancelled(self):
+        self.synthesizer.go.clear()
+        first, second = self.server.submit(['ab', 'c'])
+        second.stream.cancel()
+        self.synthesizer.go.set()
+        self.assertEqual(len(list(first.stream)), 2)
+        self.assertRaises(RuntimeError, list, second.stream)
+
+    def test_error(self):
+        request = self.server.submit(['error'])[0]
+        self.assertRaises(ValueError, list, request.stream)
+
+
+if __name__ == "__main__":
+    unittest.main()
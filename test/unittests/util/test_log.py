@@ -1,8 +1,16 @@
+import logging
+import os
+import shutil
+import tempfile
 import unittest
 import sys
 from cStringIO import StringIO
+from os.path import join
 from threading import Thread
-from mycroft.util.log import LOG
+
+import mock
+
+from mycroft.util.log import LOG, AsyncLogHandler
 
 
 class CaptureLogs(list):
@@ -52,6 +60,121 @@ class TestLog(unittest.TestCase):
                     found_msg = True
             assert found_msg
 
+    def test_custom_name_per_thread(self):
+        t = Thread(target=LOG, args=('other thread',))
+        t.start()
+        t.join()
+        with CaptureLogs() as output:
+            LOG.info('testing name')
+        self.assertNotIn('other thread', output[0])
+
+    def test_caller_name(self):
+        with CaptureLogs() as output:
+            LOG.info('testing name')
+        self.assertIn(__name__ + ':test_caller_name:', output[0])
+        self.assertIn(' - INFO - testing name', output[0])
+
+    def test_lazy_args(self):
+        with CaptureLogs() as output:
+            LOG.info('testing %s and %d', 'args', 2)
+        self.assertIn('testing args and 2', output[0])
+
+    def test_disabled_level(self):
+        class Unformattable(object):
+            def __str__(self):
+                raise AssertionError('formatted a disabled message')
+
+        with CaptureLogs() as output:
+            LOG.level = logging.INFO
+            LOG('testing custom').debug('testing %s', Unformattable())
+            LOG.debug('testing %s', Unformattable())
+            LOG.info('testing info')
+        self.assertEqual(len(output), 1)
+        # a disabled call does not keep the custom name for the next one
+        self.assertNotIn('testing custom', output[0])
+
+    def test_logger_cached_per_call_site(self):
+        with CaptureLogs() as output:
+            for _ in range(3):
+                LOG.debug('testing cache')
+            self.assertEqual(len(LOG._loggers), 1)
+        self.assertEqual(len(output), 3)
+
+
+class TestAsyncLogHandler(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.file = join(self.temp, 'test.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def logger(self, handler):
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('test_async_%d' % id(handler))
+        logger.propagate = False
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        return logger
+
+    def lines(self, path=None):
+        with open(path or self.file) as f:
+            return f.read().splitlines()
+
+    def test_writes_in_order(self):
+        handler = AsyncLogHandler(self.file, flush_interval=0)
+        logger = self.logger(handler)
+        for i in range(500):
+            logger.info('line %d', i)
+        handler.close()
+        self.assertEqual(self.lines(), ['line %d' % i for i in range(500)])
+
+    def test_drops_when_full(self):
+        # the writer waits 0.5 seconds for more records after the first
+        handler = AsyncLogHandler(self.file, queue_size=10,
+                                  flush_interval=0.5)
+        logger = self.logger(handler)
+        for i in range(100):
+            logger.info('line %d', i)
+        handler.close()
+        lines = self.lines()
+        self.assertTrue(handler.dropped >= 80)
+        self.assertIn('%d log records dropped' % handler.dropped, lines[-1])
+
+    def test_rotation(self):
+        handler = AsyncLogHandler(self.file, flush_interval=0,
+                                  max_bytes=1000, backup_count=2)
+        logger = self.logger(handler)
+        for i in range(30):
+            logger.info('x' * 100)
+        handler.close()
+        self.assertTrue(os.path.exists(self.file + '.1'))
+        self.assertEqual(len(self.lines()) + len(self.lines(
+            self.file + '.1')), 30)
+
+    def test_process_config(self):
+        config = {'log_level': 'DEBUG',
+                  'logging': {'async': False, 'file': self.file,
+                              'processes': {'skills': {'async': True,
+                                                       'log_level': 'INFO'}}}}
+        with mock.patch('mycroft.util.log.isfile', return_value=True), \
+                mock.patch('mycroft.util.log.load_commented_json',
+                           return_value=config):
+            try:
+                LOG.init('skills')
+                self.assertIsInstance(LOG.handler, AsyncLogHandler)
+                self.assertEqual(LOG.level, logging.INFO)
+                LOG.info('testing process config')
+                LOG.debug('testing disabled')
+                LOG.init('speech')
+                self.assertNotIsInstance(LOG.handler, AsyncLogHandler)
+                self.assertEqual(LOG.level, logging.DEBUG)
+            finally:
+                LOG.handler.close()
+        LOG.init()
+        lines = self.lines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('testing process config', lines[0])
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,77 @@
+import struct
+import tempfile
+import unittest
+from os.path import join
+from shutil import rmtree
+
+from mycroft.util.mic_level import MicLevelReader, MicLevelWriter
+
+
+class MockEmitter(object):
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data):
+        self.emitted.append((event, data))
+
+
+class TestMicLevel(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.path = join(self.temp, 'mic_level.shm')
+
+    def tearDown(self):
+        rmtree(self.temp)
+
+    def test_no_level_yet(self):
+        reader = MicLevelReader(self.path)
+        self.assertIsNone(reader.read())
+        writer = MicLevelWriter(self.path)
+        self.assertIsNone(reader.read())
+        writer.report(10, 20.5)
+        self.assertEqual(reader.read()[1:], (10, 20.5))
+
+    def test_throttled(self):
+        writer = MicLevelWriter(self.path, rate=10)
+        reader = MicLevelReader(self.path)
+        writer.report(1, 2)
+        seq = reader.read()[0]
+        writer.report(3, 4)
+        self.assertEqual(reader.read(), (seq, 1, 2))
+        writer.next_report = 0
+        writer.report(5, 6)
+        self.assertEqual(reader.read(), (seq + 2, 5, 6))
+
+    def test_restarted_writer(self):
+        MicLevelWriter(self.path, rate=0).report(1, 2)
+        writer = MicLevelWriter(self.path, rate=0)
+        reader = MicLevelReader(self.path)
+        seq = reader.read()[0]
+        writer.report(3, 4)
+        # a new level is never mistaken for the old one
+        self.assertEqual(reader.read(), (seq + 2, 3, 4))
+
+    def test_not_sized_yet(self):
+        # created by the writer, not truncated to size yet
+        open(self.path, 'w').close()
+        reader = MicLevelReader(self.path)
+        self.assertIsNone(reader.read())
+        MicLevelWriter(self.path, rate=0).report(1, 2)
+        self.assertEqual(reader.read()[1:], (1, 2))
+
+    def test_writer_died_writing(self):
+        writer = MicLevelWriter(self.path, rate=0)
+        writer.report(1, 2)
+        writer.map[:8] = struct.pack('Q', writer.seq + 1)
+        self.assertIsNone(MicLevelReader(self.path).read())
+
+    def test_bus(self):
+        emitter = MockEmitter()
+        writer = MicLevelWriter(self.path, rate=0, emitter=emitter)
+        writer.report(1, 2)
+        self.assertEqual(emitter.emitted, [('recognizer_loop:mic_level',
+                                            {'energy': 1, 'threshold': 2})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,23 @@
+import tempfile
+import time
 import unittest
 from shutil import rmtree
+from threading import Thread
 
-from os.path import exists, isfile
+from os import listdir, mkfifo, remove
+from os.path import exists, isfile, join
 
+import mycroft.util.signal
 from mycroft.util import create_signal, check_for_signal
+from mycroft.util.signal import SignalTable, SIGNAL_SLOTS, \
+    create_file, get_signal_table, wait_for_signal
 
 
 class TestSignals(unittest.TestCase):
     def setUp(self):
         if exists('/tmp/mycroft'):
             rmtree('/tmp/mycroft')
+        mycroft.util.signal._signal_files_checked.clear()
 
     def test_create_signal(self):
         create_signal('test_signal')
@@ -27,6 +35,120 @@ class TestSignals(unittest.TestCase):
         # Check that the signal is removed after use
         self.assertFalse(isfile('/tmp/mycroft/ipc/signal/test_signal'))
 
+    def test_signal_table(self):
+        create_signal('test_signal')
+        table = get_signal_table()
+        self.assertTrue(table.stamp('test_signal') > 0)
+        # removing the file clears the signal, as it did before
+        remove('/tmp/mycroft/ipc/signal/test_signal')
+        self.assertFalse(check_for_signal('test_signal', -1))
+        self.assertEqual(table.stamp('test_signal'), 0)
+
+    def test_lifetime(self):
+        create_signal('test_signal')
+        table = get_signal_table()
+        table.set('test_signal', time.time() - 10)
+        self.assertTrue(check_for_signal('test_signal', 20))
+        self.assertFalse(check_for_signal('test_signal', 5))
+        self.assertFalse(isfile('/tmp/mycroft/ipc/signal/test_signal'))
+
+    def test_file_only_signal(self):
+        # created by a process without the table, or by a script
+        create_file('/tmp/mycroft/ipc/signal/test_signal')
+        self.assertTrue(check_for_signal('test_signal'))
+        self.assertFalse(isfile('/tmp/mycroft/ipc/signal/test_signal'))
+        self.assertEqual(get_signal_table().stamp('test_signal'), 0)
+
+    def test_file_only_signal_checked_once_a_second(self):
+        self.assertFalse(check_for_signal('test_signal'))
+        create_file('/tmp/mycroft/ipc/signal/test_signal')
+        self.assertFalse(check_for_signal('test_signal', -1))
+        mycroft.util.signal._signal_files_checked.clear()
+        self.assertTrue(check_for_signal('test_signal', -1))
+
+    def test_long_name_uses_file(self):
+        name = 'test_signal' * 5
+        create_signal(name)
+        self.assertTrue(isfile('/tmp/mycroft/ipc/signal/' + name))
+        self.assertTrue(check_for_signal(name))
+        self.assertFalse(check_for_signal(name))
+
+    def test_wait_for_signal(self):
+        self.assertFalse(wait_for_signal('test_signal', timeout=0.05))
+        create_signal('test_signal')
+        self.assertTrue(wait_for_signal('test_signal', timeout=0.05))
+        self.assertTrue(check_for_signal('test_signal'))
+        self.assertTrue(wait_for_signal('test_signal', False, 0.05))
+
+    def test_wait_for_file_only_signal(self):
+        def create_later():
+            time.sleep(0.2)
+            create_file('/tmp/mycroft/ipc/signal/test_signal')
+        get_signal_table(refresh=True)
+        Thread(target=create_later).start()
+        start = time.time()
+        self.assertTrue(wait_for_signal('test_signal', timeout=3))
+        self.assertLess(time.time() - start, 1.5)
+
+
+class TestSignalTable(unittest.TestCase):
+    """ two tables on the same directory act like two processes """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.first = SignalTable(self.directory)
+        self.second = SignalTable(self.directory)
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        rmtree(self.directory)
+
+    def test_shared(self):
+        self.assertEqual(self.second.stamp('shared'), 0)
+        self.first.set('shared', 42.0)
+        self.assertEqual(self.second.stamp('shared'), 42.0)
+        self.assertEqual(self.second.consume('shared'), 42.0)
+        # consumed once only
+        self.assertEqual(self.first.consume('shared'), 0)
+        self.assertEqual(self.first.stamp('shared'), 0)
+
+    def test_unicode_name(self):
+        self.first.set(u'signal\xe9')
+        self.assertTrue(self.second.stamp('signal\xc3\xa9') > 0)
+        self.assertTrue(self.second.consume(u'signal\xe9') > 0)
+        self.assertEqual(self.first.scanned, 1)
+
+    def test_full(self):
+        for i in range(SIGNAL_SLOTS):
+            self.assertTrue(self.first.set('signal%d' % i))
+        self.assertFalse(self.second.set('one too many'))
+        self.assertFalse(self.second.fits('one too many'))
+        self.assertTrue(self.second.fits('signal0'))
+
+    def test_wait_wakes_up(self):
+        def set_later():
+            time.sleep(0.2)
+            self.second.set('awaited')
+        Thread(target=set_later).start()
+        start = time.time()
+        self.assertTrue(self.first.wait(
+            lambda: self.first.stamp('awaited') > 0, 5))
+        # not a poll interval late
+        self.assertLess(time.time() - start, 0.25)
+        self.assertEqual(listdir(join(self.directory, 'signal', 'waiters')),
+                         [])
+
+    def test_wait_timeout(self):
+        start = time.time()
+        self.assertFalse(self.first.wait(lambda: False, 0.1))
+        self.assertTrue(0.1 <= time.time() - start < 0.2)
+
+    def test_stale_waiter_removed(self):
+        stale = join(self.directory, 'signal', 'waiters', 'stale')
+        mkfifo(stale)
+        self.first.set('changed')
+        self.assertFalse(exists(stale))
+
 
 if __name__ == "__main__":
     unittest.main()